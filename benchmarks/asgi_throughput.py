@@ -0,0 +1,165 @@
+"""
+Compares the throughput of the read endpoints served by gunicorn with sync workers (WSGI) and with uvicorn workers
+(ASGI), with the sync views and with their async variants, on a scratch SQLite database file.
+
+Every server runs the same number of worker processes and is loaded by the same number of concurrent clients, each
+requesting a page of products, the summary report and a leaderboard in turn with a valid token.
+
+Usage: python benchmarks/asgi_throughput.py [--rows 50000] [--workers 2] [--clients 32] [--seconds 10]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+from products.constants import REQUIRED_COLUMNS  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+from usermanagement.models import User  # noqa: E402
+from usermanagement.tokens import TokenUtils  # noqa: E402
+
+PATHS = ["/shopping/product?page_size=100", "/shopping/report", "/shopping/leaderboard?category=C7&metric=rating"]
+
+
+def server_command(mode, port, workers):
+    """
+    Returns the command line of the server of the mode and whether it serves the async variants of the views. Both
+    are gunicorn, with sync workers or with uvicorn workers.
+    """
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+               "--log-level", "warning"]
+    if mode == "gunicorn":
+        return command + ["shopping.wsgi:application"], False
+    return command + ["--worker-class", "uvicorn.workers.UvicornWorker", "shopping.asgi:application"], mode == "uvicorn"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def load(port, token, clients, seconds):
+    """
+    Requests the PATHS in turn from concurrent clients for the given time.
+
+    :return: The list of request latencies in seconds and the list of unexpected responses.
+    """
+    deadline = time.monotonic() + seconds
+    latencies, failures = [], []
+
+    def client(number):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        headers = {"Authorization": f"Bearer {token}"}
+        request_number = number
+        try:
+            while time.monotonic() < deadline:
+                path = PATHS[request_number % len(PATHS)]
+                request_number += 1
+                start = time.perf_counter()
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                latencies.append(time.perf_counter() - start)
+                if response.status != 200:
+                    failures.append((path, response.status))
+        except Exception as e:
+            failures.append(("", repr(e)))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--modes", default="gunicorn,uvicorn-sync,uvicorn",
+                        help="servers to compare: gunicorn (sync workers), uvicorn-sync (ASGI with the sync views) "
+                             "and uvicorn (ASGI with the async views)")
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    df = pd.DataFrame([[f"p{number}", f"Product {number}", f"C{number % 50}", 1.0 + number % 100, number % 1000,
+                        1.0 + number % 5, number % 300] for number in range(args.rows)], columns=REQUIRED_COLUMNS)
+    CleanAndUploadProductUtils.save_products_to_db(df, None)
+    user = User(name="Reader", email="reader@example.com")
+    user.set_password("reader")
+    user.save()
+    token = TokenUtils.issue_token(user)
+
+    # The servers read the scratch database through a settings module of their own.
+    with open(os.path.join(SCRATCH_DIRECTORY.name, "benchmark_settings.py"), "w") as file:
+        file.write(f"from shopping.settings import *  # noqa\n"
+                   f"DATABASES['default']['NAME'] = {settings.DATABASES['default']['NAME']!r}\n")
+
+    print(f"{args.rows} products, {args.workers} worker processes, {args.clients} clients, {args.seconds:g}s each")
+    for mode in args.modes.split(","):
+        port = free_port()
+        command, async_views = server_command(mode, port, args.workers)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "benchmark_settings",
+               "PYTHONPATH": os.pathsep.join([SCRATCH_DIRECTORY.name, ROOT_DIRECTORY]),
+               "ASYNC_VIEWS": "true" if async_views else "false"}
+        server = subprocess.Popen(command, cwd=ROOT_DIRECTORY, env=env)
+        try:
+            wait_until_listening(port, server)
+            # Warm up the caches of every worker process.
+            load(port, token, args.clients, 1)
+            latencies, failures = load(port, token, args.clients, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies.sort()
+        print(f"{mode:>12}: {len(latencies) / args.seconds:7.0f} requests/s, "
+              f"median {statistics.median(latencies) * 1000:6.1f}ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f}ms, failures: {len(failures)}")
+        for failure in failures[:5]:
+            print(f"  {failure}")
+
+
+if __name__ == "__main__":
+    main()
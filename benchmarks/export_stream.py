@@ -0,0 +1,87 @@
+"""
+Benchmarks the time to first byte, total time and peak memory of streaming the product list as JSON, for growing
+catalogs on a scratch SQLite database file.
+
+Usage: python benchmarks/export_stream.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from products.views import ProductListView  # noqa: E402
+
+
+def populate(start, stop):
+    """
+    Inserts the generated products numbered from start to stop with plain SQL.
+    """
+    rng = random.Random(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(start, stop)),
+        )
+
+
+def measure(export_format):
+    """
+    Streams the whole product list and returns the time to first product, total time, size and peak memory.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = ProductListView.as_view()(APIRequestFactory().get(f"/product?stream={export_format}"))
+    first_byte, size = None, 0
+    for chunk in response.streaming_content:
+        # The opening bracket of a JSON array is not a product yet.
+        if first_byte is None and chunk != b"[":
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populated = 0
+    for rows in sorted(args.rows):
+        populate(populated, rows)
+        populated = rows
+        for export_format in ("json", "jsonl"):
+            first_byte, total, size, peak = measure(export_format)
+            print(f"{rows} rows, {export_format}: first product after {first_byte * 1000:.0f}ms, "
+                  f"{total:.1f}s ({rows / total:.0f} rows/s), {size / 1e6:.0f} MB sent, "
+                  f"peak memory {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
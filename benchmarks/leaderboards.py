@@ -0,0 +1,86 @@
+"""
+Benchmarks category leaderboards read from the category indexes against reading the whole category and sorting it, as
+the storefront did, on a generated product table in a scratch SQLite database file.
+
+Usage: python benchmarks/leaderboards.py [--rows 1000000] [--size 10]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from products.constants import LEADERBOARD_METRICS  # noqa: E402
+from products.models import Product  # noqa: E402
+from products.serializers import ProductReadSerializer  # noqa: E402
+
+
+def populate(rows):
+    """
+    Inserts the generated products with plain SQL, as the ORM would take minutes for a million rows.
+    """
+    rng = random.Random(0)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(rows)),
+        )
+
+
+def timed(function, repeat):
+    """
+    Returns the mean duration of function() in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--size", type=int, default=10)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populate(args.rows)
+
+    for metric in LEADERBOARD_METRICS:
+        position = ProductReadSerializer.columns.index(metric)
+
+        def sort_category():
+            rows = list(ProductReadSerializer.rows_of(Product.objects.filter(category="Category 7")))
+            return sorted(rows, key=lambda row: -row[position])[:args.size]
+
+        def read_leaderboard():
+            return list(ProductReadSerializer.rows_of(
+                Product.objects.filter(category="Category 7").order_by(f"-{metric}", "id")[:args.size]))
+
+        assert [row[position] for row in sort_category()] == [row[position] for row in read_leaderboard()]
+        before, after = timed(sort_category, 3), timed(read_leaderboard, 100)
+        print(f"{args.rows} rows, top {args.size} by {metric}: {before:.1f}ms sorting the category, "
+              f"{after:.2f}ms from the index ({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmarks parsing, validating and cleaning a generated product CSV file with 1, 2, 4 and all CPU worker processes.
+
+Usage: python benchmarks/parallel_ingest.py [--rows 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from products.parallel import ParallelCsvUtils  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+
+
+def generate_csv(path, rows):
+    """
+    Writes a product CSV file with some missing prices, quantities and ratings.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "product_id": [f"p{number}" for number in range(rows)],
+        "product_name": [f"Product {number}" for number in range(rows)],
+        "category": rng.choice([f"Category {number}" for number in range(50)], rows),
+        "price": np.where(rng.random(rows) < 0.05, np.nan, rng.integers(100, 100000, rows) / 100),
+        "quantity_sold": np.where(rng.random(rows) < 0.05, np.nan, rng.integers(0, 1000, rows)),
+        "rating": np.where(rng.random(rows) < 0.05, np.nan, rng.integers(0, 51, rows) / 10),
+        "review_count": rng.integers(0, 5000, rows),
+    })
+    df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "products.csv")
+        generate_csv(path, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        with open(path, "rb") as file:
+            df = CleanAndUploadProductUtils.process_csv_file(file)
+        df, _ = CleanAndUploadProductUtils.validate_product_data(df)
+        expected = CleanAndUploadProductUtils.clean_product_data(df)
+        baseline = time.perf_counter() - start
+        print(f"single process: {baseline:.2f}s")
+
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            actual, _ = ParallelCsvUtils.process_and_clean_csv_file(path, workers=workers)
+            elapsed = time.perf_counter() - start
+            pd.testing.assert_frame_equal(actual, expected)
+            print(f"{workers} workers: {elapsed:.2f}s ({baseline / elapsed:.2f}x), identical output")
+
+
+if __name__ == "__main__":
+    main()
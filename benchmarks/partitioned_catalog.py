@@ -0,0 +1,107 @@
+"""
+Compares the product catalog stored in the default database with the catalog partitioned by category across several
+SQLite files, on scratch database files.
+
+For every number of partitions, the catalog is loaded by a full replace upload, then the product list of all
+categories and of a single one, the stream of all products, the summary report and a report grouped by rating are
+timed. Every configuration runs in a process of its own, as the partitions are configured before Django is set up.
+
+Usage: python benchmarks/partitioned_catalog.py [--rows 200000] [--categories 200] [--partitions 1,2,4] [--repeat 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+PARTITIONS = int(os.environ.get("BENCHMARK_PARTITIONS", "0"))
+settings.PRODUCT_PARTITIONS = [f"products_{number}" for number in range(PARTITIONS)]
+settings.PRODUCT_PARTITION_WORKERS = max(1, 4 * PARTITIONS)
+for alias in settings.PRODUCT_PARTITIONS:
+    settings.DATABASES[alias] = {**settings.DATABASES["default"],
+                                 "NAME": os.path.join(SCRATCH_DIRECTORY.name, f"{alias}.sqlite3")}
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from products.cache import get_report_cache  # noqa: E402
+from products.constants import REQUIRED_COLUMNS  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+from products.views import ProductListView, SummaryReportView  # noqa: E402
+
+READS = {
+    "list all": (ProductListView, "/product?page_size=100&ordering=-price"),
+    "list category": (ProductListView, "/product?page_size=100&ordering=-price&category=C7"),
+    "stream all": (ProductListView, "/product?stream=jsonl"),
+    "summary report": (SummaryReportView, "/report"),
+    "report by rating": (SummaryReportView, "/report?group_by=rating&metrics=count,mean:price&top=3"),
+}
+
+
+def run(args):
+    """
+    Loads the catalog and times the reads with the partitions of the settings.
+    """
+    for alias in ["default", *settings.PRODUCT_PARTITIONS]:
+        call_command("migrate", database=alias, verbosity=0)
+    df = pd.DataFrame([[f"p{number}", f"Product {number}", f"C{number % args.categories}", 1.0 + number % 100,
+                        number % 1000, 1.0 + number % 5, number % 300] for number in range(args.rows)],
+                      columns=REQUIRED_COLUMNS)
+    start = time.perf_counter()
+    CleanAndUploadProductUtils.save_products_to_db(df, None)
+    timings = {"upload": time.perf_counter() - start}
+
+    factory = APIRequestFactory()
+    for name, (view, url) in READS.items():
+        start = time.perf_counter()
+        repeat = 1 if name == "stream all" else args.repeat
+        for _ in range(repeat):
+            # Reports are cached for the catalog version, so time their generation.
+            get_report_cache.cache_clear()
+            response = view.as_view()(factory.get(url))
+            if hasattr(response, "render"):
+                response.render()
+            for _ in response:
+                pass
+        timings[name] = (time.perf_counter() - start) / repeat
+
+    print(f"{PARTITIONS or 'none':>10}: " + ", ".join(f"{name} {seconds * 1000:7.1f}ms"
+                                                      for name, seconds in timings.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--partitions", default="0,2,4",
+                        help="numbers of partitions to compare, 0 for the default database alone")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args)
+        return
+
+    print(f"{args.rows} products in {args.categories} categories, reads repeated {args.repeat} times")
+    for partitions in args.partitions.split(","):
+        subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--child"],
+                       env={**os.environ, "BENCHMARK_PARTITIONS": partitions}, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmarks product lookups and uploads on a generated product table before and after the product indexes migration,
+on a scratch SQLite database file.
+
+Usage: python benchmarks/product_indexes.py [--rows 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from products.constants import REQUIRED_COLUMNS  # noqa: E402
+from products.models import Product  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+
+UPLOAD_ROWS = 20_000
+
+
+def populate(rows):
+    """
+    Inserts the generated products with plain SQL, as the ORM would take minutes for a million rows.
+    """
+    rng = random.Random(0)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(rows)),
+        )
+
+
+def timed(function, repeat):
+    """
+    Returns the mean duration of function() in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(rows):
+    """
+    Times the queries of the upload, list and report paths.
+    """
+    rng = random.Random(1)
+    lookups = [[f"p{rng.randrange(rows)}" for _ in range(500)] for _ in range(20)]
+    lookup_batches = iter(lookups * 1000)
+
+    # Half of the uploaded rows update existing products, the other half are new.
+    upload = pd.DataFrame(
+        [[f"p{rng.randrange(rows)}" if number % 2 else f"new{number}", f"Product {number}", "Category 1", 9.99, 1,
+          4.5, 1] for number in range(UPLOAD_ROWS)],
+        columns=REQUIRED_COLUMNS,
+    )
+
+    def upload_products():
+        with transaction.atomic():
+            CleanAndUploadProductUtils.upsert_products(upload)
+            # Leave the table as it was for the next measurement.
+            transaction.set_rollback(True)
+
+    return {
+        "lookup of 500 product_ids": timed(
+            lambda: list(Product.objects.filter(product_id__in=next(lookup_batches)).values_list("product_id", "id")),
+            20),
+        "count of one category": timed(lambda: Product.objects.filter(category="Category 7").count(), 10),
+        "100 highest prices": timed(lambda: list(Product.objects.order_by("-price")[:100]), 10),
+        "100 highest ratings": timed(lambda: list(Product.objects.order_by("-rating")[:100]), 10),
+        "100 best sellers": timed(lambda: list(Product.objects.order_by("-quantity_sold")[:100]), 10),
+        f"upload of {UPLOAD_ROWS} rows": timed(upload_products, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    call_command("migrate", "products", "0005", verbosity=0)
+    populate(args.rows)
+    before = measure(args.rows)
+
+    start = time.perf_counter()
+    call_command("migrate", "products", "0006", verbosity=0)
+    print(f"{args.rows} rows, migration: {time.perf_counter() - start:.1f}s")
+    after = measure(args.rows)
+
+    for name in before:
+        print(f"{name}: {before[name]:.1f}ms before, {after[name]:.1f}ms after "
+              f"({before[name] / after[name]:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmarks serializing products read from the database with ProductSerializer and with ProductReadSerializer, on a
+scratch SQLite database file.
+
+Usage: python benchmarks/product_serializer.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from products.serializers import ProductReadSerializer, ProductSerializer  # noqa: E402
+
+
+def populate(start, stop):
+    """
+    Inserts the generated products numbered from start to stop with plain SQL.
+    """
+    rng = random.Random(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(start, stop)),
+        )
+
+
+def timed(function):
+    """
+    Returns the result of function() and its duration in seconds.
+    """
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populated = 0
+    for rows in sorted(args.rows):
+        populate(populated, rows)
+        populated = rows
+        products = Product.objects.order_by("id")
+
+        expected, baseline = timed(lambda: ProductSerializer(products, many=True).data)
+        actual, fast = timed(lambda: ProductReadSerializer(ProductReadSerializer.rows_of(products)).data)
+        identical = JSONRenderer().render(actual) == JSONRenderer().render(expected)
+        print(f"{rows} rows: ProductSerializer {rows / baseline:,.0f} rows/s, "
+              f"ProductReadSerializer {rows / fast:,.0f} rows/s ({baseline / fast:.1f}x), "
+              f"{'identical' if identical else 'DIFFERENT'} output")
+
+
+if __name__ == "__main__":
+    main()
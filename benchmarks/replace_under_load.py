@@ -0,0 +1,104 @@
+"""
+Hammers the product list and report endpoints while a full replace upload runs, on a scratch SQLite database file.
+
+Every read must return a full page of the old catalog or of the new one, and the report of either, never an empty or
+partial one.
+
+Usage: python benchmarks/replace_under_load.py [--rows 20000] [--readers 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from products.constants import REQUIRED_COLUMNS  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+from usermanagement.models import User  # noqa: E402
+from usermanagement.tokens import TokenUtils  # noqa: E402
+
+
+def generate_products(rows, name):
+    """
+    Returns a DataFrame of cleaned products all named after the catalog they belong to.
+    """
+    return pd.DataFrame([[f"p{number}", name, f"C{number % 50}", 10.0, 5, 4.0, 3] for number in range(rows)],
+                        columns=REQUIRED_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    call_command("migrate", verbosity=0)
+    CleanAndUploadProductUtils.save_products_to_db(generate_products(args.rows, "Old"), None)
+
+    user = User(name="Reader", email="reader@example.com")
+    user.set_password("reader")
+    user.save()
+    token = TokenUtils.issue_token(user)
+
+    done = threading.Event()
+    latencies, bad_reads, errors = [], [], []
+
+    def read():
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+        try:
+            while not done.is_set():
+                start = time.perf_counter()
+                products = client.get("/shopping/product?page_size=1000").json()["results"]
+                report = client.get("/shopping/report")
+                latencies.append(time.perf_counter() - start)
+                names = {product["product_name"] for product in products}
+                if len(products) != min(args.rows, 1000) or len(names) != 1 or report.status_code != 200:
+                    bad_reads.append((len(products), names, report.status_code))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    readers = [threading.Thread(target=read) for _ in range(args.readers)]
+    for thread in readers:
+        thread.start()
+
+    start = time.perf_counter()
+    CleanAndUploadProductUtils.save_products_to_db(generate_products(args.rows, "New"), None)
+    print(f"replace of {args.rows} rows: {time.perf_counter() - start:.2f}s")
+
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    print(f"{len(latencies)} reads, median {statistics.median(latencies) * 1000:.0f}ms, "
+          f"max {max(latencies) * 1000:.0f}ms")
+    print(f"empty or partial reads: {len(bad_reads)}, errors: {len(errors)}")
+    for error in errors[:5]:
+        print(f"  {error!r}")
+
+
+if __name__ == "__main__":
+    main()
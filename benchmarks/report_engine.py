@@ -0,0 +1,133 @@
+"""
+Benchmarks a report of the report engine, computed by the database, against the same report computed with vectorized
+NumPy on the whole catalog read into memory, on growing catalogs in a scratch SQLite database file.
+
+Usage: python benchmarks/report_engine.py [--rows 10000 100000 1000000] [--top 5]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.http import QueryDict  # noqa: E402
+
+from products.models import Product  # noqa: E402
+from products.reports import ReportDefinition, ReportEngine  # noqa: E402
+
+
+def populate(start, stop):
+    """
+    Inserts the generated products numbered from start to stop with plain SQL.
+    """
+    rng = random.Random(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(start, stop)),
+        )
+
+
+def numpy_report(products, top):
+    """
+    Count, revenue and mean rating of every category and its top products by revenue, with NumPy: one pass of
+    np.unique and bincount for the metrics, and argpartition within every category for the top products.
+    """
+    ids, product_ids, categories, prices, quantities, ratings = zip(
+        *products.values_list("id", "product_id", "category", "price", "quantity_sold", "rating").iterator())
+    ids, prices, quantities, ratings = np.array(ids), np.array(prices), np.array(quantities), np.array(ratings)
+    names, groups = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    revenue = prices * quantities
+    counts = np.bincount(groups)
+    revenues = np.bincount(groups, weights=revenue)
+    mean_ratings = np.bincount(groups, weights=ratings) / counts
+
+    report = []
+    order = np.argsort(groups, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    for group, name in enumerate(names):
+        members = order[bounds[group]:bounds[group + 1]]
+        k = min(top, len(members))
+        candidates = members[np.argpartition(-revenue[members], k - 1)[:k]] if k < len(members) else members
+        # Ties on the k-th revenue are settled by id, as the engine does.
+        threshold = revenue[candidates].min()
+        candidates = members[revenue[members] >= threshold]
+        best = candidates[np.lexsort((ids[candidates], -revenue[candidates]))[:k]]
+        report.append({"category": name, "count": int(counts[group]), "sum_revenue": float(revenues[group]),
+                       "mean_rating": float(mean_ratings[group]),
+                       "top": [product_ids[index] for index in best]})
+    return report
+
+
+def engine_report(products, top):
+    """
+    The same report computed by the report engine, read from its streamed JSON.
+    """
+    definition = ReportDefinition.from_params(QueryDict(
+        f"group_by=category&metrics=count,sum:revenue,mean:rating&top={top}&top_by=revenue&output=json"))
+    report = json.loads(b"".join(ReportEngine.stream_report(products, definition).streaming_content))
+    return [{**group, "top": [product["product_id"] for product in group["top"]]} for group in report]
+
+
+def measure(function, top):
+    """
+    Returns the result of function(products, top), its duration in seconds and its peak memory in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(Product.objects.all(), top)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populated = 0
+    for rows in sorted(args.rows):
+        populate(populated, rows)
+        populated = rows
+
+        expected, baseline, baseline_peak = measure(numpy_report, args.top)
+        actual, elapsed, peak = measure(engine_report, args.top)
+
+        for group, expected_group in zip(actual, expected, strict=True):
+            assert (group["category"], group["count"], group["top"]) == (
+                expected_group["category"], expected_group["count"], expected_group["top"])
+            assert all(math.isclose(group[metric], expected_group[metric], rel_tol=1e-9)
+                       for metric in ("sum_revenue", "mean_rating"))
+        print(f"{rows} rows, top {args.top}: NumPy {baseline:.2f}s, peak memory {baseline_peak / 1e6:.0f} MB; "
+              f"engine {elapsed:.2f}s, peak memory {peak / 1e6:.1f} MB, same report")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compares the SQLite performance profiles of shopping/database.py under concurrent reads and writes, on a scratch SQLite
+database file.
+
+For every profile, the catalog is loaded by an upload, then reader threads list pages of products and leaderboards
+while writer threads save single products, each operation starting and ending as a request does. Every profile runs
+in a process of its own, as the profile is read from the DATABASE_PROFILE environment variable with the settings.
+
+Usage: python benchmarks/sqlite_profile.py [--rows 50000] [--readers 4] [--writers 2] [--seconds 10]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import OperationalError, close_old_connections, connections  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from products.constants import REQUIRED_COLUMNS  # noqa: E402
+from products.models import Product  # noqa: E402
+from products.utils import CleanAndUploadProductUtils  # noqa: E402
+from products.views import LeaderboardView, ProductListView  # noqa: E402
+from shopping.database import PROFILES  # noqa: E402
+
+
+def percentile(latencies, fraction):
+    return sorted(latencies)[int(len(latencies) * fraction)] * 1000 if latencies else float("nan")
+
+
+def run(args):
+    """
+    Loads the catalog and runs the concurrent reads and writes with the profile of the settings.
+    """
+    call_command("migrate", verbosity=0)
+    df = pd.DataFrame([[f"p{number}", f"Product {number}", f"C{number % 50}", 1.0 + number % 100, number % 1000,
+                        1.0 + number % 5, number % 300] for number in range(args.rows)], columns=REQUIRED_COLUMNS)
+    start = time.perf_counter()
+    CleanAndUploadProductUtils.save_products_to_db(df, "true")
+    load_time = time.perf_counter() - start
+    product_ids = list(Product.objects.values_list("id", flat=True))
+    connections.close_all()
+
+    deadline = time.monotonic() + args.seconds
+    reads, writes, errors = [], [], []
+
+    def request(operation, latencies):
+        # Start and end every operation as Django starts and ends a request.
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            operation()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as e:
+            errors.append(str(e))
+        finally:
+            close_old_connections()
+
+    def read():
+        factory = APIRequestFactory()
+
+        def list_products():
+            ProductListView.as_view()(factory.get("/product?page_size=100&ordering=-rating")).render()
+            LeaderboardView.as_view()(factory.get(f"/leaderboard?category=C{random.randrange(50)}&metric=rating"))
+
+        while time.monotonic() < deadline:
+            request(list_products, reads)
+        connections.close_all()
+
+    def write():
+        def save_product():
+            product = Product.objects.get(pk=random.choice(product_ids))
+            product.quantity_sold += 1
+            product.save()
+
+        while time.monotonic() < deadline:
+            request(save_product, writes)
+        connections.close_all()
+
+    threads = ([threading.Thread(target=read) for _ in range(args.readers)]
+               + [threading.Thread(target=write) for _ in range(args.writers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{settings.DATABASE_PROFILE:>12}: upload {load_time:5.2f}s, "
+          f"{len(reads) / args.seconds:6.0f} reads/s (p50 {percentile(reads, 0.5):6.1f}ms, "
+          f"p99 {percentile(reads, 0.99):6.1f}ms), "
+          f"{len(writes) / args.seconds:5.0f} writes/s (p50 {percentile(writes, 0.5):6.1f}ms, "
+          f"p99 {percentile(writes, 0.99):6.1f}ms), errors: {len(errors)}")
+    for error in sorted(set(errors))[:3]:
+        print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profile", choices=list(PROFILES),
+                        help="run the benchmark with this profile only, in this process")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        run(args)
+        return
+
+    print(f"{args.rows} products, {args.readers} readers, {args.writers} writers, {args.seconds:g}s each")
+    for profile in PROFILES:
+        subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--profile", profile],
+                       env={**os.environ, "DATABASE_PROFILE": profile}, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmarks the summary report computed in SQL and read from the stored category summaries against the former pandas
+version, and the cost of keeping the summaries up to date on a single save, on growing catalogs in a scratch SQLite
+database file.
+
+Usage: python benchmarks/summary_report.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+
+from django.conf import settings  # noqa: E402
+
+SCRATCH_DIRECTORY = tempfile.TemporaryDirectory()
+settings.DATABASES["default"]["NAME"] = os.path.join(SCRATCH_DIRECTORY.name, "db.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from products.models import CategorySummary, Product  # noqa: E402
+from products.utils import SummaryReportUtils  # noqa: E402
+
+
+def pandas_summary(products):
+    """
+    The former report: every product is read into a DataFrame and grouped by pandas.
+    """
+    df = pd.DataFrame(list(products.values()))
+    summary = df.groupby('category').agg(
+        total_revenue=pd.NamedAgg(column='price', aggfunc='sum'),
+        top_product=pd.NamedAgg(column='product_name', aggfunc=lambda x: x.iloc[0]),
+        top_product_quantity_sold=pd.NamedAgg(column='quantity_sold', aggfunc='max')
+    ).reset_index()
+    return [tuple(row) for row in summary.itertuples(index=False)]
+
+
+def sql_summary(products):
+    """
+    The summary recomputed from the products in SQL.
+    """
+    return [(summary['category'], summary['total_revenue'], summary['top_product'],
+             summary['top_product_quantity_sold']) for summary in SummaryReportUtils.summarize_categories(products)]
+
+
+def stored_summary(products):
+    """
+    The report as it is now generated from the stored summaries, parsed back from its CSV response.
+    """
+    response = SummaryReportUtils.generate_summary_report(CategorySummary.objects.all())
+    rows = list(csv.reader(io.StringIO(response.content.decode())))[1:]
+    return [(category, float(revenue), top_product, int(quantity)) for category, revenue, top_product, quantity in rows]
+
+
+def populate(start, stop):
+    """
+    Inserts the generated products numbered from start to stop with plain SQL.
+    """
+    rng = random.Random(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Product._meta.db_table} "
+            "(product_id, product_name, category, price, quantity_sold, rating, review_count) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ((f"p{number}", f"Product {number}", f"Category {number % 50}", rng.randint(100, 100000) / 100,
+              rng.randint(0, 1000), rng.randint(0, 50) / 10, rng.randint(0, 5000)) for number in range(start, stop)),
+        )
+
+
+def measure(function):
+    """
+    Returns the result of function(), its duration in seconds and its peak memory in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(Product.objects.all())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populated = 0
+    for rows in sorted(args.rows):
+        populate(populated, rows)
+        populated = rows
+
+        # The products are inserted with plain SQL, so their summaries are rebuilt as after a replace upload.
+        start = time.perf_counter()
+        SummaryReportUtils.refresh_category_summaries()
+        rebuild = time.perf_counter() - start
+
+        expected, baseline, baseline_peak = measure(pandas_summary)
+        for name, function in (("SQL", sql_summary), ("stored", stored_summary)):
+            actual, elapsed, peak = measure(function)
+            # The former top product was the first product of the category rather than its best seller.
+            assert [(row[0], row[3]) for row in actual] == [(row[0], row[3]) for row in expected]
+            assert all(math.isclose(row[1], expected_row[1], rel_tol=1e-12)
+                       for row, expected_row in zip(actual, expected))
+            print(f"{rows} rows, {name}: {elapsed * 1000:.1f}ms, peak memory {peak / 1e6:.1f} MB "
+                  f"({baseline / elapsed:.0f}x faster than pandas: {baseline:.2f}s, {baseline_peak / 1e6:.0f} MB)")
+
+        product = Product.objects.get(product_id="p0")
+        start = time.perf_counter()
+        for quantity_sold in range(10):
+            product.quantity_sold = quantity_sold
+            product.save()
+        print(f"{rows} rows: rebuild of all summaries {rebuild:.2f}s, "
+              f"single save with its summary update {(time.perf_counter() - start) / 10 * 1000:.1f}ms")
+        assert SummaryReportUtils.verify_category_summaries() == []
+
+
+if __name__ == "__main__":
+    main()
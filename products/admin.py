@@ -1,5 +1,22 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import Product
+from .signals import catalog_changed
+from .summaries import CategorySummaryChanges
+
+
+class ProductAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        """
+        Deletes the selected products and reports the change, as bulk deletes do not go through Product.delete().
+        """
+        with transaction.atomic():
+            changes = CategorySummaryChanges()
+            for stored in queryset.values_list('id', 'category', 'price'):
+                changes.remove(*stored)
+            super().delete_queryset(request, queryset)
+            catalog_changed.send(sender=Product, changes=changes)
+
 
 # Register your models here.
-admin.site.register(Product)
+admin.site.register(Product, ProductAdmin)
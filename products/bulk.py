@@ -0,0 +1,199 @@
+import contextlib
+import functools
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Product
+from .partitions import PartitionUtils, partition
+from .serializers import ProductSerializer
+from .signals import catalog_changed
+from .summaries import CategorySummaryChanges
+
+"""
+This module creates many products from one request to the product endpoint.
+
+The uniqueness of the product_ids is checked before the products are inserted, and the unique index of product_id
+rejects the ones a concurrent request created in between, which are then reported as invalid. The index is local to
+each partition when the products are partitioned, so two concurrent requests creating a product_id in categories of
+different partitions may both succeed.
+"""
+
+
+class ProductBulkSerializer(ProductSerializer):
+    """
+    serializer for validating a product of a bulk creation, whose product_id uniqueness is checked for all the
+    products at once
+    """
+
+    class Meta(ProductSerializer.Meta):
+        extra_kwargs = {'product_id': {'validators': []}}
+
+    def validate_product_id(self, value):
+        return value
+
+
+class ProductBulkCreateUtils:
+    # Same message as the unique validator of ProductSerializer.
+    DUPLICATE_PRODUCT_ID_MESSAGE = "product with this product id already exists."
+
+    @staticmethod
+    def validate_products(items):
+        """
+        Validates every item as ProductSerializer does, checking product_id uniqueness with one query.
+
+        :param items: The list of product data.
+        :return: A tuple of the list of validated data, None for invalid items, and the list of errors of every
+            item, an empty dict for valid items.
+        """
+        serializer = ProductBulkSerializer()
+        validated, errors = [], []
+        for item in items:
+            try:
+                validated.append(serializer.run_validation(item))
+                errors.append({})
+            except ValidationError as e:
+                validated.append(None)
+                errors.append(e.detail if isinstance(e.detail, dict) else {"non_field_errors": e.detail})
+
+        # Product ids already stored in any partition, or used by an earlier item of the request, are duplicated.
+        product_ids = {data['product_id'] for data in validated if data is not None}
+        taken = set().union(*PartitionUtils.gather([
+            functools.partial(set, products.values_list('product_id', flat=True))
+            for products in PartitionUtils.querysets(Product.objects.filter(product_id__in=product_ids))]))
+        for index, data in enumerate(validated):
+            if data is None:
+                continue
+            if data['product_id'] in taken:
+                validated[index] = None
+                errors[index] = {"product_id": [ProductBulkCreateUtils.DUPLICATE_PRODUCT_ID_MESSAGE]}
+            taken.add(data['product_id'])
+
+        return validated, errors
+
+    @staticmethod
+    def create_products(items, skip_invalid=False, batch_size=None):
+        """
+        Validates the items and creates the products in batched bulk inserts, in one transaction.
+
+        :param items: The list of product data.
+        :param skip_invalid: Whether to create the valid products when some items are invalid, instead of none.
+        :param batch_size: Number of products inserted per batch. Defaults to settings.PRODUCT_UPLOAD_BATCH_SIZE.
+        :return: A tuple of whether the products were created and the result of every item: its index and status,
+            'created' with the id of the product, 'invalid' with its errors, or 'valid' if it was not created. A
+            product_id created by a concurrent request after the validation makes its item invalid.
+        """
+        batch_size = batch_size or settings.PRODUCT_UPLOAD_BATCH_SIZE
+        validated, errors = ProductBulkCreateUtils.validate_products(items)
+
+        results = [{"index": index, "status": "valid"} if data is not None
+                   else {"index": index, "status": "invalid", "errors": errors[index]}
+                   for index, data in enumerate(validated)]
+        if not skip_invalid and any(data is None for data in validated):
+            return False, results
+
+        valid = [(index, Product(**data)) for index, data in enumerate(validated) if data is not None]
+        if PartitionUtils.fans_out():
+            partitions = defaultdict(list)
+            for index, product in valid:
+                partitions[PartitionUtils.partition_of(product.category)].append((index, product))
+            if skip_invalid:
+                # Create the products of every partition in it, in parallel.
+                outcomes = PartitionUtils.fan_out(lambda alias: ProductBulkCreateUtils.save_new_products(
+                    partitions[alias], skip_invalid, batch_size), partitions).values()
+            else:
+                outcomes = [ProductBulkCreateUtils.save_partitioned_products(partitions, batch_size)]
+        else:
+            outcomes = [ProductBulkCreateUtils.save_new_products(valid, skip_invalid, batch_size)]
+
+        conflicts = False
+        for created, taken in outcomes:
+            for index, product in created:
+                results[index] = {"index": index, "status": "created", "id": product.id}
+            for index in taken:
+                results[index] = {"index": index, "status": "invalid",
+                                  "errors": {"product_id": [ProductBulkCreateUtils.DUPLICATE_PRODUCT_ID_MESSAGE]}}
+                conflicts = True
+        return skip_invalid or not conflicts, results
+
+    @staticmethod
+    def save_partitioned_products(partitions, batch_size):
+        """
+        Saves the products of every partition as save_new_products does, committing none of them if a product_id
+        was taken in any partition.
+
+        The transactions of all the partitions are held until the products of every partition are inserted, so
+        they are taken in the order of the partitions to keep concurrent requests from waiting on each other.
+
+        :param partitions: A dict mapping the alias of every partition to the list of the indexes of the items and
+            their unsaved Product instances.
+        :param batch_size: Number of products inserted per batch.
+        :return: A tuple of the list of the indexes and products created, and the list of the indexes of the
+            products whose product_id was taken.
+        """
+        aliases = [alias for alias in PartitionUtils.aliases() if alias in partitions]
+        created, taken = [], []
+        with contextlib.ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            for alias in aliases:
+                with partition(alias):
+                    partition_created, partition_taken = ProductBulkCreateUtils.save_new_products(
+                        partitions[alias], False, batch_size)
+                created += partition_created
+                taken += partition_taken
+            if taken:
+                for alias in aliases:
+                    transaction.set_rollback(True, using=alias)
+                return [], taken
+        return created, taken
+
+    @staticmethod
+    def save_new_products(products, skip_invalid, batch_size):
+        """
+        Saves the products as save_products does, leaving out the ones whose product_id a concurrent request created
+        since they were validated.
+
+        :param products: The list of the indexes of the items and their unsaved Product instances.
+        :param skip_invalid: Whether to save the other products when a product_id was taken, instead of none.
+        :param batch_size: Number of products inserted per batch.
+        :return: A tuple of the list of the indexes and products created, and the list of the indexes of the
+            products whose product_id was taken.
+        """
+        taken = []
+        while products:
+            try:
+                ProductBulkCreateUtils.save_products([product for _, product in products], batch_size)
+                return products, taken
+            except IntegrityError:
+                # The transaction was rolled back, so find the product_ids stored meanwhile and try again without.
+                stored = set(Product.objects.filter(product_id__in=[product.product_id for _, product in products])
+                             .values_list('product_id', flat=True))
+                if not stored:
+                    raise
+                taken += [index for index, product in products if product.product_id in stored]
+                products = [(index, product) for index, product in products if product.product_id not in stored]
+                for _, product in products:
+                    product.pk = None
+                if not skip_invalid:
+                    break
+        return [], taken
+
+    @staticmethod
+    def save_products(products, batch_size):
+        """
+        Inserts the products in batched bulk inserts in one transaction of the current database, and reports the
+        change.
+
+        :param products: The list of unsaved Product instances.
+        :param batch_size: Number of products inserted per batch.
+        """
+        with transaction.atomic(using=PartitionUtils.current()):
+            Product.objects.bulk_create(products, batch_size=batch_size)
+            if products:
+                changes = CategorySummaryChanges()
+                for product in products:
+                    changes.add(product)
+                catalog_changed.send(sender=Product, changes=changes)
@@ -0,0 +1,182 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, StreamingHttpResponse
+
+"""
+This module contains the cache of generated summary reports.
+
+Reports are cached under the catalog version they were generated for, so any change of the products makes the cached
+ones unreachable; the catalog_changed receiver also evicts them from the in-process cache to free its memory at once.
+"""
+
+
+class LRUReportCacheBackend:
+    """
+    In-process cache evicting the least recently used reports once their total size exceeds max_bytes. Each worker
+    process has its own.
+    """
+    name = 'lru'
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry[-1])
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[-1])
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[-1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size}
+
+
+class DjangoReportCacheBackend:
+    """
+    Cache storing the reports in one of the Django caches of settings.CACHES, such as a file or database cache shared
+    by all worker processes.
+    """
+    name = 'django'
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry):
+        self.cache.set(key, entry)
+
+    def clear(self):
+        # Reports of former catalog versions are never read again and expire with the timeout of the cache.
+        pass
+
+    def stats(self):
+        return {}
+
+
+class ReportCache:
+    """
+    Cache of generated summary reports, counting its hits and misses in this process.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(state, params):
+        """
+        Returns the cache key of the report of the catalog in the given state, generated with the given query
+        parameters. The time of the last change tells apart catalogs whose version restarted, as in a new database.
+        """
+        query = '&'.join(f'{name}={value}' for name, values in sorted(params.lists()) for value in sorted(values))
+        changed = state.updated_at.timestamp() if state.updated_at else 0
+        return f"report:{state.version}:{changed}:{hashlib.sha256(query.encode()).hexdigest()}"
+
+    def fetch(self, key, generate):
+        """
+        Returns the cached report of the key, or generates it and caches it if it is successful. A streaming report
+        is cached once it has been streamed entirely.
+
+        :param key: The cache key of the report, as returned by key().
+        :param generate: Callable returning the response of the report.
+        :return: A tuple of the response and whether it was cached.
+        """
+        entry = self.backend.get(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if entry is not None:
+            content_type, content_disposition, content = entry
+            response = HttpResponse(content, content_type=content_type)
+            if content_disposition:
+                response['Content-Disposition'] = content_disposition
+            return response, True
+
+        response = generate()
+        if response.status_code != 200:
+            return response, False
+        if type(response) is HttpResponse:
+            self.backend.set(key, (response['Content-Type'], response.get('Content-Disposition'), response.content))
+        elif type(response) is StreamingHttpResponse:
+            response.streaming_content = self.tee(key, response, response.streaming_content)
+        return response, False
+
+    def tee(self, key, response, content):
+        """
+        Yields the chunks of a streaming response and caches its whole content once it has been sent entirely.
+        """
+        chunks = []
+        for chunk in content:
+            chunks.append(chunk)
+            yield chunk
+        self.backend.set(key, (response['Content-Type'], response.get('Content-Disposition'), b''.join(chunks)))
+
+    def invalidate(self):
+        """
+        Evicts the cached reports, which no longer match the catalog.
+        """
+        self.backend.clear()
+
+    def stats(self):
+        """
+        Returns the backend, the numbers of hits and misses in this process and the size of the cache if known.
+        """
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {'backend': self.backend.name, 'hits': hits, 'misses': misses, **self.backend.stats()}
+
+
+@functools.cache
+def get_report_cache():
+    """
+    Returns the report cache configured by settings.REPORT_CACHE_BACKEND, created on first use.
+    """
+    if settings.REPORT_CACHE_BACKEND == 'lru':
+        return ReportCache(LRUReportCacheBackend(settings.REPORT_CACHE_MAX_BYTES))
+    return ReportCache(DjangoReportCacheBackend(settings.REPORT_CACHE_BACKEND))
+
+
+@receiver(setting_changed)
+def reset_report_cache(setting, **kwargs):
+    """
+    Recreates the report cache when its settings are overridden, as in tests.
+    """
+    if setting.startswith('REPORT_CACHE_'):
+        get_report_cache.cache_clear()
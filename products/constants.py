@@ -4,3 +4,18 @@ This module contains constants used across the application.
 
 REQUIRED_COLUMNS = ['product_id', 'product_name', 'category', 'price', 'quantity_sold', 'rating', 'review_count']
 POSITIVE_FIELDS_OF_PRODUCT = ["price", "quantity_sold", "rating", "review_count"]
+PRODUCT_UPDATE_FIELDS = ['product_name', 'category', 'price', 'quantity_sold', 'rating', 'review_count']
+MEDIAN_FILLED_COLUMNS = ['price', 'quantity_sold']
+TEXT_FIELDS_OF_PRODUCT = ['product_id', 'product_name', 'category']
+NUMERIC_FIELDS_OF_PRODUCT = ['price', 'quantity_sold', 'rating', 'review_count']
+INTEGER_FIELDS_OF_PRODUCT = ['quantity_sold', 'review_count']
+# Numeric fields whose missing values are filled in while cleaning an uploaded file.
+IMPUTED_FIELDS_OF_PRODUCT = ['price', 'quantity_sold', 'rating']
+MAX_RATING = 5
+SUMMARY_REPORT_COLUMNS = ['category', 'total_revenue', 'top_product', 'top_product_quantity_sold']
+# Dimensions the report engine can group products by, and fields its metrics and top products can be computed on,
+# revenue being price times quantity_sold.
+REPORT_DIMENSIONS = ['category', 'rating', 'quantity_sold', 'review_count']
+REPORT_FIELDS = ['price', 'quantity_sold', 'rating', 'review_count', 'revenue']
+# Fields the products of a category can be ranked by in its leaderboards.
+LEADERBOARD_METRICS = ['rating', 'quantity_sold', 'review_count']
@@ -0,0 +1,70 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import ProductReadSerializer
+
+"""
+This module streams the product list as JSON, for clients reading the whole catalog at once.
+"""
+
+
+class ProductExportUtils:
+    CONTENT_TYPES = {
+        'json': 'application/json',
+        'jsonl': 'application/x-ndjson',
+    }
+
+    @staticmethod
+    def stream_products(products, export_format, chunk_size=None):
+        """
+        Streams the products as one JSON array or as JSON Lines, one object per line, ordered by id.
+
+        The products are read from the database and encoded settings.PRODUCT_EXPORT_CHUNK_SIZE at a time, so the
+        first bytes are sent at once and memory use does not grow with the catalog size.
+
+        :param products: Queryset of Product objects, or the list of the querysets of the partitions.
+        :param export_format: 'json' for a JSON array, or 'jsonl' for JSON Lines.
+        :param chunk_size: Number of products read and encoded at a time.
+            Defaults to settings.PRODUCT_EXPORT_CHUNK_SIZE.
+        :return: A StreamingHttpResponse of the encoded products.
+        """
+        chunks = ProductExportUtils.iter_json_chunks(products, export_format, chunk_size)
+        return StreamingHttpResponse(chunks, content_type=ProductExportUtils.CONTENT_TYPES[export_format])
+
+    @staticmethod
+    def iter_json_chunks(products, export_format, chunk_size=None):
+        """
+        Encodes the products chunk by chunk, as the JSON renderer of the API renders the whole list.
+
+        :param products: Queryset of Product objects, or the list of the querysets of the partitions, whose products
+            are merged by id.
+        :param export_format: 'json' for a JSON array, or 'jsonl' for JSON Lines.
+        :param chunk_size: Number of products read and encoded at a time.
+            Defaults to settings.PRODUCT_EXPORT_CHUNK_SIZE.
+        :return: An iterator of bytes.
+        """
+        chunk_size = chunk_size or settings.PRODUCT_EXPORT_CHUNK_SIZE
+        renderer = JSONRenderer()
+        # Every partition is read chunk by chunk as the merge needs its rows, so the streaming keeps its memory use.
+        id_position = ProductReadSerializer.columns.index('id')
+        rows = heapq.merge(*(ProductReadSerializer.rows_of(queryset.order_by('id')).iterator(chunk_size=chunk_size)
+                             for queryset in (products if isinstance(products, list) else [products])),
+                           key=lambda row: row[id_position])
+
+        if export_format == 'json':
+            yield b'['
+        separator = b''
+        while chunk := list(islice(rows, chunk_size)):
+            data = ProductReadSerializer(chunk).data
+            if export_format == 'json':
+                # Splice the rendered array of the chunk into the whole array, without its brackets.
+                yield separator + renderer.render(data)[1:-1]
+                separator = b','
+            else:
+                yield b''.join(renderer.render(row) + b'\n' for row in data)
+        if export_format == 'json':
+            yield b']'
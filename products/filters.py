@@ -0,0 +1,73 @@
+import math
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+"""
+This module contains the filters of the product list, applied in the database before the products are paginated.
+"""
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Filters products by category and by ranges of their numeric fields.
+
+    ?category=A keeps one category and ?category__in=A,B several. ?min_<field>= and ?max_<field>= keep the products
+    whose price, rating, quantity_sold or review_count lies within the bounds, both included.
+    """
+    range_fields = ['price', 'rating', 'quantity_sold', 'review_count']
+
+    def filter_queryset(self, request, queryset, view):
+        """
+        Returns the products of the queryset matching the request's filters.
+
+        :param request: The request, with the optional filter query parameters.
+        :param queryset: The queryset of products to filter.
+        :param view: The view listing the products.
+        :return: The filtered queryset.
+        :raises ValidationError: If a bound is not a number.
+        """
+        params = request.query_params
+
+        if 'category' in params:
+            queryset = queryset.filter(category=params['category'])
+        if 'category__in' in params:
+            queryset = queryset.filter(category__in=params['category__in'].split(','))
+
+        for field in self.range_fields:
+            for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+                param = f'{bound}_{field}'
+                if param in params:
+                    queryset = queryset.filter(**{f'{field}__{lookup}': self.parse_number(param, params[param])})
+
+        return queryset
+
+    @staticmethod
+    def get_categories(request):
+        """
+        Returns the set of categories the request's filters keep, or None if they keep all of them, so that only
+        the partitions of these categories are read.
+        """
+        params = request.query_params
+        categories = None
+        if 'category' in params:
+            categories = {params['category']}
+        if 'category__in' in params:
+            listed = set(params['category__in'].split(','))
+            categories = listed if categories is None else categories & listed
+        return categories
+
+    @staticmethod
+    def parse_number(param, value):
+        """
+        Converts the value of a range parameter to a number.
+
+        :raises ValidationError: If the value is not a finite number.
+        """
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+        if not math.isfinite(number):
+            raise ValidationError({param: [f"{param} must be a number."]})
+        return number
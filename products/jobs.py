@@ -0,0 +1,225 @@
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProductCatalogState, UploadJob
+from .utils import CleanAndUploadProductUtils
+from .validators import InvalidRowsError
+
+"""
+This module runs product uploads in a pool of background threads of the current process.
+
+Job state lives in the UploadJob table, so any worker process can report on a job without an external broker.
+Jobs are lost with the process they were queued in, so a process fails the jobs left without progress by stopped
+processes when it first queues a job. Running jobs beat while they read and save their file, and their beats also
+keep alive the jobs waiting in the queue of their process.
+"""
+
+# Minimum number of seconds between two beats of a running job that is reading its file without saving products.
+HEARTBEAT_INTERVAL = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+class JobInterrupted(Exception):
+    """
+    Raised in a running job that another process failed, as it went without progress for too long.
+    """
+
+
+def get_executor():
+    """
+    Returns the process-wide pool running upload jobs, creating it on first use.
+
+    :return: A ThreadPoolExecutor with settings.UPLOAD_JOB_WORKERS threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            UploadJobUtils.fail_stale_jobs()
+            _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS,
+                                           thread_name_prefix="upload-job")
+        return _executor
+
+
+class UploadJobUtils:
+    @staticmethod
+    def create_job(file, operation_type, skip_invalid=False, differential=False):
+        """
+        Stores the uploaded file on disk and records a pending job for it.
+
+        :param file: The uploaded CSV file.
+        :param operation_type: The operation type ('append' or other), as for synchronous uploads.
+        :param skip_invalid: Whether to skip the invalid rows instead of rejecting the file.
+        :param differential: Whether to only write the changes, as for synchronous uploads.
+        :return: The created UploadJob.
+        """
+        job = UploadJob(operation_type=operation_type, skip_invalid=skip_invalid, differential=differential,
+                        heartbeat_at=timezone.now())
+        os.makedirs(settings.UPLOAD_JOB_DIR, exist_ok=True)
+        job.file_path = os.path.join(settings.UPLOAD_JOB_DIR, f"{job.id}.csv")
+
+        # Copy the upload chunk by chunk, as it may not fit in memory.
+        with open(job.file_path, "wb") as destination:
+            for chunk in file.chunks():
+                destination.write(chunk)
+
+        job.save()
+        return job
+
+    @staticmethod
+    def submit_job(job):
+        """
+        Queues the job on the background pool.
+
+        :param job: The pending UploadJob.
+        """
+        executor = get_executor()
+        with _queued_lock:
+            _queued.add(job.id)
+        executor.submit(UploadJobUtils._run_in_worker, job.id)
+
+    @staticmethod
+    def beat(job_id, rows=0):
+        """
+        Records that the running job and the jobs queued in this process are alive, with the rows it saved since.
+
+        :param job_id: The id of the running UploadJob.
+        :param rows: Number of rows saved since the last beat.
+        :raises JobInterrupted: If the job is no longer running, as another process failed it.
+        """
+        now = timezone.now()
+        if not UploadJob.objects.filter(id=job_id, state=UploadJob.RUNNING).update(
+                rows_processed=F("rows_processed") + rows, heartbeat_at=now):
+            raise JobInterrupted
+        with _queued_lock:
+            queued = list(_queued)
+        if queued:
+            UploadJob.objects.filter(id__in=queued, state=UploadJob.PENDING).update(heartbeat_at=now)
+
+    @staticmethod
+    def fail_stale_jobs():
+        """
+        Fails the pending and running jobs without progress for settings.UPLOAD_JOB_STALE_AFTER seconds, whose
+        process has stopped, and removes their files.
+
+        :return: The number of jobs failed.
+        """
+        stale = UploadJob.objects.filter(state__in=[UploadJob.PENDING, UploadJob.RUNNING],
+                                         heartbeat_at__lt=timezone.now() - timedelta(
+                                             seconds=settings.UPLOAD_JOB_STALE_AFTER))
+        failed = 0
+        for job_id, file_path in stale.values_list('id', 'file_path'):
+            # Only fail the job if no other process got to it first.
+            failed += stale.filter(id=job_id).update(
+                state=UploadJob.FAILED, finished_at=timezone.now(),
+                errors=[{"row": None, "error": "The job was interrupted before it finished."}])
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+        return failed
+
+    @staticmethod
+    def _run_in_worker(job_id):
+        """
+        Runs the job on a pool thread and releases the thread's database connections afterwards.
+
+        :param job_id: The id of the UploadJob to run.
+        """
+        try:
+            UploadJobUtils.run_job(job_id)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def run_job(job_id):
+        """
+        Processes, cleans and saves the job's file, recording progress and errors on the job.
+
+        Every chunk is committed as soon as it is saved so that progress is visible to other processes.
+        A failed append job therefore keeps the chunks saved before the failing row, while a failed full replace
+        leaves the catalog untouched, as its chunks are only staged. A job is only run while pending, and stops
+        when another process fails it for going without a beat too long.
+
+        :param job_id: The id of the UploadJob to run.
+        """
+        with _queued_lock:
+            _queued.discard(job_id)
+        # Claim the job, unless it is no longer pending, as another process failed it meanwhile.
+        if not UploadJob.objects.filter(id=job_id, state=UploadJob.PENDING).update(
+                state=UploadJob.RUNNING, started_at=timezone.now(), heartbeat_at=timezone.now()):
+            return
+        job = UploadJob.objects.get(id=job_id)
+        last_beat = time.monotonic()
+
+        def record_progress(rows):
+            nonlocal last_beat
+            UploadJobUtils.beat(job_id, rows)
+            last_beat = time.monotonic()
+
+        def heartbeat():
+            if time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                record_progress(0)
+
+        state, errors, changes = UploadJob.SUCCEEDED, [], None
+        try:
+            with open(job.file_path, "rb") as file:
+                if job.differential:
+                    # Skip a file identical to the one the catalog was last written by.
+                    fingerprint = CleanAndUploadProductUtils.fingerprint_file(file, job.operation_type,
+                                                                              job.skip_invalid, heartbeat)
+                    changes = CleanAndUploadProductUtils.unchanged_upload_counts(fingerprint)
+
+                if changes is None:
+                    report, changes = CleanAndUploadProductUtils.stream_products_to_db(
+                        file, job.operation_type, progress_callback=record_progress, skip_invalid=job.skip_invalid,
+                        differential=job.differential, heartbeat=heartbeat)
+                    # Record the errors of the skipped rows.
+                    errors = UploadJobUtils._row_errors(report)
+                    if job.differential:
+                        ProductCatalogState.record_upload(fingerprint, changes)
+        except JobInterrupted:
+            # Another process failed the job and removed its file.
+            return
+        except InvalidRowsError as e:
+            # Record the errors of the invalid rows that rejected the file.
+            state = UploadJob.FAILED
+            errors = UploadJobUtils._row_errors(e.report)
+        except ValidationError as e:
+            # Record the validation issue, with the failing row if there is one.
+            state = UploadJob.FAILED
+            errors.append({"row": getattr(e, "row", None), "error": "; ".join(e.messages)})
+        except Exception as e:
+            # Record any unexpected issue.
+            state = UploadJob.FAILED
+            errors.append({"row": None, "error": f"An unexpected error occurred: {str(e)}"})
+
+        # Only record the outcome of a job still running, which no other process failed meanwhile.
+        UploadJob.objects.filter(id=job_id, state=UploadJob.RUNNING).update(
+            state=state, errors=errors, changes=changes, finished_at=timezone.now(), heartbeat_at=timezone.now())
+
+        # The stored file is no longer needed once the job has finished.
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(job.file_path)
+
+    @staticmethod
+    def _row_errors(report):
+        """
+        Flattens a validation report into one error per row and message.
+
+        :param report: The validation report of ProductDataValidator.report().
+        :return: A list of dicts with the row number and the error message.
+        """
+        return [{"row": row_errors["row"], "error": message}
+                for row_errors in report["errors"] for message in row_errors["errors"]]
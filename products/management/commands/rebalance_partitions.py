@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.partitions import PartitionUtils
+
+"""
+This module contains the command moving the products to the partitions of their categories.
+"""
+
+
+class Command(BaseCommand):
+    help = ("Moves the products stored outside the partition of their category to it, after the number of partitions "
+            "of settings.PRODUCT_PARTITIONS changed, draining the default database and the retired partitions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Number of products moved per transaction.")
+
+    def handle(self, *args, **options):
+        moved = PartitionUtils.rebalance(options["batch_size"])
+        for source, count in moved.items():
+            self.stdout.write(f"Moved {count} products out of {source}.")
+        self.stdout.write(f"Moved {sum(moved.values())} products to the partitions of their categories.")
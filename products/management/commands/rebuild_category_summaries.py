@@ -0,0 +1,37 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import CategorySummary
+from products.partitions import PartitionUtils
+from products.utils import SummaryReportUtils
+
+"""
+This module contains the command recomputing the category summaries of the summary report from the products.
+"""
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the summaries of all categories from the products, or with --verify only checks that the "
+            "stored summaries match them. Partitioned products are summarized in every partition.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Compare the stored summaries with a full recompute without changing them.")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            categories = sorted(chain.from_iterable(
+                PartitionUtils.apply(SummaryReportUtils.verify_category_summaries)))
+            if categories:
+                raise CommandError(f"{len(categories)} category summaries do not match the products: "
+                                   f"{', '.join(categories)}")
+            self.stdout.write(f"All {self.count_summaries()} category summaries match the products.")
+            return
+
+        PartitionUtils.apply(SummaryReportUtils.refresh_category_summaries)
+        self.stdout.write(f"Rebuilt {self.count_summaries()} category summaries.")
+
+    @staticmethod
+    def count_summaries():
+        return sum(PartitionUtils.apply(CategorySummary.objects.count))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shopping.replica import ReplicaUtils
+
+"""
+This module contains the command copying the default database into the SQLite read replica.
+"""
+
+
+class Command(BaseCommand):
+    help = ("Copies the default database into the SQLite read replica of settings.DATABASE_REPLICA, as is done in the "
+            "background after the catalog changes.")
+
+    def handle(self, *args, **options):
+        if not ReplicaUtils.refresh_replica():
+            raise CommandError("No SQLite read replica is configured: set DATABASE_REPLICA_NAME.")
+        self.stdout.write(f"Refreshed the read replica {settings.DATABASE_REPLICA}.")
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_uploadjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadjob",
+            name="skip_invalid",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_uploadjob_skip_invalid"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCatalogState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("upload_fingerprint", models.CharField(blank=True, max_length=64)),
+                ("upload_rows", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="content_hash",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadjob",
+            name="changes",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadjob",
+            name="differential",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_differential_uploads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductStaging",
+            fields=[
+                ("product_id", models.CharField(max_length=64)),
+                ("product_name", models.CharField(max_length=255)),
+                ("category", models.CharField(max_length=255)),
+                ("price", models.FloatField()),
+                ("quantity_sold", models.IntegerField()),
+                ("rating", models.FloatField()),
+                ("review_count", models.IntegerField()),
+                (
+                    "content_hash",
+                    models.BigIntegerField(blank=True, editable=False, null=True),
+                ),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("load_id", models.UUIDField(db_index=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
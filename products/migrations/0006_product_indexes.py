@@ -0,0 +1,51 @@
+# Generated by Django 5.1 on 2026-10-18 19:36
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_products(apps, schema_editor):
+    """
+    Keeps the last written product of each product_id, as uploads do, so that product_id can be made unique.
+    """
+    Product = apps.get_model("products", "Product")
+    latest_ids = (
+        Product.objects.values("product_id")
+        .annotate(latest_id=Max("id"))
+        .values("latest_id")
+    )
+    Product.objects.exclude(id__in=latest_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_staging"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_products, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="product",
+            name="product_id",
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["category"], name="product_category_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price"], name="product_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["rating"], name="product_rating_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["quantity_sold"], name="product_quantity_sold_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_product_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productcatalogstate",
+            name="updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="productcatalogstate",
+            name="version",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1 on 2026-10-18 20:06
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+
+
+def summarize_categories(apps, schema_editor):
+    """
+    Stores the summary of every category of the existing products, as SummaryReportUtils computes it.
+    """
+    Product = apps.get_model("products", "Product")
+    CategorySummary = apps.get_model("products", "CategorySummary")
+    by_category = [F("category")]
+    summaries = (
+        Product.objects.annotate(
+            total_revenue=Window(Sum("price"), partition_by=by_category),
+            product_count=Window(Count("id"), partition_by=by_category),
+            sales_rank=Window(
+                RowNumber(),
+                partition_by=by_category,
+                order_by=[F("quantity_sold").desc(), F("id").asc()],
+            ),
+        )
+        .filter(sales_rank=1)
+        .values(
+            "category",
+            "total_revenue",
+            "product_count",
+            top_product=F("product_name"),
+            top_product_quantity_sold=F("quantity_sold"),
+            top_product_pk=F("id"),
+        )
+    )
+    CategorySummary.objects.bulk_create(
+        CategorySummary(**summary) for summary in summaries
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_catalog_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategorySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("category", models.CharField(max_length=255, unique=True)),
+                ("total_revenue", models.FloatField()),
+                ("product_count", models.IntegerField()),
+                ("top_product", models.CharField(max_length=255)),
+                ("top_product_quantity_sold", models.IntegerField()),
+                ("top_product_pk", models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-quantity_sold", "id"],
+                name="product_category_sales_idx",
+            ),
+        ),
+        migrations.RunPython(summarize_categories, migrations.RunPython.noop),
+    ]
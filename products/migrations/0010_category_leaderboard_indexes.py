@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_category_summary"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_category_rating_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-rating", "id"],
+                name="product_category_ratings_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-review_count", "id"],
+                name="product_category_reviews_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_category_leaderboard_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_rating_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_quantity_sold_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_review_count_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["-rating", "id"], name="product_ratings_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-quantity_sold", "id"], name="product_sales_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-review_count", "id"], name="product_reviews_idx"
+            ),
+        ),
+    ]
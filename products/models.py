@@ -1,11 +1,17 @@
-from django.db import models
+import uuid
 
+from django.db import models, transaction
+from django.utils import timezone
 
-class Product(models.Model):
+from .partitions import PartitionUtils, partition
+from .signals import catalog_changed
+from .summaries import CategorySummaryChanges
+
+
+class ProductFields(models.Model):
     """
-    model for storing the data of the sheet for a product
+    abstract model with the fields of a product, shared by the catalog and its staging table
     """
-    id = models.BigAutoField(primary_key=True)
     product_id = models.CharField(max_length=64)
     product_name = models.CharField(max_length=255)
     category = models.CharField(max_length=255)
@@ -13,6 +19,170 @@ class Product(models.Model):
     quantity_sold = models.IntegerField()
     rating = models.FloatField()
     review_count = models.IntegerField()
+    # Hash of the uploaded row the product was last written from, used to skip unchanged rows on upload.
+    content_hash = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class Product(ProductFields):
+    """
+    model for storing the data of the sheet for a product
+    """
+    id = models.BigAutoField(primary_key=True)
+    product_id = models.CharField(max_length=64, unique=True)
+
+    class Meta:
+        # The report groups by category, and product lists are filtered and sorted by category and numeric fields.
+        # The category indexes also hold the products of every category in the order of its leaderboards, so that
+        # its top products by rating, quantity_sold or review_count are read without sorting. Lists sort ties by
+        # ascending id too, so the lists of all products by these metrics, highest first, are read from indexes in
+        # the same order.
+        indexes = [
+            models.Index(fields=['category', '-rating', 'id'], name='product_category_ratings_idx'),
+            models.Index(fields=['category', '-quantity_sold', 'id'], name='product_category_sales_idx'),
+            models.Index(fields=['category', '-review_count', 'id'], name='product_category_reviews_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['-rating', 'id'], name='product_ratings_idx'),
+            models.Index(fields=['-quantity_sold', 'id'], name='product_sales_idx'),
+            models.Index(fields=['-review_count', 'id'], name='product_reviews_idx'),
+        ]
 
     def __str__(self):
         return self.product_name
+
+    def save(self, *args, **kwargs):
+        # The hash of the uploaded row no longer describes a product saved by other means.
+        self.content_hash = None
+        using = PartitionUtils.alias_for(self.category)
+        if using is not None:
+            kwargs['using'] = using
+            if self.pk is not None and self._state.db not in (None, using):
+                # The new category belongs to another partition: move the product there, under a new primary key.
+                Product.objects.using(self._state.db).get(pk=self.pk).delete()
+                self.pk = None
+                self._state.adding = True
+                kwargs.pop('force_update', None)
+        with partition(using), transaction.atomic(using=using):
+            changes = CategorySummaryChanges()
+            if self.pk is not None:
+                for stored in Product.objects.filter(pk=self.pk).values_list('id', 'category', 'price'):
+                    changes.remove(*stored)
+            super().save(*args, **kwargs)
+            changes.add(self)
+            catalog_changed.send(sender=Product, changes=changes)
+
+    def delete(self, *args, **kwargs):
+        using = self._state.db if PartitionUtils.is_partitioned() else PartitionUtils.alias_for(self.category)
+        with partition(using), transaction.atomic(using=using):
+            changes = CategorySummaryChanges()
+            for stored in Product.objects.filter(pk=self.pk).values_list('id', 'category', 'price'):
+                changes.remove(*stored)
+            result = super().delete(*args, **kwargs)
+            catalog_changed.send(sender=Product, changes=changes)
+        return result
+
+
+class ProductStaging(ProductFields):
+    """
+    model for loading the products of a full replace before they are swapped into the catalog at once
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Identifies the upload the rows belong to, so that concurrent replaces do not mix their rows.
+    load_id = models.UUIDField(db_index=True)
+
+
+class ProductCatalogState(models.Model):
+    """
+    model for storing the state of the product catalog as a whole, in a single row
+    """
+    SINGLETON_ID = 1
+
+    # Fingerprint of the upload the catalog was last written by, cleared by any other change.
+    upload_fingerprint = models.CharField(max_length=64, blank=True)
+    upload_rows = models.IntegerField(default=0)
+    # Bumped by every change of the products, for the ETag and Last-Modified headers of the catalog endpoints.
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def load(cls):
+        """
+        Returns the catalog state, creating it on first use.
+        """
+        state, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+        return state
+
+    @classmethod
+    def record_change(cls):
+        """
+        Bumps the catalog version and forgets the last upload, as the catalog no longer matches it.
+        """
+        now = timezone.now()
+        changed = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            version=models.F('version') + 1, updated_at=now, upload_fingerprint='', upload_rows=0)
+        if not changed:
+            cls.objects.get_or_create(pk=cls.SINGLETON_ID, defaults={'version': 1, 'updated_at': now})
+
+    @classmethod
+    def record_upload(cls, fingerprint, counts):
+        """
+        Records the upload the catalog now matches.
+
+        :param fingerprint: The fingerprint of the uploaded file and upload options.
+        :param counts: The number of products inserted, updated, unchanged and deleted by the upload.
+        """
+        rows = counts['inserted'] + counts['updated'] + counts['unchanged']
+        cls.objects.update_or_create(pk=cls.SINGLETON_ID,
+                                     defaults={'upload_fingerprint': fingerprint, 'upload_rows': rows})
+
+
+class CategorySummary(models.Model):
+    """
+    model for storing the summary of the products of a category, kept up to date by every change of the products
+    """
+    category = models.CharField(max_length=255, unique=True)
+    total_revenue = models.FloatField()
+    product_count = models.IntegerField()
+    # Best seller of the category, the first one stored among equals, and its primary key.
+    top_product = models.CharField(max_length=255)
+    top_product_quantity_sold = models.IntegerField()
+    top_product_pk = models.BigIntegerField()
+
+    def __str__(self):
+        return self.category
+
+
+class UploadJob(models.Model):
+    """
+    model for tracking a product upload processed in the background
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=PENDING)
+    operation_type = models.CharField(max_length=16, null=True, blank=True)
+    skip_invalid = models.BooleanField(default=False)
+    differential = models.BooleanField(default=False)
+    file_path = models.CharField(max_length=1024)
+    rows_processed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)
+    changes = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last time the job was queued or reported progress, to tell the jobs of processes that stopped.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.state})"
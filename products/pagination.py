@@ -0,0 +1,206 @@
+import base64
+import binascii
+import functools
+import heapq
+import json
+import math
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .partitions import PartitionUtils
+
+"""
+This module contains the keyset pagination of the product list.
+
+Pages are read with WHERE sort key past the last one, or equal to it with a greater id, ORDER BY sort key, id LIMIT
+page size, which an index on the sort key and id serves directly, so deep pages cost the same as the first one. DRF's
+CursorPagination skips rows sharing the sort key with an OFFSET instead, which grows with the number of ties.
+
+Rows sharing the sort key are ordered by ascending id in both directions, the first stored first, as on the
+leaderboards, so that the list of a category sorted by a leaderboard metric is read from the category index of the
+metric.
+
+Partitioned products are paginated by reading the page from every partition in parallel and keeping the first rows
+of their merge, as the primary keys are unique across partitions.
+"""
+
+
+class ProductKeysetPagination(BasePagination):
+    """
+    Pagination of products by opaque cursors holding the sort key and id of the row a page starts after.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_param = 'ordering'
+    count_query_param = 'count'
+    # Indexed product fields the list can be sorted by, with the primary key breaking ties in ascending order.
+    ordering_fields = ['id', 'price', 'rating', 'quantity_sold', 'review_count']
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the products of the page selected by the request's cursor.
+
+        :param queryset: The queryset of products to paginate, as model instances or named values_list rows, or the
+            list of the querysets of the partitions.
+        :param request: The request, with the optional cursor, page_size, ordering and count query parameters.
+        :param view: The view paginating the queryset.
+        :return: The list of products of the page.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+        cursor = self.decode_cursor(request)
+
+        querysets = queryset if isinstance(queryset, list) else [queryset]
+
+        # The number of matching products is only counted on request, by a COUNT(*) query.
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "true":
+            self.count = sum(PartitionUtils.gather([queryset.count for queryset in querysets]))
+
+        # A reverse cursor reads the rows before its position, in the opposite order.
+        self.reverse = cursor is not None and cursor['r']
+        descending = self.descending != self.reverse
+        pages = PartitionUtils.gather([functools.partial(self.read_rows, queryset, cursor, descending)
+                                       for queryset in querysets])
+        # Ties are merged by id in the direction they were read in, which is opposite to the sort key's when reading
+        # a descending order forward or an ascending one backward.
+        sign = -1 if self.ties_descending(descending) != descending else 1
+        rows = list(islice(heapq.merge(*pages, key=lambda row: (getattr(row, self.field), sign * row.id),
+                                       reverse=descending), self.page_size + 1))
+        self.has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.cursor = cursor
+        return self.page
+
+    def read_rows(self, queryset, cursor, descending):
+        """
+        Reads the rows of the page, and the one after it, from the queryset.
+        """
+        ties_descending = self.ties_descending(descending)
+        queryset = queryset.order_by(f"{'-' if descending else ''}{self.field}",
+                                     f"{'-' if ties_descending else ''}id")
+        if cursor is not None:
+            queryset = self.filter_after(queryset, cursor['v'], cursor['i'], descending, ties_descending)
+        return list(queryset[:self.page_size + 1])
+
+    def ties_descending(self, descending):
+        """
+        Returns whether the rows sharing the sort key are read by descending id, as they are when reading the page
+        backward, or when sorting by id itself in descending order.
+        """
+        return descending if self.field == 'id' else self.reverse
+
+    def filter_after(self, queryset, value, pk, descending, ties_descending):
+        """
+        Keeps the rows after the given position in the order of the page.
+        """
+        id_lookup = 'lt' if ties_descending else 'gt'
+        if self.field == 'id':
+            return queryset.filter(**{f'id__{id_lookup}': pk})
+        # The bound on the sort key alone lets the index seek to the position, the rest skips the ties before it.
+        lookup = 'lt' if descending else 'gt'
+        return queryset.filter(Q(**{f'{self.field}__{lookup}e': value}),
+                               Q(**{f'{self.field}__{lookup}': value}) | Q(**{f'id__{id_lookup}': pk}))
+
+    def get_paginated_response(self, data):
+        """
+        Returns the page of serialized products with the links to the neighbouring pages, and the number of
+        matching products if requested.
+        """
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_next_link(self):
+        # A page read backwards always has rows after it.
+        if not (self.reverse or self.has_more):
+            return None
+        return self.encode_cursor(self.page[-1] if self.page else None, reverse=False)
+
+    def get_previous_link(self):
+        # The first page has no rows before it, and a page read backwards knows whether there are more.
+        if self.cursor is None or (self.reverse and not self.has_more):
+            return None
+        return self.encode_cursor(self.page[0] if self.page else None, reverse=True)
+
+    def get_page_size(self, request):
+        """
+        Returns the page size requested, capped by settings.PRODUCT_MAX_PAGE_SIZE.
+
+        :raises ValidationError: If the page size is not a positive integer.
+        """
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return settings.PRODUCT_PAGE_SIZE
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            page_size = 0
+        if page_size <= 0:
+            raise ValidationError({self.page_size_query_param: ["page_size must be a positive integer."]})
+        return min(page_size, settings.PRODUCT_MAX_PAGE_SIZE)
+
+    def get_ordering(self, request):
+        """
+        Returns the field to sort by and whether the order is descending.
+
+        :raises ValidationError: If the field cannot be sorted by.
+        """
+        ordering = request.query_params.get(self.ordering_param, 'id')
+        field = ordering.removeprefix('-')
+        if field not in self.ordering_fields:
+            raise ValidationError({self.ordering_param: [
+                f"ordering must be one of {', '.join(self.ordering_fields)}, optionally prefixed with '-'."]})
+        return field, ordering.startswith('-')
+
+    def decode_cursor(self, request):
+        """
+        Returns the position encoded in the request's cursor, or None for the first page.
+
+        :raises NotFound: If the cursor is malformed or was issued for another ordering.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if cursor['o'] != [self.field, self.descending] or not isinstance(cursor['r'], bool):
+                raise ValueError
+            # The position is compared to the numeric sort key and the id, so it must be finite numbers, not booleans.
+            value, pk = cursor['v'], cursor['i']
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError
+            if isinstance(pk, bool) or not isinstance(pk, int):
+                raise ValueError
+            return cursor
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, product, reverse):
+        """
+        Returns the URL of the page starting after the product, or after the current cursor without a product.
+        """
+        if product is None:
+            position = {'v': self.cursor['v'], 'i': self.cursor['i']}
+        else:
+            position = {'v': getattr(product, self.field), 'i': product.id}
+        cursor = {'o': [self.field, self.descending], 'r': reverse, **position}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
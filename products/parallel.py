@@ -0,0 +1,213 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+"""
+This module parses large CSV files in a pool of worker processes.
+
+The file is split into byte ranges that start on line boundaries outside quoted values. The pool is started once
+per process with the 'spawn' method, as forking a server process that runs other threads can copy locks they hold
+into the workers. Models are imported inside the functions run by the workers, which keeps the module importable in
+the spawned processes before Django is set up.
+"""
+
+# Number of bytes of the CSV file read at a time while looking for the line boundaries of the ranges.
+SCAN_BLOCK_SIZE = 1 << 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide pool parsing CSV files, creating it on first use.
+
+    :return: A ProcessPoolExecutor with settings.PARALLEL_CSV_WORKERS spawned processes.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.PARALLEL_CSV_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_setup_worker)
+        return _executor
+
+
+def _discard_executor(executor):
+    """
+    Forgets a pool whose worker died, so that the next upload starts a new one.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+class ParallelCsvUtils:
+    @staticmethod
+    def process_and_clean_csv_file(path, workers=None, skip_invalid=False):
+        """
+        Reads, validates and cleans the CSV file at path using a pool of worker processes.
+
+        Each worker parses a byte range of the file, checks the values of its rows and collects the
+        ImputationStatistics of the rows with valid values. Duplicate product_ids are then found in file order,
+        and the statistics are merged exactly, so the result is identical to process_csv_file,
+        validate_product_data and clean_product_data run in one process.
+
+        :param path: Path of the CSV file on disk.
+        :param workers: Number of byte ranges parsed in parallel. Defaults to settings.PARALLEL_CSV_WORKERS.
+        :param skip_invalid: Whether to drop the invalid rows instead of rejecting the file.
+        :return: A tuple of the cleaned DataFrame, indexed by row as in the single-process path, and the
+            validation report.
+        :raises ValidationError: If the file is empty, cannot be read, has parsing issues or misses required columns.
+        :raises InvalidRowsError: If the file contains invalid rows and skip_invalid is False.
+        """
+        from .utils import CleanAndUploadProductUtils, ImputationStatistics
+        from .validators import InvalidRowsError, ProductDataValidator
+
+        workers = workers or settings.PARALLEL_CSV_WORKERS
+        header, ranges = ParallelCsvUtils.split_byte_ranges(path, workers)
+        if not header.strip():
+            raise ValidationError("The file is empty or cannot be read.")
+
+        if not ranges:
+            # The file only has a header.
+            parts = [_parse_bytes(header, b"")]
+        else:
+            executor = get_executor()
+            try:
+                futures = [executor.submit(_parse_range, path, header, start, end) for start, end in ranges]
+                parts = [future.result() for future in futures]
+            except BrokenProcessPool:
+                _discard_executor(executor)
+                raise
+
+        validator, statistics = ProductDataValidator(), ImputationStatistics()
+        frames, offset, duplicates_with_valid_values = [], 0, False
+        for frame, checks, part_statistics in parts:
+            # Number the rows from the start of the file rather than from the start of the range.
+            frame.index += offset
+            offset += len(frame)
+
+            valid = validator.validate(frame, checks)
+            duplicates_with_valid_values |= bool((valid != _has_valid_values(checks)).any())
+            frames.append(frame[valid])
+            statistics.merge(part_statistics)
+
+        if validator.invalid_rows and not skip_invalid:
+            raise InvalidRowsError(validator.report())
+
+        df = pd.concat(frames)
+        if duplicates_with_valid_values:
+            # The workers counted duplicates of other ranges in their statistics, so collect them again.
+            statistics = ImputationStatistics()
+            statistics.update(df)
+
+        return CleanAndUploadProductUtils.clean_product_data(df, statistics), validator.report()
+
+    @staticmethod
+    def split_byte_ranges(path, parts):
+        """
+        Splits the rows of the CSV file into at most `parts` contiguous byte ranges that start on line boundaries.
+
+        Line breaks inside quoted values do not end a row, so the file is scanned for quotes up to the last split
+        point. Escaped quotes come in pairs, so a line break is outside quotes when an even number of quotes
+        precedes it.
+
+        :param path: Path of the CSV file on disk.
+        :param parts: The wanted number of ranges.
+        :return: A tuple of the header line and a list of (start, end) byte offsets.
+        """
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            header = file.readline()
+            bounds = [file.tell()]
+            # The even split points, each moved to the start of the next row after it.
+            targets = [bounds[0] + (size - bounds[0]) * part // parts for part in range(1, parts)]
+            position, quoted = bounds[0], False
+            while targets and (block := file.read(SCAN_BLOCK_SIZE)):
+                index = 0
+                while targets and targets[0] < position + len(block):
+                    split = max(index, targets[0] - position)
+                    quoted ^= block.count(b'"', index, split) % 2 == 1
+                    index = split
+                    while (newline := block.find(b"\n", index)) != -1:
+                        quoted ^= block.count(b'"', index, newline) % 2 == 1
+                        index = newline + 1
+                        if not quoted:
+                            break
+                    if newline == -1:
+                        # The row goes on in the next block.
+                        targets[0] = position + len(block)
+                        break
+                    if bounds[-1] < position + index < size:
+                        bounds.append(position + index)
+                    targets = [target for target in targets if target >= position + index]
+                quoted ^= block.count(b'"', index) % 2 == 1
+                position += len(block)
+            bounds.append(size)
+
+        return header, [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def _setup_worker():
+    """
+    Sets Django up in worker processes that did not inherit it from the parent.
+    """
+    if not apps.ready:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shopping.settings")
+        django.setup()
+
+
+def _parse_range(path, header, start, end):
+    """
+    Parses one byte range of the CSV file.
+
+    :return: A tuple of the parsed DataFrame, its value checks and the ImputationStatistics of its valid rows.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        return _parse_bytes(header, file.read(end - start))
+
+
+def _parse_bytes(header, data):
+    """
+    Parses CSV rows preceded by the header line, checks their values and collects their statistics.
+
+    :return: A tuple of the parsed DataFrame, its value checks and the ImputationStatistics of its valid rows.
+    """
+    from .constants import REQUIRED_COLUMNS
+    from .utils import ImputationStatistics
+    from .validators import FileValidator, ProductDataValidator
+
+    try:
+        df = pd.read_csv(io.BytesIO(header + data))
+    except pd.errors.ParserError:
+        # Raise an error if there's an issue parsing the CSV file.
+        raise ValidationError("Error parsing the CSV file.")
+
+    # Validate the DataFrame to ensure it contains all required columns.
+    FileValidator.validate_columns(df, REQUIRED_COLUMNS)
+
+    checks = ProductDataValidator.check_values(df)
+    statistics = ImputationStatistics()
+    statistics.update(df[_has_valid_values(checks)])
+    return df, checks, statistics
+
+
+def _has_valid_values(checks):
+    """
+    Returns the boolean mask of the rows passing all the value checks.
+    """
+    return ~np.logical_or.reduce(list(checks.values()))
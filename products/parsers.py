@@ -0,0 +1,36 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+"""
+This module contains the request body parsers of the products app.
+"""
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses a newline delimited JSON body, one JSON value per line, into a list of values.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the lines of the body, ignoring blank lines.
+
+        :raises ParseError: If a line is not valid JSON, naming the line.
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        values = []
+        for number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                values.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f"NDJSON parse error on line {number} - {e}")
+        return values
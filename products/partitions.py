@@ -0,0 +1,328 @@
+import functools
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+"""
+This module spreads the products across the databases of settings.PRODUCT_PARTITIONS by the hash of their category.
+
+Every partition holds the products of its categories with their staging rows and category summaries, so a category
+is read from, and written to, a single partition. Writes select the partition of their products with partition(),
+which PartitionRouter sends the queries of the partitioned models to. Reads of several partitions query them in
+parallel on a bounded pool of threads and merge the results.
+
+The primary keys of the products of every partition start at a range of their own, so that they stay unique across
+partitions. A product moved to another partition, by a change of its category or by rebalance_partitions, gets a new
+primary key there, as products replaced by a full upload do. The unique index of product_id only covers its
+partition: new products are checked against every partition before they are created, a check that concurrent
+creations of a product_id in categories of different partitions can both pass.
+
+Writes are atomic within each partition only: an upload whose products span several partitions commits them
+partition by partition. A bulk create without skip_invalid holds the transactions of all its partitions instead, so
+that a conflicting product_id in one of them creates no product in any. An append moving products to another
+partition commits every batch there before deleting it from the old one, so readers may briefly see a moved product in
+both.
+"""
+
+# Number of primary keys reserved for the products of every partition.
+PARTITION_ID_RANGE = 2 ** 40
+
+# Models stored in every partition, for the products of its categories.
+PARTITIONED_MODELS = {'products.product', 'products.productstaging', 'products.categorysummary'}
+
+_partition = ContextVar('product_partition', default=None)
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+@contextmanager
+def partition(alias):
+    """
+    Sends the queries of the partitioned models in the block to the partition of the given alias, or lets the other
+    routers choose their database if alias is None.
+    """
+    token = _partition.set(alias)
+    try:
+        yield
+    finally:
+        _partition.reset(token)
+
+
+def get_executor():
+    """
+    Returns the process-wide pool querying the partitions in parallel, creating it on first use.
+
+    :return: A ThreadPoolExecutor with settings.PRODUCT_PARTITION_WORKERS threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PRODUCT_PARTITION_WORKERS,
+                                           thread_name_prefix="product-partition")
+        return _executor
+
+
+def _call_in_worker(call):
+    """
+    Calls the function on a pool thread and releases the thread's database connections afterwards, as Django does at
+    the end of a request.
+    """
+    _worker.active = True
+    try:
+        return call()
+    finally:
+        _worker.active = False
+        close_old_connections()
+
+
+def _call_in_partition(function, alias):
+    with partition(alias):
+        return function(alias)
+
+
+class PartitionRouter:
+    """
+    Database router sending the queries of the partitioned models within partition() to the selected partition.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PARTITIONED_MODELS:
+            return _partition.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+
+class PartitionUtils:
+    @staticmethod
+    def is_partitioned():
+        """
+        Returns whether the products are spread across partitions instead of being stored in the default database.
+        """
+        return bool(settings.PRODUCT_PARTITIONS)
+
+    @staticmethod
+    def aliases():
+        """
+        Returns the aliases of the databases storing the products: the partitions, or the default database.
+        """
+        return list(settings.PRODUCT_PARTITIONS) or [DEFAULT_DB_ALIAS]
+
+    @staticmethod
+    def fans_out():
+        """
+        Returns whether writes have to be spread across the partitions, as the products are partitioned and no
+        partition is selected.
+        """
+        return PartitionUtils.is_partitioned() and _partition.get() is None
+
+    @staticmethod
+    def current():
+        """
+        Returns the alias of the database the partitioned models are written to: the selected partition, or the
+        default database.
+        """
+        return _partition.get() or DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def partition_of(category):
+        """
+        Returns the alias of the database storing the products of the category.
+        """
+        aliases = PartitionUtils.aliases()
+        return aliases[zlib.crc32(str(category).encode()) % len(aliases)]
+
+    @staticmethod
+    def partitions_of(categories=None):
+        """
+        Returns the aliases of the databases storing the products of the categories, in the order of the partitions.
+
+        :param categories: A set of categories, or None for all of them.
+        """
+        aliases = PartitionUtils.aliases()
+        if categories is None:
+            return aliases
+        used = {PartitionUtils.partition_of(category) for category in categories}
+        return [alias for alias in aliases if alias in used]
+
+    @staticmethod
+    def alias_for(category):
+        """
+        Returns the alias of the database a product of the category is written to: the selected partition, the
+        partition of the category, or None to let the routers choose when the products are not partitioned.
+        """
+        if _partition.get() is not None or not PartitionUtils.is_partitioned():
+            return _partition.get()
+        return PartitionUtils.partition_of(category)
+
+    @staticmethod
+    def querysets(queryset, categories=None):
+        """
+        Returns the querysets reading the given one from the partitions storing the categories.
+
+        :param queryset: A queryset of a partitioned model.
+        :param categories: The set of categories the queryset is limited to, or None if it is not.
+        :return: The list of the querysets of the partitions, or of the queryset itself when the products are not
+            partitioned, so that it is read from the database the routers choose.
+        """
+        if not PartitionUtils.is_partitioned():
+            return [queryset]
+        return [queryset.using(alias) for alias in PartitionUtils.partitions_of(categories)] or [queryset.none()]
+
+    @staticmethod
+    def gather(calls):
+        """
+        Calls the functions in parallel on the pool, or in the calling thread if there is only one or the caller is
+        itself a thread of the pool.
+
+        :param calls: A list of callables without arguments.
+        :return: The list of their results, in the same order.
+        :raises Exception: The first error raised by a call, once all the calls have ended.
+        """
+        if len(calls) <= 1 or getattr(_worker, 'active', False):
+            return [call() for call in calls]
+        futures = [get_executor().submit(_call_in_worker, call) for call in calls]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def fan_out(function, aliases=None):
+        """
+        Calls function(alias) within partition(alias) for every partition, in parallel.
+
+        :param function: The function to call.
+        :param aliases: The aliases of the partitions to call it for. Defaults to all of them.
+        :return: A dict mapping every alias to the result of its call.
+        """
+        aliases = PartitionUtils.aliases() if aliases is None else list(aliases)
+        results = PartitionUtils.gather([functools.partial(_call_in_partition, function, alias) for alias in aliases])
+        return dict(zip(aliases, results))
+
+    @staticmethod
+    def split(df):
+        """
+        Splits a DataFrame of products by the partition of their category.
+
+        :param df: The DataFrame containing product data.
+        :return: A dict mapping the alias of every partition to its rows, or the current database to all of them if
+            the writes are not spread across partitions.
+        """
+        if not PartitionUtils.fans_out():
+            return {PartitionUtils.current(): df}
+        categories = df['category'].astype(str)
+        partitions = categories.map({category: PartitionUtils.partition_of(category)
+                                     for category in categories.unique()})
+        return {alias: df[(partitions == alias).to_numpy()] for alias in PartitionUtils.aliases()}
+
+    @staticmethod
+    def apply(function, df=None):
+        """
+        Calls a function writing products in the database they belong to: in the current one if the writes are not
+        spread across partitions, otherwise within every partition, in parallel.
+
+        :param function: The function to call, with the rows of df belonging to the database if df is given.
+        :param df: Optional DataFrame of products. Partitions without any of its rows are skipped.
+        :return: The list of the results of the calls.
+        """
+        if not PartitionUtils.fans_out():
+            return [function() if df is None else function(df)]
+        if df is None:
+            return list(PartitionUtils.fan_out(lambda alias: function()).values())
+        groups = {alias: rows for alias, rows in PartitionUtils.split(df).items() if len(rows)}
+        return list(PartitionUtils.fan_out(lambda alias: function(groups[alias]), groups).values())
+
+    @staticmethod
+    def reserve_ids(alias):
+        """
+        Starts the primary keys of the products of a SQLite partition at the range of the partition, unless they are
+        past its start already. Other databases must be configured to do so when they are created.
+
+        :param alias: The alias of a partition, current or retired. Other aliases are left alone.
+        """
+        from .models import Product
+
+        partitions = list(settings.PRODUCT_PARTITIONS) + list(settings.PRODUCT_RETIRED_PARTITIONS)
+        if alias not in partitions or connections[alias].vendor != 'sqlite':
+            return
+
+        start = (partitions.index(alias) + 1) * PARTITION_ID_RANGE
+        table = Product._meta.db_table
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s", [start, table, start])
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                           "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)", [table, start, table])
+
+    @staticmethod
+    def rebalance(batch_size=None):
+        """
+        Moves the products stored outside the partition of their category to it, after the number of partitions
+        changed. The default database and the retired partitions of settings.PRODUCT_RETIRED_PARTITIONS are drained
+        too, so that partitioning can be turned on or off, and the partitions are drained in parallel.
+
+        :param batch_size: Number of products moved per transaction. Defaults to settings.PRODUCT_UPLOAD_BATCH_SIZE.
+        :return: A dict mapping every database products were moved from to the number of products moved.
+        """
+        from .models import Product
+
+        sources = list(dict.fromkeys([DEFAULT_DB_ALIAS, *PartitionUtils.aliases(),
+                                      *settings.PRODUCT_RETIRED_PARTITIONS]))
+
+        def drain(source):
+            categories = Product.objects.using(source).values_list('category', flat=True).distinct()
+            return sum(PartitionUtils.move_category(category, source, PartitionUtils.partition_of(category),
+                                                    batch_size)
+                       for category in list(categories) if PartitionUtils.partition_of(category) != source)
+
+        moved = PartitionUtils.gather([functools.partial(drain, source) for source in sources])
+        return {source: count for source, count in zip(sources, moved) if count}
+
+    @staticmethod
+    def move_category(category, source, target, batch_size=None):
+        """
+        Moves the products of a category from one database to another, one batch per transaction in each. Products
+        are inserted in the target before being deleted from the source, and products already in the target are not
+        copied again, so an interrupted move is resumed by running it again.
+
+        :param category: The category whose products are moved.
+        :param source: The alias of the database they are moved from.
+        :param target: The alias of the database they are moved to.
+        :param batch_size: Number of products moved per transaction. Defaults to settings.PRODUCT_UPLOAD_BATCH_SIZE.
+        :return: The number of products moved.
+        """
+        from .models import Product
+        from .signals import catalog_changed
+        from .summaries import CategorySummaryChanges
+
+        batch_size = batch_size or settings.PRODUCT_UPLOAD_BATCH_SIZE
+        fields = [field.attname for field in Product._meta.concrete_fields if not field.primary_key]
+        moved = 0
+        while batch := list(Product.objects.using(source).filter(category=category).order_by('id')[:batch_size]):
+            with partition(target), transaction.atomic(using=target):
+                copied = set(Product.objects.filter(product_id__in=[product.product_id for product in batch])
+                             .values_list('product_id', flat=True))
+                copies = [Product(**{field: getattr(product, field) for field in fields})
+                          for product in batch if product.product_id not in copied]
+                Product.objects.bulk_create(copies)
+                if copies:
+                    changes = CategorySummaryChanges()
+                    for product in copies:
+                        changes.add(product)
+                    catalog_changed.send(sender=Product, changes=changes)
+
+            with partition(source), transaction.atomic(using=source):
+                changes = CategorySummaryChanges()
+                for product in batch:
+                    changes.remove(product.pk, product.category, product.price)
+                Product.objects.filter(pk__in=[product.pk for product in batch]).delete()
+                catalog_changed.send(sender=Product, changes=changes)
+            moved += len(batch)
+
+        return moved
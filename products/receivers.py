@@ -0,0 +1,62 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from shopping.replica import ReplicaUtils
+from .cache import get_report_cache
+from .models import ProductCatalogState
+from .partitions import PartitionUtils
+from .signals import catalog_changed
+from .utils import SummaryReportUtils
+
+"""
+This module contains the receivers keeping derived catalog data up to date. It is imported by ProductsConfig.ready().
+"""
+
+
+@receiver(catalog_changed)
+def record_catalog_change(sender, **kwargs):
+    """
+    Bumps the catalog version and forgets the fingerprint of the last upload, as the catalog no longer matches it.
+
+    The catalog state lives in the default database, so a change of a partition bumps it once the change is
+    committed, lest a report of the former products be cached for the new version.
+    """
+    using = PartitionUtils.current()
+    if using == DEFAULT_DB_ALIAS:
+        ProductCatalogState.record_change()
+    else:
+        transaction.on_commit(ProductCatalogState.record_change, using=using)
+
+
+@receiver(catalog_changed)
+def update_category_summaries(sender, changes=None, **kwargs):
+    """
+    Updates the summaries of the changed categories, in the transaction of the change.
+    """
+    SummaryReportUtils.update_category_summaries(changes)
+
+
+@receiver(catalog_changed)
+def invalidate_report_cache(sender, **kwargs):
+    """
+    Evicts the cached summary reports, generated for a former version of the catalog.
+    """
+    get_report_cache().invalidate()
+
+
+@receiver(catalog_changed)
+def refresh_replica(sender, **kwargs):
+    """
+    Refreshes the SQLite replica, if any, once the change is committed.
+    """
+    transaction.on_commit(ReplicaUtils.schedule_refresh)
+
+
+@receiver(post_migrate)
+def reserve_partition_ids(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Starts the primary keys of the products of a partition at its own range, once its tables are created.
+    """
+    if sender.name == 'products':
+        PartitionUtils.reserve_ids(using)
@@ -0,0 +1,282 @@
+import csv
+import functools
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Sum, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from .constants import REPORT_DIMENSIONS, REPORT_FIELDS
+from .partitions import PartitionUtils
+
+"""
+This module contains the report engine, summarizing the products by any dimensions with the metrics and top products
+chosen by the caller.
+
+Every group is computed in one query with window functions: the metrics are aggregated over the partition of the group,
+and ROW_NUMBER() ranks its products to keep the top ones, so no product is read into Python besides those. The rows
+come out ordered by group and are encoded as they are read.
+
+Partitioned products are summarized by every partition in parallel, and the groups of the partitions are merged.
+"""
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, for csv.writer to encode one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ReportDefinition:
+    """
+    Dimensions, metrics and top products of a report, as requested by the query parameters of the report endpoint.
+
+    ?group_by= lists the dimensions, ?metrics= the metrics as <aggregate>:<field> or count, and ?top= the number of
+    top products of every group by ?top_by=. The products are filtered as the product list filters them, and
+    ?output= is csv or json.
+    """
+    group_by_param = 'group_by'
+    metrics_param = 'metrics'
+    top_param = 'top'
+    top_by_param = 'top_by'
+    output_param = 'output'
+    # Query parameters of the report itself, the others filtering the products.
+    params = [group_by_param, metrics_param, top_param, top_by_param, output_param]
+
+    aggregates = {'sum': Sum, 'mean': Avg, 'min': Min, 'max': Max}
+    content_types = {'csv': 'text/csv', 'json': 'application/json'}
+    default_metrics = 'count,sum:revenue'
+
+    def __init__(self, dimensions, metrics, top, top_by, output):
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.top = top
+        self.top_by = top_by
+        self.output = output
+
+    @classmethod
+    def parse_output(cls, params):
+        """
+        Returns the output format requested, csv by default.
+
+        :raises ValidationError: If the format is neither csv nor json.
+        """
+        output = params.get(cls.output_param, 'csv')
+        if output not in cls.content_types:
+            raise ValidationError({cls.output_param: ["output must be csv or json."]})
+        return output
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Parses the definition of a report from query parameters.
+
+        :param params: The query parameters of the request.
+        :return: The ReportDefinition.
+        :raises ValidationError: If a parameter names an unknown dimension, metric or field, or top is not a number
+            between 0 and settings.REPORT_MAX_TOP.
+        """
+        dimensions = [dimension for dimension in params.get(cls.group_by_param, 'category').split(',') if dimension]
+        unknown = [dimension for dimension in dimensions if dimension not in REPORT_DIMENSIONS]
+        if unknown or len(set(dimensions)) != len(dimensions):
+            raise ValidationError({cls.group_by_param: [
+                f"group_by must list distinct dimensions among {', '.join(REPORT_DIMENSIONS)}."]})
+
+        metrics = []
+        for metric in params.get(cls.metrics_param, cls.default_metrics).split(','):
+            aggregate, _, field = metric.partition(':')
+            if metric == 'count':
+                metrics.append(('count', None))
+            elif aggregate in cls.aggregates and field in REPORT_FIELDS:
+                metrics.append((aggregate, field))
+            else:
+                raise ValidationError({cls.metrics_param: [
+                    f"metrics must list count or <aggregate>:<field> with an aggregate among "
+                    f"{', '.join(cls.aggregates)} and a field among {', '.join(REPORT_FIELDS)}."]})
+        if len(set(metrics)) != len(metrics):
+            raise ValidationError({cls.metrics_param: ["metrics must be distinct."]})
+
+        top_by = params.get(cls.top_by_param, 'quantity_sold')
+        if top_by not in REPORT_FIELDS:
+            raise ValidationError({cls.top_by_param: [f"top_by must be one of {', '.join(REPORT_FIELDS)}."]})
+        try:
+            top = int(params.get(cls.top_param, 1 if cls.top_by_param in params else 0))
+        except ValueError:
+            top = -1
+        if not 0 <= top <= settings.REPORT_MAX_TOP:
+            raise ValidationError({cls.top_param: [
+                f"top must be an integer between 0 and {settings.REPORT_MAX_TOP}."]})
+
+        return cls(dimensions, metrics, top, top_by, cls.parse_output(params))
+
+    @staticmethod
+    def metric_name(aggregate, field):
+        return aggregate if field is None else f'{aggregate}_{field}'
+
+    @property
+    def metric_names(self):
+        return [self.metric_name(aggregate, field) for aggregate, field in self.metrics]
+
+
+class ReportEngine:
+    @staticmethod
+    def field_expression(field):
+        """
+        Returns the expression of a report field: a numeric field of the product, or its revenue.
+        """
+        if field == 'revenue':
+            return ExpressionWrapper(F('price') * F('quantity_sold'), output_field=FloatField())
+        return F(field)
+
+    @staticmethod
+    def iter_groups(products, definition, chunk_size=None):
+        """
+        Summarizes the products by the dimensions of the report, in one query.
+
+        :param products: Queryset of Product objects.
+        :param definition: The ReportDefinition.
+        :param chunk_size: Number of rows read from the database at a time.
+            Defaults to settings.PRODUCT_EXPORT_CHUNK_SIZE.
+        :return: An iterator of dicts with the dimensions and metrics of every group, ordered by its dimensions, and
+            its top products under 'top' if requested.
+        """
+        partition = [F(dimension) for dimension in definition.dimensions] or None
+        windows = {}
+        for aggregate, field in definition.metrics:
+            function = Count('id') if field is None else ReportDefinition.aggregates[aggregate](
+                ReportEngine.field_expression(field))
+            windows[definition.metric_name(aggregate, field)] = Window(function, partition_by=partition)
+
+        top_value = f'top_{definition.top_by}'
+        rows = products.annotate(
+            **windows,
+            **{top_value: ReportEngine.field_expression(definition.top_by)},
+            report_rank=Window(RowNumber(), partition_by=partition,
+                               order_by=[F(top_value).desc(), F('id').asc()]),
+        ).filter(report_rank__lte=max(definition.top, 1)).order_by(*definition.dimensions, 'report_rank').values_list(
+            *definition.dimensions, *definition.metric_names, 'product_id', 'product_name', top_value)
+
+        width = len(definition.dimensions) + len(definition.metrics)
+        for _, group_rows in groupby(rows.iterator(chunk_size=chunk_size or settings.PRODUCT_EXPORT_CHUNK_SIZE),
+                                     key=lambda row: row[:len(definition.dimensions)]):
+            group_rows = list(group_rows)
+            group = dict(zip(definition.dimensions + definition.metric_names, group_rows[0][:width]))
+            if definition.top:
+                group['top'] = [{'product_id': product_id, 'product_name': product_name, definition.top_by: value}
+                                for product_id, product_name, value in (row[width:] for row in group_rows)]
+            yield group
+
+    @staticmethod
+    def merge_groups(querysets, definition):
+        """
+        Summarizes the products of every partition in parallel and merges their groups.
+
+        Groups of the same dimensions in several partitions are combined: their counts and sums are added, the
+        minimum and maximum kept, means weighted by the number of products of every group, and top products merged
+        by their top_by value. The groups of every partition are held in memory until they are merged.
+
+        :param querysets: The querysets of Product objects of the partitions.
+        :param definition: The ReportDefinition.
+        :return: An iterator of groups, as iter_groups returns them.
+        """
+        # The number of products of every group weighs its mean.
+        count = ReportDefinition.metric_name('count', None)
+        metrics = definition.metrics + [('count', None)] * (('count', None) not in definition.metrics)
+        counted = ReportDefinition(definition.dimensions, metrics, definition.top, definition.top_by,
+                                   definition.output)
+
+        def summarize(queryset):
+            return list(ReportEngine.iter_groups(queryset, counted))
+
+        partitions = PartitionUtils.gather([functools.partial(summarize, queryset) for queryset in querysets])
+
+        def key(group):
+            return [group[dimension] for dimension in definition.dimensions]
+
+        for _, groups in groupby(heapq.merge(*partitions, key=key), key=key):
+            groups = list(groups)
+            merged = {dimension: groups[0][dimension] for dimension in definition.dimensions}
+            for aggregate, field in definition.metrics:
+                name = definition.metric_name(aggregate, field)
+                values = [group[name] for group in groups]
+                if aggregate in ('count', 'sum'):
+                    merged[name] = sum(values)
+                elif aggregate in ('min', 'max'):
+                    merged[name] = min(values) if aggregate == 'min' else max(values)
+                else:
+                    merged[name] = (sum(value * group[count] for value, group in zip(values, groups))
+                                    / sum(group[count] for group in groups))
+            if definition.top:
+                merged['top'] = list(islice(heapq.merge(*(group['top'] for group in groups),
+                                                        key=lambda product: product[definition.top_by],
+                                                        reverse=True), definition.top))
+            yield merged
+
+    @staticmethod
+    def columns(definition):
+        """
+        Returns the CSV header of a report, with the product id, name and top_by value of every top product.
+        """
+        columns = definition.dimensions + definition.metric_names
+        for rank in range(1, definition.top + 1):
+            columns += [f'top_{rank}_product_id', f'top_{rank}_product_name', f'top_{rank}_{definition.top_by}']
+        return columns
+
+    @staticmethod
+    def stream_report(products, definition):
+        """
+        Streams the report of the products as CSV, one row per group, or as a JSON array of groups.
+
+        :param products: Queryset of Product objects, or the list of the querysets of the partitions.
+        :param definition: The ReportDefinition.
+        :return: A StreamingHttpResponse of the encoded report.
+        """
+        if not isinstance(products, list):
+            groups = ReportEngine.iter_groups(products, definition)
+        elif len(products) == 1:
+            groups = ReportEngine.iter_groups(products[0], definition)
+        else:
+            groups = ReportEngine.merge_groups(products, definition)
+        if definition.output == 'json':
+            chunks = ReportEngine.iter_json(groups)
+        else:
+            chunks = ReportEngine.iter_csv(ReportEngine.columns(definition), (
+                [*(group[name] for name in definition.dimensions + definition.metric_names),
+                 *(value for product in group.get('top', []) for value in product.values()),
+                 *[''] * 3 * (definition.top - len(group.get('top', [])))]
+                for group in groups))
+
+        response = StreamingHttpResponse(chunks, content_type=ReportDefinition.content_types[definition.output])
+        if definition.output == 'csv':
+            response['Content-Disposition'] = 'attachment; filename="report.csv"'
+        return response
+
+    @staticmethod
+    def iter_csv(columns, rows):
+        """
+        Encodes the header and the rows as CSV, one line at a time.
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    @staticmethod
+    def iter_json(objects):
+        """
+        Encodes the objects as one JSON array, one object at a time.
+        """
+        renderer = JSONRenderer()
+        yield b'['
+        separator = b''
+        for data in objects:
+            yield separator + renderer.render(data)
+            separator = b','
+        yield b']'
@@ -1,6 +1,11 @@
+from collections.abc import Mapping
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import Product
-from .constants import POSITIVE_FIELDS_OF_PRODUCT
+from django.utils import timezone
+from .models import Product, UploadJob
+from .constants import POSITIVE_FIELDS_OF_PRODUCT, MAX_RATING
+from .partitions import PartitionUtils
 from .utils import validate_non_negative
 
 
@@ -16,7 +21,98 @@ class ProductSerializer(serializers.ModelSerializer):
     def to_internal_value(self, data):
         fields_to_validate = POSITIVE_FIELDS_OF_PRODUCT
 
+        # Data that is not a dict is rejected by the serializer itself.
+        if not isinstance(data, Mapping):
+            return super().to_internal_value(data)
+
         for field in fields_to_validate:
-            validate_non_negative(data.get(field), field)
+            try:
+                validate_non_negative(data.get(field), field)
+            except DjangoValidationError as e:
+                # Report the error on the field, as the serializer fields do.
+                raise serializers.ValidationError({field: e.messages})
 
         return super().to_internal_value(data)
+
+    def validate_product_id(self, value):
+        # The unique validator only reads the default database, while partitioned products are stored in the
+        # partitions.
+        if PartitionUtils.is_partitioned() and any(PartitionUtils.gather([
+                products.exists for products in PartitionUtils.querysets(Product.objects.filter(product_id=value))])):
+            raise serializers.ValidationError("product with this product id already exists.")
+        return value
+
+    def validate_rating(self, value):
+        if value > MAX_RATING:
+            raise serializers.ValidationError(f"Rating cannot be more than {MAX_RATING}.")
+        return value
+
+
+def compile_columns(serializer_class):
+    """
+    Maps the fields of a model serializer to the model columns read for them.
+
+    :param serializer_class: The ModelSerializer whose output is reproduced.
+    :return: A tuple of the list of output names and the list of model columns, in the same order.
+    :raises ImproperlyConfigured: If a field does not represent a model column as it is stored.
+    """
+    # Serializer field types whose representation of a stored value is the value itself.
+    identity_field_types = (serializers.IntegerField, serializers.FloatField, serializers.CharField)
+
+    names, columns = [], []
+    for name, field in serializer_class().fields.items():
+        if not isinstance(field, identity_field_types) or '.' in field.source:
+            raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} cannot be read from a values_list row.")
+        names.append(name)
+        columns.append(field.source)
+    return names, columns
+
+
+class ProductReadSerializer:
+    """
+    read-only serializer giving the output of ProductSerializer from values_list rows, without building model
+    instances or calling a serializer field per value
+    """
+    names, columns = compile_columns(ProductSerializer)
+
+    def __init__(self, rows):
+        """
+        :param rows: The tuples of values of ProductReadSerializer.columns, as returned by rows_of().
+        """
+        self.rows = rows
+
+    @classmethod
+    def rows_of(cls, queryset, named=False):
+        """
+        Returns the queryset reading the values to serialize, as named tuples if requested.
+        """
+        return queryset.values_list(*cls.columns, named=named)
+
+    @property
+    def data(self):
+        """
+        Returns the serialized rows, as a list of dicts equal to ProductSerializer(many=True).data.
+        """
+        names = self.names
+        return [dict(zip(names, row)) for row in self.rows]
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """
+    serializer for reporting the state and progress of a background upload job
+    """
+    throughput = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'state', 'operation_type', 'differential', 'rows_processed', 'throughput', 'errors',
+                  'changes', 'created_at', 'started_at', 'finished_at']
+
+    def get_throughput(self, job):
+        """
+        Returns the rows saved per second since the job started, or None if it has not started.
+        """
+        if job.started_at is None:
+            return None
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        return round(job.rows_processed / elapsed, 1) if elapsed > 0 else None
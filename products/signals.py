@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+"""
+This module contains the signals sent by the products app.
+"""
+
+# Sent after products are created, updated or deleted, by single saves and deletes as well as by bulk uploads, in the
+# transaction of the change. The changes argument is a CategorySummaryChanges with the products removed and added, or
+# None if any product may have changed.
+catalog_changed = Signal()
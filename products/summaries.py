@@ -0,0 +1,45 @@
+from collections import defaultdict
+
+"""
+This module collects the changes of the products that the category summaries of the summary report are updated by.
+"""
+
+
+class CategorySummaryChanges:
+    """
+    Collects the products removed and added by a change of the catalog, so that the summaries of their categories are
+    updated by difference instead of being recomputed from all their products.
+
+    An updated product is removed with its stored values and added with its new ones.
+    """
+
+    def __init__(self):
+        self.revenue = defaultdict(float)
+        self.counts = defaultdict(int)
+        # Primary keys of the removed products of each category, which may have been its top product.
+        self.removed = defaultdict(set)
+        # Best seller among the added products of each category, as (quantity_sold, -id, product_name).
+        self.best = {}
+
+    @property
+    def categories(self):
+        return self.counts.keys()
+
+    def remove(self, pk, category, price):
+        """
+        Records a product removed from its category, with its stored values.
+        """
+        self.revenue[category] -= price
+        self.counts[category] -= 1
+        self.removed[category].add(pk)
+
+    def add(self, product):
+        """
+        Records a saved product added to its category.
+        """
+        category = product.category
+        self.revenue[category] += float(product.price)
+        self.counts[category] += 1
+        candidate = (int(product.quantity_sold), -product.id, product.product_name)
+        if category not in self.best or candidate > self.best[category]:
+            self.best[category] = candidate
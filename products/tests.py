@@ -1,11 +1,48 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import StreamingHttpResponse
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIRequestFactory
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
 from unittest.mock import patch, MagicMock
-from .models import Product
-from .views import CleanAndUploadProductView, SummaryReportView
+from .jobs import UploadJobUtils
+from .admin import ProductAdmin
+from .bulk import ProductBulkCreateUtils
+from .cache import LRUReportCacheBackend, get_report_cache
+from .models import CategorySummary, Product, ProductCatalogState, ProductStaging, UploadJob
+from .parallel import ParallelCsvUtils
+from . import partitions
+from .partitions import PARTITION_ID_RANGE
+from .constants import LEADERBOARD_METRICS, REQUIRED_COLUMNS
+from .exports import ProductExportUtils
+from .serializers import ProductReadSerializer, ProductSerializer, compile_columns
+from .utils import CleanAndUploadProductUtils, SummaryReportUtils
+from .validators import ProductDataValidator
+from .views import (CleanAndUploadProductView, LeaderboardView, ProductListView, ReportCacheView, SummaryReportView,
+                    UploadJobView)
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from rest_framework.response import Response
+from shopping.blocking import STREAM_BUFFER_CHUNKS, offload_view, stream_blocking
+from shopping.database import database_profile
+from shopping.replica import ReplicaRouter, ReplicaUtils, replica_reads
 
 
 class ProductViewsTestCase(TestCase):
@@ -15,10 +52,11 @@ class ProductViewsTestCase(TestCase):
 
     @patch('products.views.FileValidator.validate_file')
     @patch('products.views.CleanAndUploadProductUtils.process_csv_file')
+    @patch('products.views.CleanAndUploadProductUtils.validate_product_data')
     @patch('products.views.CleanAndUploadProductUtils.clean_product_data')
     @patch('products.views.CleanAndUploadProductUtils.save_products_to_db')
-    def test_clean_and_upload_product_view(self, mock_save_products, mock_clean_data, mock_process_file,
-                                           mock_validate_file):
+    def test_clean_and_upload_product_view(self, mock_save_products, mock_clean_data, mock_validate_data,
+                                           mock_process_file, mock_validate_file):
         mock_file = InMemoryUploadedFile(
             file=MagicMock(),
             field_name='file',
@@ -29,6 +67,7 @@ class ProductViewsTestCase(TestCase):
         )
         mock_validate_file.return_value = None
         mock_process_file.return_value = MagicMock()
+        mock_validate_data.return_value = (MagicMock(), {"invalid_rows": 0})
         mock_clean_data.return_value = MagicMock()
 
         url = '/upload-file'  # Direct endpoint path
@@ -44,11 +83,34 @@ class ProductViewsTestCase(TestCase):
         self.assertEqual(actual_file.name, 'test.csv')
         self.assertEqual(actual_file.content_type, 'text/csv')
         mock_process_file.assert_called_once()
+        mock_validate_data.assert_called_once()
         mock_clean_data.assert_called_once()
         mock_save_products.assert_called_once()
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data, {"success": "Products processed and uploaded successfully"})
 
+    @override_settings(MAX_FILE_SIZE=10)
+    @patch('products.views.CleanAndUploadProductUtils.stream_products_to_db')
+    def test_clean_and_upload_product_view_streaming_skips_size_limit(self, mock_stream_products):
+        mock_stream_products.return_value = ({"invalid_rows": 0},
+                                             {"inserted": 1, "updated": 0, "unchanged": 0, "deleted": 0})
+        upload = SimpleUploadedFile('test.csv', b'x' * 100, content_type='text/csv')
+        request = self.factory.post('/upload-file?stream=true', {'file': upload}, format='multipart')
+
+        response = CleanAndUploadProductView.as_view()(request)
+
+        mock_stream_products.assert_called_once()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(MAX_FILE_SIZE=10)
+    def test_clean_and_upload_product_view_rejects_large_file(self):
+        upload = SimpleUploadedFile('test.csv', b'x' * 100, content_type='text/csv')
+        request = self.factory.post('/upload-file', {'file': upload}, format='multipart')
+
+        response = CleanAndUploadProductView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @patch('products.views.SummaryReportUtils.generate_summary_report')
     def test_summary_report_view(self, mock_generate_report):
         # Arrange
@@ -76,6 +138,59 @@ class ProductViewsTestCase(TestCase):
         self.assertEqual(response.status_code, mock_response.status_code)
         self.assertEqual(response.data, mock_response.data)
 
+    def test_clean_and_upload_product_view_reports_invalid_rows(self):
+        csv_content = (
+            b"product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            b"p1,One,A,10.0,5,4.0,3\n"
+            b"p2,Two,B,-20.0,6,4.0,4\n"
+        )
+        request = self.factory.post('/upload-file', {'file': SimpleUploadedFile('test.csv', csv_content)},
+                                    format='multipart')
+
+        response = CleanAndUploadProductView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["report"]["errors"], [{"row": 3, "errors": ["Price cannot be negative."]}])
+        self.assertFalse(Product.objects.exists())
+
+    def test_clean_and_upload_product_view_skips_invalid_rows(self):
+        csv_content = (
+            b"product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            b"p1,One,A,10.0,5,4.0,3\n"
+            b"p2,Two,B,-20.0,6,4.0,4\n"
+        )
+        request = self.factory.post('/upload-file?skip_invalid=true',
+                                    {'file': SimpleUploadedFile('test.csv', csv_content)}, format='multipart')
+
+        response = CleanAndUploadProductView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["skipped_rows"]["invalid_rows"], 1)
+        self.assertEqual(list(Product.objects.values_list("product_id", flat=True)), ["p1"])
+
+    def test_product_list_view_rejects_negative_values(self):
+        data = {"product_id": "p1", "product_name": "One", "category": "A", "price": -1, "quantity_sold": 1,
+                "rating": 4.0, "review_count": 1}
+        request = self.factory.post('/product', data, format='json')
+
+        response = ProductListView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"price": ["Price cannot be negative."]})
+
+    def test_product_list_view_rejects_duplicate_product_id(self):
+        Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=1,
+                               rating=1, review_count=1)
+        data = {"product_id": "p1", "product_name": "Other", "category": "B", "price": 2, "quantity_sold": 2,
+                "rating": 2.0, "review_count": 2}
+        request = self.factory.post('/product', data, format='json')
+
+        response = ProductListView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("product_id", response.data)
+        self.assertEqual(Product.objects.get().product_name, "One")
+
     def test_summary_report_view_no_products(self):
         url = '/report'
         request = self.factory.get(url)
@@ -85,3 +200,1443 @@ class ProductViewsTestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.data, {"error": "No products available for generating the summary."})
+
+
+class ProductKeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        # Few distinct ratings, so that pages split rows sharing the sort key.
+        for number in range(7):
+            Product.objects.create(product_id=f"p{number}", product_name=f"Product {number}", category="A",
+                                   price=number, quantity_sold=number, rating=number % 2, review_count=number)
+
+    def get_page(self, url):
+        response = ProductListView.as_view()(self.factory.get(url))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_pages_walk_forward_and_backward_through_ties(self):
+        expected = list(Product.objects.order_by("-rating", "id").values_list("product_id", flat=True))
+
+        pages, page = [], self.get_page('/product?ordering=-rating&page_size=3')
+        self.assertIsNone(page["previous"])
+        while True:
+            pages.append([product["product_id"] for product in page["results"]])
+            if page["next"] is None:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                page = self.get_page(page["next"])
+            # Pages seek to their position instead of skipping the rows before it.
+            self.assertNotIn("OFFSET", queries[0]["sql"])
+
+        self.assertEqual([product_id for ids in pages for product_id in ids], expected)
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+
+        # Walking back from the last page returns the same pages.
+        for ids in reversed(pages[:-1]):
+            page = self.get_page(page["previous"])
+            self.assertEqual([product["product_id"] for product in page["results"]], ids)
+        self.assertIsNone(page["previous"])
+
+    def test_pages_of_leaderboard_metrics_are_read_from_indexes(self):
+        for metric in LEADERBOARD_METRICS:
+            for url in [f'/product?ordering=-{metric}&page_size=2',
+                        f'/product?category=A&ordering=-{metric}&page_size=2']:
+                page = self.get_page(url)
+                page = self.get_page(page["next"])
+                for link in [url, page["next"], page["previous"]]:
+                    with CaptureQueriesContext(connection) as queries:
+                        self.get_page(link)
+                    with connection.cursor() as cursor:
+                        plan = str(cursor.execute("EXPLAIN QUERY PLAN " + queries[-1]["sql"]).fetchall())
+
+                    # Rows sharing the metric follow the index order, so pages in both directions are not sorted.
+                    self.assertIn("USING INDEX product_", plan, link)
+                    self.assertNotIn("TEMP B-TREE", plan, link)
+
+    def test_default_page_is_ordered_by_id(self):
+        with override_settings(PRODUCT_PAGE_SIZE=5):
+            page = self.get_page('/product')
+
+        self.assertEqual([product["product_id"] for product in page["results"]], [f"p{number}" for number in range(5)])
+        self.assertIsNotNone(page["next"])
+
+    def test_invalid_parameters_are_rejected(self):
+        page = self.get_page('/product?ordering=price&page_size=2')
+
+        # A cursor only applies to the ordering it was issued for.
+        response = ProductListView.as_view()(self.factory.get(page["next"].replace("ordering=price",
+                                                                                   "ordering=rating")))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = ProductListView.as_view()(self.factory.get('/product?cursor=garbage'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # A crafted cursor whose position is not a number is rejected before it reaches the filter.
+        for position in [{"v": [1], "i": 1}, {"v": {"a": 1}, "i": 1}, {"v": True, "i": 1}, {"v": 1.5, "i": "1"}]:
+            cursor = base64.urlsafe_b64encode(json.dumps({"o": ["price", False], "r": False, **position}).encode())
+            response = ProductListView.as_view()(self.factory.get(f'/product?ordering=price&cursor={cursor.decode()}'))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = ProductListView.as_view()(self.factory.get('/product?ordering=product_name'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = ProductListView.as_view()(self.factory.get('/product?page_size=0'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductFilterBackendTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        for number, (category, price, rating) in enumerate([("A", 10, 4.5), ("A", 20, 3.0), ("A", 30, 5.0),
+                                                            ("B", 40, 4.8), ("C", 50, 4.9)]):
+            Product.objects.create(product_id=f"p{number}", product_name=f"Product {number}", category=category,
+                                   price=price, quantity_sold=number, rating=rating, review_count=number * 10)
+
+    def get_product_ids(self, url):
+        response = ProductListView.as_view()(self.factory.get(url))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["product_id"] for product in response.data["results"]], response.data.get("count")
+
+    def test_top_rated_in_category(self):
+        self.assertEqual(self.get_product_ids('/product?category=A&min_rating=4&ordering=-rating&count=true'),
+                         (["p2", "p0"], 2))
+
+    def test_category_in_and_ranges(self):
+        self.assertEqual(self.get_product_ids('/product?category__in=A,B&min_price=20&max_price=40&ordering=-price'),
+                         (["p3", "p2", "p1"], None))
+        self.assertEqual(self.get_product_ids('/product?max_review_count=10&ordering=review_count'),
+                         (["p0", "p1"], None))
+
+    def test_count_covers_all_pages(self):
+        response = ProductListView.as_view()(self.factory.get('/product?min_quantity_sold=1&page_size=2&count=true'))
+
+        self.assertEqual(response.data["count"], 4)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_bound_is_rejected(self):
+        response = ProductListView.as_view()(self.factory.get('/product?min_price=cheap'))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"min_price": ["min_price must be a number."]})
+
+
+class ProductReadSerializerTestCase(TestCase):
+
+    def setUp(self):
+        Product.objects.create(product_id="p1", product_name="Prodüct \u2028 \"one\"", category="A", price=0.1,
+                               quantity_sold=0, rating=5, review_count=12)
+        Product.objects.create(product_id="p2", product_name="Two", category="B", price=1e-7, quantity_sold=2 ** 40,
+                               rating=3.3333333333333335, review_count=0)
+
+    def test_output_is_identical_to_product_serializer(self):
+        products = Product.objects.order_by("id")
+
+        fast = ProductReadSerializer(ProductReadSerializer.rows_of(products)).data
+
+        self.assertEqual(JSONRenderer().render(fast),
+                         JSONRenderer().render(ProductSerializer(products, many=True).data))
+
+    def test_product_list_view_output_is_identical_to_product_serializer(self):
+        response = ProductListView.as_view()(APIRequestFactory().get('/product'))
+        response.render()
+
+        expected = JSONRenderer().render(ProductSerializer(Product.objects.order_by("id"), many=True).data)
+        self.assertEqual(response.content, b'{"next":null,"previous":null,"results":' + expected + b'}')
+
+    def test_fields_computed_by_the_serializer_are_rejected(self):
+        class ComputedProductSerializer(ProductSerializer):
+            discounted_price = serializers.SerializerMethodField()
+
+            class Meta(ProductSerializer.Meta):
+                fields = ProductSerializer.Meta.fields + ['discounted_price']
+
+        with self.assertRaises(ImproperlyConfigured):
+            compile_columns(ComputedProductSerializer)
+
+
+class ProductExportUtilsTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        for number in range(5):
+            Product.objects.create(product_id=f"p{number}", product_name=f"Prodüct {number}",
+                                   category="A" if number % 2 else "B", price=number + 0.5, quantity_sold=number,
+                                   rating=4.0, review_count=number)
+
+    def stream(self, url):
+        response = ProductListView.as_view()(self.factory.get(url))
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b"".join(response.streaming_content)
+
+    @override_settings(PRODUCT_EXPORT_CHUNK_SIZE=2)
+    def test_json_stream_matches_rendered_list(self):
+        response, content = self.stream('/product?stream=json')
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        expected = JSONRenderer().render(ProductSerializer(Product.objects.order_by("id"), many=True).data)
+        self.assertEqual(content, expected)
+
+    def test_jsonl_stream_applies_filters(self):
+        response, content = self.stream('/product?stream=jsonl&category=A')
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line)["product_id"] for line in content.splitlines()], ["p1", "p3"])
+
+    def test_stream_is_encoded_chunk_by_chunk(self):
+        chunks = list(ProductExportUtils.iter_json_chunks(Product.objects.all(), "json", chunk_size=2))
+
+        # Opening bracket, three chunks of at most two products and closing bracket.
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(len(json.loads(b"".join(chunks))), 5)
+
+    def test_empty_stream_is_valid_json(self):
+        Product.objects.all().delete()
+
+        self.assertEqual(self.stream('/product?stream=json')[1], b"[]")
+
+    def test_unknown_stream_format_is_rejected(self):
+        response = ProductListView.as_view()(self.factory.get('/product?stream=xml'))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.product = Product.objects.create(product_id="p1", product_name="One", category="A", price=1,
+                                              quantity_sold=1, rating=1, review_count=1)
+
+    def get(self, view, url, **headers):
+        response = view.as_view()(self.factory.get(url, **headers))
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def test_unchanged_catalog_is_not_modified(self):
+        for view, url in [(ProductListView, '/product?category=A'), (SummaryReportView, '/report')]:
+            etag = self.get(view, url)["ETag"]
+
+            # Only the catalog state is read, not the products.
+            with self.assertNumQueries(1):
+                response = self.get(view, url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_every_write_path_changes_the_etag(self):
+        def etag():
+            return self.get(ProductListView, '/product')["ETag"]
+
+        etags = [etag()]
+
+        request = self.factory.post('/product', {"product_id": "p2", "product_name": "Two", "category": "B",
+                                                 "price": 2, "quantity_sold": 2, "rating": 2.0, "review_count": 2},
+                                    format='json')
+        self.assertEqual(ProductListView.as_view()(request).status_code, status.HTTP_201_CREATED)
+        etags.append(etag())
+
+        CleanAndUploadProductUtils.save_products_to_db(
+            pd.DataFrame([["p3", "Three", "C", 3.0, 3, 3.0, 3]], columns=REQUIRED_COLUMNS), "true")
+        etags.append(etag())
+
+        # As the admin saves a product.
+        self.product.price = 5
+        self.product.save()
+        etags.append(etag())
+
+        self.assertEqual(len(set(etags)), 4)
+        response = self.get(ProductListView, '/product', HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response["Last-Modified"])
+
+
+class AsyncViewsTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        for number in range(5):
+            Product.objects.create(product_id=f"p{number}", product_name=f"Product {number}", category="AB"[number % 2],
+                                   price=number, quantity_sold=number, rating=1, review_count=1)
+        get_report_cache.cache_clear()
+
+    def get(self, view, url):
+        @async_to_sync
+        async def get():
+            response = await offload_view(view.as_view())(self.factory.get(url))
+            if response.streaming:
+                response.body = b''.join([chunk async for chunk in response.streaming_content])
+            else:
+                response.body = response.content
+            return response
+
+        return get()
+
+    def test_async_views_match_sync_views(self):
+        sync_factory = APIRequestFactory()
+        for view, url in [(ProductListView, '/product?ordering=-price'), (ProductListView, '/product?stream=jsonl'),
+                          (LeaderboardView, '/leaderboard?category=A&metric=quantity_sold'),
+                          (SummaryReportView, '/report?group_by=category&top=2'), (SummaryReportView, '/report')]:
+            with self.subTest(url=url):
+                response = self.get(view, url)
+                expected = view.as_view()(sync_factory.get(url))
+                if hasattr(expected, 'render'):
+                    expected.render()
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response['Content-Type'], expected['Content-Type'])
+                self.assertEqual(response.body, b''.join(expected) if expected.streaming else expected.content)
+
+    def test_streamed_report_is_cached(self):
+        first = self.get(SummaryReportView, '/report?group_by=category&top=2')
+        second = self.get(SummaryReportView, '/report?group_by=category&top=2')
+        self.assertEqual((first['X-Report-Cache'], second['X-Report-Cache']), ('miss', 'hit'))
+        self.assertEqual(second.body, first.body)
+
+    def test_stream_stops_reading_when_client_goes_away(self):
+        read = []
+
+        def content():
+            for number in range(1000):
+                read.append(number)
+                yield str(number).encode()
+
+        @async_to_sync
+        async def read_two_chunks():
+            chunks = stream_blocking(content())
+            received = [await anext(chunks), await anext(chunks)]
+            await chunks.aclose()
+            return received
+
+        self.assertEqual(read_two_chunks(), [b'0', b'1'])
+        self.assertLess(len(read), 2 + STREAM_BUFFER_CHUNKS + 2)
+
+
+class DatabaseProfileTestCase(TestCase):
+
+    def test_performance_profile_configures_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, **database_profile("performance"),
+                             "NAME": os.path.join(directory, "db.sqlite3")}
+            profiled = connections["default"].__class__(settings_dict, alias="profiled")
+            try:
+                with profiled.cursor() as cursor:
+                    pragmas = {pragma: cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                               for pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size",
+                                              "busy_timeout")}
+                self.assertEqual(pragmas, {"journal_mode": "wal", "synchronous": 1, "mmap_size": 256 * 1024 * 1024,
+                                           "cache_size": -64 * 1024, "busy_timeout": 30000})
+                self.assertEqual(profiled.transaction_mode, "IMMEDIATE")
+                self.assertEqual((profiled.settings_dict["CONN_MAX_AGE"], profiled.settings_dict["CONN_HEALTH_CHECKS"]),
+                                 (600, True))
+            finally:
+                profiled.close()
+
+    def test_default_profile_is_stock_sqlite(self):
+        self.assertEqual(database_profile("default"), {})
+        with self.assertRaises(ValueError):
+            database_profile("fast")
+
+
+class ReplicaTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=1, rating=1,
+                               review_count=1)
+        get_report_cache.cache_clear()
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_router_sends_reads_within_replica_reads_to_the_replica(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            with replica_reads(False):
+                self.assertIsNone(router.db_for_read(Product))
+        with override_settings(DATABASE_REPLICA=None), replica_reads():
+            self.assertIsNone(router.db_for_read(Product))
+
+    # The test database stands in for the replica, told apart by the router returning its alias instead of None.
+    @override_settings(DATABASE_REPLICA='default')
+    def test_views_read_from_the_replica_unless_the_primary_is_requested(self):
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            routed.append(db_for_read(router, model, **hints))
+            return routed[-1]
+
+        with patch.object(ReplicaRouter, 'db_for_read', record):
+            for view, url in [(ProductListView, '/product'), (ProductListView, '/product?stream=jsonl'),
+                              (SummaryReportView, '/report?group_by=category&top=1')]:
+                for headers, expected in [({}, {'default'}), ({'HTTP_X_READ_PRIMARY': 'true'}, {None})]:
+                    with self.subTest(url=url, headers=headers):
+                        routed.clear()
+                        response = view.as_view()(self.factory.get(url, **headers))
+                        if hasattr(response, 'render'):
+                            response.render()
+                        # Streamed responses read the products as they are sent.
+                        list(response)
+                        self.assertEqual(set(routed), expected)
+
+    def test_copy_database_replaces_the_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary, replica = (connections["default"].__class__(
+                {**connection.settings_dict, "NAME": os.path.join(directory, f"{alias}.sqlite3")}, alias=alias)
+                for alias in ("primary", "replica"))
+            try:
+                with primary.cursor() as cursor:
+                    cursor.execute("CREATE TABLE product (name TEXT)")
+                    cursor.execute("INSERT INTO product VALUES ('One')")
+                with replica.cursor() as cursor:
+                    cursor.execute("CREATE TABLE stale (name TEXT)")
+
+                ReplicaUtils.copy_database(primary, replica)
+
+                with replica.cursor() as cursor:
+                    self.assertEqual(cursor.execute("SELECT name FROM product").fetchall(), [('One',)])
+                    self.assertEqual(cursor.execute("SELECT name FROM sqlite_master").fetchall(), [('product',)])
+            finally:
+                primary.close()
+                replica.close()
+
+    def test_no_replica_is_refreshed_by_default(self):
+        self.assertFalse(ReplicaUtils.refresh_replica())
+        with self.assertRaises(CommandError):
+            call_command("refresh_replica")
+
+
+@override_settings(PRODUCT_PARTITIONS=['products_0', 'products_1'])
+class PartitionTestCase(TransactionTestCase):
+    aliases = ['products_0', 'products_1']
+    # Every database, including the partitions added by setUpClass.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # The partitions are scratch SQLite files, migrated once for the whole class and flushed after every test.
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in cls.aliases:
+            connections.settings[alias] = {**connections["default"].settings_dict,
+                                           "NAME": os.path.join(cls.directory.name, f"{alias}.sqlite3")}
+        super().setUpClass()
+        for alias in cls.aliases:
+            call_command("migrate", database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        get_report_cache.cache_clear()
+        # Categories A to C belong to products_1, and D to F to products_0.
+        self.df = pd.DataFrame([[f"p{number}", f"Product {number}", "ABCDEF"[number % 6], float(number % 7 + 1),
+                                 number % 5, float(number % 4 + 1), number] for number in range(30)],
+                               columns=REQUIRED_COLUMNS)
+
+    def stored(self):
+        return {alias: dict(Product.objects.using(alias).values_list('product_id', 'category'))
+                for alias in self.aliases}
+
+    def assert_summaries_match(self):
+        call_command("rebuild_category_summaries", "--verify", stdout=io.StringIO())
+
+    def get(self, view, url):
+        response = view.as_view()(self.factory.get(url))
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_uploads_spread_products_by_category_with_unique_ids(self):
+        counts = CleanAndUploadProductUtils.save_products_to_db(self.df, None)
+
+        self.assertEqual(counts, {"inserted": 30, "updated": 0, "unchanged": 0, "deleted": 0})
+        stored = self.stored()
+        self.assertEqual(set(stored['products_0'].values()), set("DEF"))
+        self.assertEqual(set(stored['products_1'].values()), set("ABC"))
+        self.assertFalse(Product.objects.exists())
+        for number, alias in enumerate(self.aliases, start=1):
+            for pk in Product.objects.using(alias).values_list('id', flat=True):
+                self.assertTrue(number * PARTITION_ID_RANGE < pk < (number + 1) * PARTITION_ID_RANGE)
+        self.assert_summaries_match()
+        self.assertEqual(ProductCatalogState.load().version, 2)
+
+        # An append moving p0 from category A to D moves it to the other partition.
+        moved = pd.DataFrame([["p0", "Product 0", "D", 1.0, 1, 1.0, 1]], columns=REQUIRED_COLUMNS)
+        counts = CleanAndUploadProductUtils.save_products_to_db(moved, "true")
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "unchanged": 0, "deleted": 1})
+        stored = self.stored()
+        self.assertEqual((stored['products_0']['p0'], 'p0' in stored['products_1']), ("D", False))
+
+        # A streamed append looks the products it inserted up in the other partition, instead of scanning it.
+        moved = pd.DataFrame([["p1", "Product 1", "E", 1.0, 1, 1.0, 1], ["p2", "Product 2", "C", 1.0, 1, 1.0, 1]],
+                             columns=REQUIRED_COLUMNS)
+        # The partitions are written in this thread, as on a pool thread, so that their queries are captured.
+        with CaptureQueriesContext(connections['products_1']) as old, patch.object(partitions._worker, 'active', True,
+                                                                                   create=True):
+            report, counts = CleanAndUploadProductUtils.stream_products_to_db(
+                io.BytesIO(moved.to_csv(index=False).encode()), "true", chunk_size=1)
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "unchanged": 0, "deleted": 1})
+        self.assertEqual((self.stored()['products_0']['p1'], 'p1' in self.stored()['products_1']), ("E", False))
+        lookups = [query['sql'] for query in old.captured_queries
+                   if query['sql'].startswith('SELECT') and '"products_product"' in query['sql']]
+        self.assertTrue(lookups)
+        for sql in lookups:
+            self.assertIn('"products_product"."product_id" IN', sql)
+        self.assert_summaries_match()
+
+        # A streamed replace empties the partitions left without products.
+        file = io.BytesIO(self.df[self.df['category'] == "A"].to_csv(index=False).encode())
+        report, counts = CleanAndUploadProductUtils.stream_products_to_db(file, None, chunk_size=2)
+        self.assertEqual((counts["inserted"], counts["deleted"]), (5, 30))
+        stored = self.stored()
+        self.assertEqual((len(stored['products_0']), set(stored['products_1'].values())), (0, {"A"}))
+        self.assert_summaries_match()
+
+    def test_saving_a_product_moves_it_to_the_partition_of_its_category(self):
+        product = Product.objects.create(product_id="p1", product_name="One", category="A", price=1,
+                                         quantity_sold=1, rating=1, review_count=1)
+        self.assertEqual(self.stored(), {'products_0': {}, 'products_1': {"p1": "A"}})
+
+        product.category = "D"
+        product.save()
+
+        self.assertEqual(self.stored(), {'products_0': {"p1": "D"}, 'products_1': {}})
+        self.assert_summaries_match()
+        serializer = ProductSerializer(data={"product_id": "p1", "product_name": "One", "category": "B", "price": 1,
+                                             "quantity_sold": 1, "rating": 1, "review_count": 1})
+        self.assertFalse(serializer.is_valid())
+        created, results = ProductBulkCreateUtils.create_products([
+            {"product_id": "p1", "product_name": "One", "category": "B", "price": 1, "quantity_sold": 1, "rating": 1,
+             "review_count": 1},
+            {"product_id": "p2", "product_name": "Two", "category": "E", "price": 1, "quantity_sold": 1, "rating": 1,
+             "review_count": 1},
+        ], skip_invalid=True)
+        self.assertEqual([result["status"] for result in results], ["invalid", "created"])
+        self.assertEqual(self.stored()['products_0'], {"p1": "D", "p2": "E"})
+
+    def test_bulk_create_conflicting_in_one_partition_creates_nothing(self):
+        items = [{"product_id": product_id, "product_name": product_id, "category": category, "price": 1,
+                  "quantity_sold": 1, "rating": 1, "review_count": 1}
+                 for product_id, category in [("p1", "D"), ("p2", "A"), ("p3", "E")]]
+        validate_products = ProductBulkCreateUtils.validate_products
+
+        def validate_then_race(items):
+            # Another request creates p2 in products_1 once this one has checked that it is free, so the conflict is
+            # only found after the products of products_0 are inserted.
+            result = validate_products(items)
+            Product.objects.create(**{**items[1], "product_name": "Rival"})
+            return result
+
+        with patch.object(ProductBulkCreateUtils, 'validate_products', side_effect=validate_then_race):
+            created, results = ProductBulkCreateUtils.create_products(items)
+
+        self.assertFalse(created)
+        self.assertEqual([result["status"] for result in results], ["valid", "invalid", "valid"])
+        self.assertEqual(self.stored(), {'products_0': {}, 'products_1': {"p2": "A"}})
+        self.assert_summaries_match()
+
+    def test_reads_merge_the_partitions(self):
+        CleanAndUploadProductUtils.save_products_to_db(self.df, None)
+        products = sorted((row for alias in self.aliases
+                           for row in Product.objects.using(alias).values('id', 'price', 'category')),
+                          key=lambda row: (-row['price'], row['id']))
+
+        # Pages follow the order of all the products.
+        listed, url = [], '/product?ordering=-price&page_size=4&count=true'
+        while url:
+            data = self.get(ProductListView, url).data
+            self.assertEqual(data['count'], 30)
+            listed += [product['id'] for product in data['results']]
+            url = data['next']
+        self.assertEqual(listed, [row['id'] for row in products])
+        # Previous links read the pages before the last one back.
+        read_back, url = [], data['previous']
+        while url:
+            data = self.get(ProductListView, url).data
+            read_back = [product['id'] for product in data['results']] + read_back
+            url = data['previous']
+        self.assertEqual(read_back, listed[:28])
+
+        streamed = [json.loads(line)['id'] for line in b''.join(self.get(ProductListView, '/product?stream=jsonl'))
+                    .splitlines()]
+        self.assertEqual(streamed, sorted(row['id'] for row in products))
+
+        # A single category is read from its partition alone, in the thread of the request.
+        with CaptureQueriesContext(connections['products_1']) as own, \
+                CaptureQueriesContext(connections['products_0']) as other:
+            data = self.get(ProductListView, '/product?category=A').data
+            leaderboard = self.get(LeaderboardView, '/leaderboard?category=A&metric=quantity_sold').data
+        self.assertEqual({product['category'] for product in data['results']}, {"A"})
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual([product['quantity_sold'] for product in leaderboard['results']], [4, 3, 2, 1, 0])
+        self.assertTrue(own.captured_queries)
+        self.assertEqual(other.captured_queries, [])
+
+        summary = json.loads(self.get(SummaryReportView, '/report?output=json').content)
+        self.assertEqual([row['category'] for row in summary], list("ABCDEF"))
+        self.assertAlmostEqual(sum(row['total_revenue'] for row in summary), self.df['price'].sum())
+
+        # Groups spanning both partitions are combined.
+        response = self.get(SummaryReportView, '/report?group_by=rating&metrics=count,mean:price,max:quantity_sold'
+                                               '&top=2&top_by=price&output=json')
+        groups = json.loads(b''.join(response))
+        expected = self.df.groupby('rating').agg(count=('price', 'size'), mean_price=('price', 'mean'),
+                                                 max_quantity_sold=('quantity_sold', 'max'))
+        self.assertEqual([group['rating'] for group in groups], list(expected.index))
+        for group, (rating, row) in zip(groups, expected.iterrows()):
+            self.assertEqual((group['count'], group['max_quantity_sold']), (row['count'], row['max_quantity_sold']))
+            self.assertAlmostEqual(group['mean_price'], row['mean_price'])
+            self.assertEqual([product['price'] for product in group['top']],
+                             sorted(self.df[self.df['rating'] == rating]['price'], reverse=True)[:2])
+
+    def test_rebalance_moves_products_to_their_partitions(self):
+        with override_settings(PRODUCT_PARTITIONS=[]):
+            CleanAndUploadProductUtils.save_products_to_db(self.df, None)
+        self.assertEqual(Product.objects.count(), 30)
+
+        out = io.StringIO()
+        call_command("rebalance_partitions", "--batch-size", "4", stdout=out)
+
+        self.assertIn("Moved 30 products", out.getvalue())
+        self.assertFalse(Product.objects.exists() or CategorySummary.objects.exists())
+        stored = self.stored()
+        self.assertEqual((set(stored['products_0'].values()), set(stored['products_1'].values())),
+                         (set("DEF"), set("ABC")))
+        self.assert_summaries_match()
+
+        # Retiring a partition drains it into the remaining one.
+        with override_settings(PRODUCT_PARTITIONS=['products_0'], PRODUCT_RETIRED_PARTITIONS=['products_1']):
+            call_command("rebalance_partitions", stdout=io.StringIO())
+            self.assertEqual(len(self.stored()['products_0']), 30)
+            self.assert_summaries_match()
+        self.assertEqual(self.stored()['products_1'], {})
+
+
+class ReportCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=1, rating=1,
+                               review_count=1)
+        # Start from an empty cache with no hits or misses counted.
+        get_report_cache.cache_clear()
+
+    def get(self, url='/report'):
+        response = SummaryReportView.as_view()(self.factory.get(url))
+        # Streamed reports are cached once read entirely.
+        response.body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response
+
+    def assert_cached_until_change(self):
+        first = self.get()
+        # Only the catalog state is read, not the category summaries.
+        with self.assertNumQueries(1):
+            second = self.get()
+        self.assertEqual((first['X-Report-Cache'], second['X-Report-Cache']), ('miss', 'hit'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], 'text/csv')
+        streamed = self.get('/report?top=2&group_by=rating')
+        self.assertEqual(streamed['X-Report-Cache'], 'miss')
+        cached = self.get('/report?group_by=rating&top=2')
+        self.assertEqual(cached['X-Report-Cache'], 'hit')
+        self.assertEqual((cached.body, cached['Content-Type']), (streamed.body, streamed['Content-Type']))
+
+        Product.objects.create(product_id="p2", product_name="Two", category="B", price=2, quantity_sold=2, rating=2,
+                               review_count=2)
+        third = self.get()
+        self.assertEqual(third['X-Report-Cache'], 'miss')
+        self.assertIn(b"B,2.0,Two,2", third.content)
+        return third
+
+    def test_report_is_cached_until_the_catalog_changes(self):
+        report = self.assert_cached_until_change()
+
+        self.assertEqual(ReportCacheView.as_view()(self.factory.get('/report/cache')).data,
+                         {'backend': 'lru', 'hits': 2, 'misses': 3, 'entries': 1, 'bytes': len(report.content)})
+
+    @override_settings(REPORT_CACHE_BACKEND='default',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_report_is_cached_by_django_cache(self):
+        self.assert_cached_until_change()
+
+        self.assertEqual(get_report_cache().stats(), {'backend': 'django', 'hits': 2, 'misses': 3})
+
+    def test_lru_backend_evicts_least_recently_used_reports(self):
+        backend = LRUReportCacheBackend(max_bytes=10)
+        backend.set('a', ('text/csv', None, b'1234'))
+        backend.set('b', ('text/csv', None, b'1234'))
+        backend.get('a')
+        backend.set('c', ('text/csv', None, b'1234'))
+        backend.set('too large', ('text/csv', None, b'12345678901'))
+
+        self.assertEqual(list(backend.entries), ['a', 'c'])
+        self.assertEqual(backend.stats(), {'entries': 2, 'bytes': 8})
+
+
+class ReportEngineTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        get_report_cache.cache_clear()
+        for product_id, category, price, quantity_sold, rating in [
+            ("p1", "A", 2.0, 10, 4.0),
+            ("p2", "A", 5.0, 3, 3.0),
+            ("p3", "A", 1.0, 20, 4.0),
+            ("p4", "B", 4.0, 1, 5.0),
+        ]:
+            Product.objects.create(product_id=product_id, product_name=f"Product {product_id}", category=category,
+                                   price=price, quantity_sold=quantity_sold, rating=rating, review_count=1)
+
+    def get(self, url):
+        response = SummaryReportView.as_view()(self.factory.get(url))
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def read(self, url):
+        response = self.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_groups_with_metrics_and_top_products_as_json(self):
+        # The catalog state is read for the cache key, then the whole report in one query.
+        with self.assertNumQueries(2):
+            report = json.loads(self.read(
+                '/report?group_by=category&metrics=count,sum:revenue,mean:price,min:price,max:quantity_sold'
+                '&top=2&top_by=revenue&output=json'))
+
+        self.assertEqual(report, [
+            {"category": "A", "count": 3, "sum_revenue": 55.0, "mean_price": 8 / 3, "min_price": 1.0,
+             "max_quantity_sold": 20,
+             "top": [{"product_id": "p1", "product_name": "Product p1", "revenue": 20.0},
+                     {"product_id": "p3", "product_name": "Product p3", "revenue": 20.0}]},
+            {"category": "B", "count": 1, "sum_revenue": 4.0, "mean_price": 4.0, "min_price": 4.0,
+             "max_quantity_sold": 1,
+             "top": [{"product_id": "p4", "product_name": "Product p4", "revenue": 4.0}]},
+        ])
+
+    def test_csv_pads_groups_with_fewer_top_products(self):
+        report = self.read('/report?group_by=category,rating&metrics=count&top=2')
+
+        self.assertEqual(report.splitlines(), [
+            "category,rating,count,top_1_product_id,top_1_product_name,top_1_quantity_sold,"
+            "top_2_product_id,top_2_product_name,top_2_quantity_sold",
+            "A,3.0,1,p2,Product p2,3,,,",
+            "A,4.0,2,p3,Product p3,20,p1,Product p1,10",
+            "B,5.0,1,p4,Product p4,1,,,",
+        ])
+
+    def test_whole_catalog_of_filtered_products(self):
+        report = self.read('/report?group_by=&metrics=count,sum:price&min_price=2')
+
+        self.assertEqual(report.splitlines(), ["count,sum_price", "3,11.0"])
+
+    def test_summary_report_as_json(self):
+        response = self.get('/report?output=json')
+
+        self.assertEqual(json.loads(response.content), [
+            {"category": "A", "total_revenue": 8.0, "top_product": "Product p3", "top_product_quantity_sold": 20},
+            {"category": "B", "total_revenue": 4.0, "top_product": "Product p4", "top_product_quantity_sold": 1},
+        ])
+
+    def test_invalid_definitions_are_rejected(self):
+        for url, param in [
+            ('/report?group_by=product_name', 'group_by'),
+            ('/report?group_by=category,category', 'group_by'),
+            ('/report?metrics=median:price', 'metrics'),
+            ('/report?metrics=sum:category', 'metrics'),
+            ('/report?top=-1', 'top'),
+            ('/report?top=1000', 'top'),
+            ('/report?top_by=product_name', 'top_by'),
+            ('/report?output=xml', 'output'),
+            ('/report?min_price=cheap', 'min_price'),
+        ]:
+            response = self.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn(param, response.data)
+
+
+class LeaderboardViewTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        for product_id, category, rating, quantity_sold in [
+            ("p1", "A", 4.0, 10),
+            ("p2", "A", 5.0, 3),
+            ("p3", "A", 4.0, 20),
+            ("p4", "B", 5.0, 30),
+        ]:
+            Product.objects.create(product_id=product_id, product_name=f"Product {product_id}", category=category,
+                                   price=1, quantity_sold=quantity_sold, rating=rating, review_count=1)
+
+    def get(self, url):
+        response = LeaderboardView.as_view()(self.factory.get(url))
+        response.render()
+        return response
+
+    def test_leaderboard_ranks_products_of_the_category(self):
+        response = self.get('/leaderboard?category=A&metric=rating&size=2')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["category"], response.data["metric"]), ("A", "rating"))
+        # The first stored product wins a tie.
+        self.assertEqual([product["product_id"] for product in response.data["results"]], ["p2", "p1"])
+        self.assertEqual(response.data["results"][0], ProductSerializer(Product.objects.get(product_id="p2")).data)
+
+        response = self.get('/leaderboard?category=A&metric=quantity_sold')
+        self.assertEqual([product["product_id"] for product in response.data["results"]], ["p3", "p1", "p2"])
+
+    def test_leaderboards_are_read_from_the_category_indexes(self):
+        for metric in LEADERBOARD_METRICS:
+            plan = Product.objects.filter(category="A").order_by(f'-{metric}', 'id')[:10].explain()
+
+            # The rows are read in order from the index of the leaderboard, without a scan or a sort.
+            self.assertIn("USING INDEX product_category_", plan, metric)
+            self.assertNotIn("TEMP B-TREE", plan, metric)
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.get('/leaderboard?metric=price&size=1000')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {"category", "metric", "size"})
+
+
+class ProductBulkCreateTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def product(self, product_id, **values):
+        return {"product_id": product_id, "product_name": f"Product {product_id}", "category": "A", "price": 1.5,
+                "quantity_sold": 1, "rating": 4.0, "review_count": 1, **values}
+
+    def post(self, url, data, **kwargs):
+        return ProductListView.as_view()(self.factory.post(url, data, **kwargs))
+
+    def test_json_array_is_created_in_bulk(self):
+        items = [self.product(f"p{number}") for number in range(50)]
+        ProductCatalogState.load()
+
+        # One uniqueness check, one bulk insert in its transaction, the catalog version bump and the update of the
+        # category summary, for any number of products up to the batch size.
+        with override_settings(PRODUCT_UPLOAD_BATCH_SIZE=100), self.assertNumQueries(7):
+            response = self.post('/product', items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual([result["status"] for result in response.data["results"]], ["created"] * 50)
+        self.assertEqual(response.data["results"][3]["id"], Product.objects.get(product_id="p3").id)
+
+    def test_invalid_products_reject_the_request(self):
+        Product.objects.create(**self.product("taken"))
+        items = [self.product("p1"), self.product("p2", price=-1), self.product("taken"), self.product("p1"),
+                 "not a product"]
+
+        response = self.post('/product', items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "4 of the 5 products are invalid.")
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], ["valid"] + ["invalid"] * 4)
+        self.assertEqual(results[1]["errors"], {"price": ["Price cannot be negative."]})
+        self.assertEqual(results[2]["errors"], {"product_id": ["product with this product id already exists."]})
+        self.assertEqual(results[3]["errors"], {"product_id": ["product with this product id already exists."]})
+        self.assertIn("non_field_errors", results[4]["errors"])
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_skip_invalid_creates_the_valid_products(self):
+        body = "\n".join(json.dumps(item) for item in [self.product("p1"), self.product("p2", rating=6)]) + "\n"
+
+        response = self.post('/product?skip_invalid=true', body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["status"] for result in response.data["results"]], ["created", "invalid"])
+        self.assertEqual(list(Product.objects.values_list("product_id", flat=True)), ["p1"])
+
+    def test_products_created_concurrently_are_reported_invalid(self):
+        validate_products = ProductBulkCreateUtils.validate_products
+
+        def validate_then_race(items):
+            # Another request creates the second product once this one has checked that it is free.
+            result = validate_products(items)
+            Product.objects.create(**self.product(items[1]["product_id"], product_name="Rival"))
+            return result
+
+        with patch.object(ProductBulkCreateUtils, 'validate_products', side_effect=validate_then_race):
+            response = self.post('/product', [self.product("p1"), self.product("p2"), self.product("p3")],
+                                 format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual([result["status"] for result in response.data["results"]], ["valid", "invalid", "valid"])
+            self.assertEqual(response.data["results"][1]["errors"],
+                             {"product_id": ["product with this product id already exists."]})
+            self.assertEqual(list(Product.objects.values_list("product_id", flat=True)), ["p2"])
+
+            response = self.post('/product?skip_invalid=true',
+                                 [self.product("p4"), self.product("p5"), self.product("p6")], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["status"] for result in response.data["results"]], ["created", "invalid", "created"])
+        self.assertEqual(Product.objects.get(product_id="p5").product_name, "Rival")
+        self.assertEqual(set(Product.objects.values_list("product_id", flat=True)), {"p2", "p4", "p5", "p6"})
+
+    def test_malformed_ndjson_names_the_line(self):
+        response = self.post('/product', '{"product_id": "p1"}\n{oops\n', content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("line 2", response.data["detail"])
+
+    @override_settings(PRODUCT_BULK_CREATE_LIMIT=2)
+    def test_too_many_products_are_rejected(self):
+        response = self.post('/product', [self.product(f"p{number}") for number in range(3)], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.exists())
+
+
+class SummaryReportUtilsTestCase(TestCase):
+
+    def test_generate_summary_report_keeps_best_seller_of_each_category(self):
+        for product_id, name, category, price, quantity_sold in [
+            ("p1", "First", "B", 10.0, 5),
+            ("p2", "Best", "B", 20.5, 9),
+            ("p3", "Tied", "B", 1.0, 9),
+            ("p4", "Only", "A", 3.25, 2),
+        ]:
+            Product.objects.create(product_id=product_id, product_name=name, category=category, price=price,
+                                   quantity_sold=quantity_sold, rating=4.0, review_count=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = SummaryReportUtils.generate_summary_report(CategorySummary.objects.all())
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.content.decode().splitlines(), [
+            "category,total_revenue,top_product,top_product_quantity_sold",
+            "A,3.25,Only,2",
+            # The first stored of the best sellers wins a tie.
+            "B,31.5,Best,9",
+        ])
+
+    def summaries(self):
+        return {summary.category: (summary.total_revenue, summary.product_count, summary.top_product,
+                                   summary.top_product_quantity_sold) for summary in CategorySummary.objects.all()}
+
+    def test_category_summaries_follow_every_write_path(self):
+        product = Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=5,
+                                         rating=4, review_count=1)
+        ProductBulkCreateUtils.create_products([
+            {"product_id": "p2", "product_name": "Two", "category": "A", "price": 2, "quantity_sold": 7, "rating": 4,
+             "review_count": 1},
+            # Selling as much as the top product, but stored after it.
+            {"product_id": "p3", "product_name": "Three", "category": "A", "price": 3, "quantity_sold": 7,
+             "rating": 4, "review_count": 1},
+        ])
+        self.assertEqual(self.summaries(), {"A": (6.0, 3, "Two", 7)})
+
+        # The top product selling less is looked up again.
+        Product.objects.filter(product_id="p2").first().delete()
+        self.assertEqual(self.summaries(), {"A": (4.0, 2, "Three", 7)})
+
+        # Moving a product to another category changes both summaries.
+        product.category = "B"
+        product.save()
+        self.assertEqual(self.summaries(), {"A": (3.0, 1, "Three", 7), "B": (1.0, 1, "One", 5)})
+
+        frame = pd.DataFrame([["p3", "Three", "C", 3.0, 2, 4.0, 1], ["p4", "Four", "B", 4.0, 9, 4.0, 1]],
+                             columns=REQUIRED_COLUMNS)
+        CleanAndUploadProductUtils.save_products_to_db(frame, "true")
+        self.assertEqual(self.summaries(), {"B": (5.0, 2, "Four", 9), "C": (3.0, 1, "Three", 2)})
+
+        CleanAndUploadProductUtils.save_products_to_db(frame.iloc[1:], None, differential=True)
+        self.assertEqual(self.summaries(), {"B": (4.0, 1, "Four", 9)})
+
+        CleanAndUploadProductUtils.stream_products_to_db(
+            SimpleUploadedFile("products.csv", b"product_id,product_name,category,price,quantity_sold,rating,"
+                                               b"review_count\np5,Five,B,6,1,4,1\n"), "true")
+        self.assertEqual(self.summaries(), {"B": (10.0, 2, "Four", 9)})
+
+        ProductAdmin(Product, admin.site).delete_queryset(None, Product.objects.filter(category="B"))
+        self.assertEqual(self.summaries(), {})
+
+        CleanAndUploadProductUtils.save_products_to_db(frame, None)
+        self.assertEqual(self.summaries(), {"B": (4.0, 1, "Four", 9), "C": (3.0, 1, "Three", 2)})
+        self.assertEqual(SummaryReportUtils.verify_category_summaries(), [])
+
+    def test_failed_write_leaves_category_summaries_unchanged(self):
+        Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=5,
+                               rating=4, review_count=1)
+        frame = pd.DataFrame([["p2", "Two", "A", 2.0, 7, 4.0, 1], ["p3", "Three", "B", "x", 9, 4.0, 1]],
+                             columns=REQUIRED_COLUMNS)
+
+        with self.assertRaises(ValidationError):
+            CleanAndUploadProductUtils.save_products_to_db(frame, "true")
+
+        self.assertEqual(self.summaries(), {"A": (1.0, 1, "One", 5)})
+
+    def test_rebuild_category_summaries_command(self):
+        Product.objects.create(product_id="p1", product_name="One", category="A", price=1, quantity_sold=5,
+                               rating=4, review_count=1)
+        CategorySummary.objects.update(total_revenue=10)
+        CategorySummary.objects.create(category="Gone", total_revenue=1, product_count=1, top_product="Old",
+                                       top_product_quantity_sold=1, top_product_pk=0)
+
+        with self.assertRaisesMessage(CommandError, "2 category summaries do not match the products: A, Gone"):
+            call_command("rebuild_category_summaries", "--verify", stdout=io.StringIO())
+
+        call_command("rebuild_category_summaries", stdout=io.StringIO())
+        self.assertEqual(self.summaries(), {"A": (1.0, 1, "One", 5)})
+        call_command("rebuild_category_summaries", "--verify", stdout=io.StringIO())
+
+
+class CleanAndUploadProductUtilsTestCase(TestCase):
+
+    def make_frame(self, rows):
+        return pd.DataFrame(rows, columns=REQUIRED_COLUMNS)
+
+    def test_save_products_to_db_inserts_and_updates_in_batches(self):
+        Product.objects.create(product_id="p1", product_name="Old", category="A", price=1, quantity_sold=1,
+                               rating=1, review_count=1)
+        df = self.make_frame([
+            ["p1", "New", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Second", "B", 20.0, 6, 3.5, 4],
+            ["p3", "Third", "B", 30.0, 7, 4.5, 5],
+            ["p2", "Second again", "B", 25.0, 8, 3.0, 6],
+        ])
+
+        CleanAndUploadProductUtils.save_products_to_db(df, "true", batch_size=2)
+
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Product.objects.get(product_id="p1").product_name, "New")
+        # Later rows with the same product_id win, as with sequential update_or_create calls.
+        self.assertEqual(Product.objects.get(product_id="p2").product_name, "Second again")
+
+    def test_save_products_to_db_replaces_existing_products(self):
+        Product.objects.create(product_id="old", product_name="Old", category="A", price=1, quantity_sold=1,
+                               rating=1, review_count=1)
+        df = self.make_frame([["p1", "New", "A", 10.0, 5, 4.0, 3]])
+
+        CleanAndUploadProductUtils.save_products_to_db(df, None)
+
+        self.assertEqual(list(Product.objects.values_list("product_id", flat=True)), ["p1"])
+
+    def test_save_products_to_db_reports_failing_csv_row(self):
+        df = self.make_frame([
+            ["p1", "New", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Second", "B", 20.0, 6, 3.5, 4],
+            ["p3", "Third", "B", 30.0, "many", 4.5, 5],
+        ])
+
+        with self.assertRaisesMessage(ValidationError, "in row 4"):
+            CleanAndUploadProductUtils.save_products_to_db(df, "true", batch_size=2)
+
+        # The whole upload is rolled back.
+        self.assertFalse(Product.objects.exists())
+
+    def test_stream_products_to_db_matches_single_frame_cleaning(self):
+        csv_content = (
+            "product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            "p1,One,A,10.0,5,4.0,3\n"
+            "p2,Two,A,,7,,4\n"
+            "p3,Three,B,30.0,,3.0,5\n"
+            "p4,Four,C,15.5,2,,6\n"
+            "p5,Five,B,12.0,9,4.5,7\n"
+        )
+        df = CleanAndUploadProductUtils.clean_product_data(pd.read_csv(io.StringIO(csv_content)))
+        expected = CleanAndUploadProductUtils._build_products(df)
+
+        upload = SimpleUploadedFile("products.csv", csv_content.encode(), content_type="text/csv")
+        with transaction.atomic():
+            CleanAndUploadProductUtils.stream_products_to_db(upload, None, chunk_size=2)
+
+        fields = ["product_name", "category", "price", "quantity_sold", "rating", "review_count"]
+        for product in Product.objects.all():
+            for field in fields:
+                self.assertEqual(getattr(product, field), getattr(expected[product.product_id], field))
+        # Category and overall means come from the whole file, not from the chunk.
+        self.assertEqual(Product.objects.get(product_id="p2").rating, 4.0)
+        self.assertEqual(Product.objects.get(product_id="p4").rating, 11.5 / 3)
+
+    def test_save_products_to_db_differential_skips_unchanged_rows(self):
+        CleanAndUploadProductUtils.save_products_to_db(self.make_frame([
+            ["p1", "One", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Two", "B", 20.0, 6, 3.5, 4],
+            ["p3", "Three", "B", 30.0, 7, 4.5, 5],
+        ]), None, differential=True)
+
+        counts = CleanAndUploadProductUtils.save_products_to_db(self.make_frame([
+            ["p1", "One", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Two renamed", "B", 20.0, 6, 3.5, 4],
+            ["p4", "Four", "C", 40.0, 8, 2.5, 6],
+        ]), None, differential=True)
+
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "unchanged": 1, "deleted": 1})
+        self.assertEqual(sorted(Product.objects.values_list("product_id", flat=True)), ["p1", "p2", "p4"])
+        self.assertEqual(Product.objects.get(product_id="p2").product_name, "Two renamed")
+
+    def test_differential_upload_skips_identical_file(self):
+        csv_content = (
+            b"product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            b"p1,One,A,10.0,5,4.0,3\n"
+            b"p2,Two,B,20.0,6,3.5,4\n"
+        )
+
+        def upload():
+            request = APIRequestFactory().post('/upload-file?diff=true', {
+                'file': SimpleUploadedFile('products.csv', csv_content, content_type='text/csv')}, format='multipart')
+            return CleanAndUploadProductView.as_view()(request)
+
+        self.assertEqual(upload().data["changes"], {"inserted": 2, "updated": 0, "unchanged": 0, "deleted": 0})
+        with patch('products.views.CleanAndUploadProductUtils.process_csv_file') as mock_process_file:
+            self.assertEqual(upload().data["changes"], {"inserted": 0, "updated": 0, "unchanged": 2, "deleted": 0})
+        mock_process_file.assert_not_called()
+
+        # Editing a product by other means invalidates the fingerprint of the last upload.
+        product = Product.objects.get(product_id="p1")
+        product.price = 11.0
+        product.save()
+        self.assertEqual(upload().data["changes"], {"inserted": 0, "updated": 1, "unchanged": 1, "deleted": 0})
+        self.assertEqual(Product.objects.get(product_id="p1").price, 10.0)
+
+    def test_replace_keeps_catalog_readable_until_swap(self):
+        for number in range(3):
+            Product.objects.create(product_id=f"old{number}", product_name="Old", category="A", price=1,
+                                   quantity_sold=1, rating=1, review_count=1)
+        swap_staged_products = CleanAndUploadProductUtils.swap_staged_products
+        seen_before_swap = []
+
+        def read_then_swap(load_id):
+            seen_before_swap.append(ProductListView.as_view()(APIRequestFactory().get('/product')).data["results"])
+            return swap_staged_products(load_id)
+
+        df = self.make_frame([
+            ["p1", "New", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Second", "B", 20.0, 6, 3.5, 4],
+            ["p1", "New again", "A", 15.0, 7, 4.5, 5],
+        ])
+        with patch.object(CleanAndUploadProductUtils, 'swap_staged_products', side_effect=read_then_swap):
+            counts = CleanAndUploadProductUtils.save_products_to_db(df, None, batch_size=2)
+
+        self.assertEqual([product["product_id"] for product in seen_before_swap[0]], ["old0", "old1", "old2"])
+        self.assertEqual(counts, {"inserted": 2, "updated": 0, "unchanged": 0, "deleted": 3})
+        self.assertEqual(dict(Product.objects.values_list("product_id", "product_name")),
+                         {"p1": "New again", "p2": "Second"})
+        self.assertFalse(ProductStaging.objects.exists())
+
+    def test_failed_replace_leaves_catalog_untouched(self):
+        Product.objects.create(product_id="old", product_name="Old", category="A", price=1, quantity_sold=1,
+                               rating=1, review_count=1)
+        df = self.make_frame([
+            ["p1", "New", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Second", "B", 20.0, "many", 3.5, 4],
+        ])
+
+        with self.assertRaisesMessage(ValidationError, "in row 3"):
+            CleanAndUploadProductUtils.save_products_to_db(df, None, batch_size=1)
+
+        self.assertEqual(list(Product.objects.values_list("product_id", flat=True)), ["old"])
+        self.assertFalse(ProductStaging.objects.exists())
+
+
+class ReplaceUnderLoadTestCase(TransactionTestCase):
+
+    def test_readers_see_whole_catalog_during_replace(self):
+        old_products = 50
+        for number in range(old_products):
+            Product.objects.create(product_id=f"old{number}", product_name="Old", category="A", price=1,
+                                   quantity_sold=1, rating=1, review_count=1)
+        df = pd.DataFrame([[f"p{number}", "New", "B", 2.0, 2, 2.0, 2] for number in range(200)],
+                          columns=REQUIRED_COLUMNS)
+
+        # Hold the swap until the readers have run for the whole staging phase.
+        staged, readers_done = threading.Event(), threading.Event()
+        swap_staged_products = CleanAndUploadProductUtils.swap_staged_products
+
+        def wait_then_swap(load_id):
+            staged.set()
+            readers_done.wait(timeout=30)
+            return swap_staged_products(load_id)
+
+        listed, reported, failures = [], [], []
+
+        def read():
+            try:
+                factory = APIRequestFactory()
+                while not staged.is_set():
+                    data = ProductListView.as_view()(factory.get('/product')).data["results"]
+                    listed.append((len(data), frozenset(product["product_name"] for product in data)))
+                    reported.append(SummaryReportView.as_view()(factory.get('/report')).status_code)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                connections.close_all()
+
+        def replace():
+            try:
+                CleanAndUploadProductUtils.save_products_to_db(df, None, batch_size=5)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                connections.close_all()
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writer = threading.Thread(target=replace)
+        with patch.object(CleanAndUploadProductUtils, 'swap_staged_products', side_effect=wait_then_swap):
+            for thread in readers + [writer]:
+                thread.start()
+            for thread in readers:
+                thread.join()
+            readers_done.set()
+            writer.join()
+
+        self.assertEqual(failures, [])
+        self.assertTrue(listed)
+        self.assertEqual(set(listed), {(old_products, frozenset({"Old"}))})
+        self.assertEqual(set(reported), {status.HTTP_200_OK})
+        self.assertEqual(Product.objects.count(), 200)
+
+
+class ProductDataValidatorTestCase(TestCase):
+
+    def test_validate_reports_row_errors_across_chunks(self):
+        validator = ProductDataValidator()
+        first_chunk = pd.DataFrame([
+            ["p1", "One", "A", 10.0, 5, 4.0, 3],
+            ["p2", "Two", "A", None, 5, 6.0, 3],
+        ], columns=REQUIRED_COLUMNS)
+        second_chunk = pd.DataFrame([
+            ["p1", "One again", "B", 10.0, 5.5, 4.0, None],
+            ["p3", "Three", "B", "cheap", -1, 4.0, 3],
+        ], columns=REQUIRED_COLUMNS, index=[2, 3])
+
+        self.assertEqual(validator.validate(first_chunk).tolist(), [True, False])
+        self.assertEqual(validator.validate(second_chunk).tolist(), [False, False])
+
+        report = validator.report()
+        self.assertEqual(report["invalid_rows"], 3)
+        self.assertEqual(report["errors"], [
+            {"row": 3, "errors": ["rating cannot be more than 5."]},
+            {"row": 4, "errors": ["quantity_sold must be an integer.", "review_count cannot be empty.",
+                                  "product_id is duplicated."]},
+            {"row": 5, "errors": ["price must be a number.", "Quantity sold cannot be negative."]},
+        ])
+
+    @override_settings(VALIDATION_ERROR_REPORT_LIMIT=1)
+    def test_validate_limits_reported_rows(self):
+        validator = ProductDataValidator()
+        df = pd.DataFrame([["p1", None, "A", -1.0, 5, 4.0, 3]] * 3, columns=REQUIRED_COLUMNS)
+
+        validator.validate(df)
+
+        report = validator.report()
+        self.assertEqual(report["invalid_rows"], 3)
+        self.assertEqual(len(report["errors"]), 1)
+        self.assertEqual(report["error_counts"]["Price cannot be negative."], 3)
+
+
+class UploadJobTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.job_dir.cleanup)
+        self.settings_override = override_settings(UPLOAD_JOB_DIR=self.job_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def create_job(self, csv_content):
+        upload = SimpleUploadedFile("products.csv", csv_content.encode(), content_type="text/csv")
+        return UploadJobUtils.create_job(upload, "true")
+
+    @patch('products.views.UploadJobUtils.submit_job')
+    def test_async_upload_returns_job_id(self, mock_submit_job):
+        upload = SimpleUploadedFile('test.csv', b'product_id\n', content_type='text/csv')
+        request = self.factory.post('/upload-file?async=true', {'file': upload}, format='multipart')
+
+        response = CleanAndUploadProductView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = UploadJob.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.state, UploadJob.PENDING)
+        mock_submit_job.assert_called_once_with(job)
+
+    def test_run_job_saves_products_and_records_progress(self):
+        job = self.create_job(
+            "product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            "p1,One,A,10.0,5,4.0,3\n"
+            "p2,Two,B,20.0,6,,4\n"
+        )
+
+        UploadJobUtils.run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, UploadJob.SUCCEEDED)
+        self.assertEqual(job.rows_processed, 2)
+        self.assertEqual(job.errors, [])
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertFalse(os.path.exists(job.file_path))
+
+    def test_run_job_records_failing_row(self):
+        job = self.create_job(
+            "product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            "p1,One,A,10.0,5,4.0,3\n"
+            "p2,Two,B,20.0,6,4.0,many\n"
+        )
+
+        UploadJobUtils.run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, UploadJob.FAILED)
+        self.assertEqual(job.errors[0]["row"], 3)
+
+    def test_run_job_records_missing_file(self):
+        job = self.create_job("product_id\n")
+        os.remove(job.file_path)
+
+        UploadJobUtils.run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, UploadJob.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs_are_failed(self):
+        stale = [self.create_job("product_id\n") for _ in range(2)]
+        fresh = self.create_job("product_id\n")
+        UploadJob.objects.filter(id=stale[1].id).update(state=UploadJob.RUNNING)
+        UploadJob.objects.filter(id__in=[job.id for job in stale]).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_STALE_AFTER + 1))
+
+        self.assertEqual(UploadJobUtils.fail_stale_jobs(), 2)
+
+        for job in stale:
+            job.refresh_from_db()
+            self.assertEqual(job.state, UploadJob.FAILED)
+            self.assertFalse(os.path.exists(job.file_path))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.state, UploadJob.PENDING)
+        self.assertTrue(os.path.exists(fresh.file_path))
+
+    def test_job_failed_as_stale_while_running_stays_failed(self):
+        job = self.create_job(
+            "product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            "p1,One,A,10.0,5,4.0,3\n"
+            "p2,Two,B,20.0,6,4.0,4\n"
+        )
+        stream_products_to_db = CleanAndUploadProductUtils.stream_products_to_db
+
+        def stream_while_failed(*args, **kwargs):
+            # Another process starts and fails the job, as it seems to have gone without progress for too long.
+            UploadJob.objects.filter(id=job.id).update(
+                heartbeat_at=timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_STALE_AFTER + 1))
+            self.assertEqual(UploadJobUtils.fail_stale_jobs(), 1)
+            return stream_products_to_db(*args, **kwargs)
+
+        with patch.object(CleanAndUploadProductUtils, 'stream_products_to_db', side_effect=stream_while_failed), \
+                override_settings(CSV_CHUNK_SIZE=1):
+            UploadJobUtils.run_job(job.id)
+
+        # The job stops at its first chunk and keeps the state recorded by the other process.
+        job.refresh_from_db()
+        self.assertEqual(job.state, UploadJob.FAILED)
+        self.assertEqual(job.errors, [{"row": None, "error": "The job was interrupted before it finished."}])
+        self.assertEqual(job.rows_processed, 0)
+        self.assertEqual(Product.objects.count(), 1)
+
+        # A failed job is not run again.
+        UploadJobUtils.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.rows_processed), (UploadJob.FAILED, 0))
+
+    def test_running_jobs_beat_for_the_queued_ones(self):
+        queued, job = self.create_job("product_id\n"), self.create_job(
+            "product_id,product_name,category,price,quantity_sold,rating,review_count\n"
+            "p1,One,A,10.0,5,4.0,3\n"
+        )
+        long_ago = timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_STALE_AFTER + 1)
+        UploadJob.objects.filter(id=queued.id).update(heartbeat_at=long_ago)
+
+        with patch('products.jobs._queued', {queued.id}), patch('products.jobs.HEARTBEAT_INTERVAL', 0), \
+                patch.object(UploadJobUtils, 'beat', wraps=UploadJobUtils.beat) as beat:
+            UploadJobUtils.run_job(job.id)
+
+        # The first pass over the file beats too, though it saves nothing.
+        self.assertEqual([call.args for call in beat.call_args_list], [(job.id, 0), (job.id, 1)])
+        queued.refresh_from_db()
+        self.assertEqual(queued.state, UploadJob.PENDING)
+        self.assertGreater(queued.heartbeat_at, long_ago)
+        self.assertEqual(UploadJobUtils.fail_stale_jobs(), 0)
+
+    def test_upload_job_view(self):
+        job = UploadJob.objects.create(file_path="unused.csv", state=UploadJob.RUNNING, rows_processed=10)
+
+        response = UploadJobView.as_view()(self.factory.get(f'/upload-jobs/{job.id}'), job_id=job.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["state"], UploadJob.RUNNING)
+        self.assertEqual(response.data["rows_processed"], 10)
+
+    def test_upload_job_view_unknown_job(self):
+        response = UploadJobView.as_view()(self.factory.get('/upload-jobs/unknown'), job_id=uuid.uuid4())
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ParallelCsvUtilsTestCase(TestCase):
+
+    def test_parallel_parse_matches_single_process(self):
+        lines = ["product_id,product_name,category,price,quantity_sold,rating,review_count"]
+        for number in range(200):
+            price = "" if number % 7 == 0 else str(number * 1.25)
+            quantity_sold = "" if number % 11 == 0 else str(number % 17)
+            rating = "" if number % 5 == 0 else str((number % 50) / 10)
+            lines.append(f"p{number},Product {number},C{number % 3},{price},{quantity_sold},{rating},{number}")
+        # A duplicate of a product of another range, and a row with an invalid value.
+        lines.append("p3,Duplicate,C0,1000.0,1,0.5,1")
+        lines.append("p999,Negative,C1,-5.0,1,0.5,1")
+        csv_content = "\n".join(lines) + "\n"
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(csv_content)
+        self.addCleanup(os.remove, csv_file.name)
+
+        expected, expected_report = CleanAndUploadProductUtils.validate_product_data(
+            pd.read_csv(io.StringIO(csv_content)), skip_invalid=True)
+        expected = CleanAndUploadProductUtils.clean_product_data(expected)
+        actual, report = ParallelCsvUtils.process_and_clean_csv_file(csv_file.name, workers=3, skip_invalid=True)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        self.assertEqual(report, expected_report)
+        self.assertEqual(report["invalid_rows"], 2)
+
+    def test_ranges_do_not_split_quoted_line_breaks(self):
+        lines = ["product_id,product_name,category,price,quantity_sold,rating,review_count"]
+        for number in range(200):
+            lines.append(f'p{number},"Name {number}\nline two, with comma",C{number % 3},{number + 1},1,4.5,{number}')
+        csv_content = "\n".join(lines) + "\n"
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(csv_content)
+        self.addCleanup(os.remove, csv_file.name)
+
+        # Small scan blocks make rows span several blocks.
+        for block_size in [7, 64, 1 << 20]:
+            with patch("products.parallel.SCAN_BLOCK_SIZE", block_size):
+                header, ranges = ParallelCsvUtils.split_byte_ranges(csv_file.name, 4)
+            self.assertEqual(len(ranges), 4)
+            with open(csv_file.name, "rb") as file:
+                for start, end in ranges:
+                    file.seek(start)
+                    self.assertRegex(file.read(end - start).decode(), r'^p\d+,"Name \d+\n')
+
+        expected = CleanAndUploadProductUtils.clean_product_data(CleanAndUploadProductUtils.validate_product_data(
+            pd.read_csv(io.StringIO(csv_content)))[0])
+        actual, report = ParallelCsvUtils.process_and_clean_csv_file(csv_file.name, workers=4)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        self.assertEqual(len(actual), 200)
+        self.assertEqual(actual.iloc[0]["product_name"], "Name 0\nline two, with comma")
@@ -1,10 +1,16 @@
 from django.contrib import admin
 from django.urls import path
 
-from .views import CleanAndUploadProductView, ProductListView, SummaryReportView
+from shopping.blocking import asgi_view
+
+from .views import (CleanAndUploadProductView, LeaderboardView, ProductListView, ReportCacheView, SummaryReportView,
+                    UploadJobView)
 
 urlpatterns = [
     path("upload-file", CleanAndUploadProductView.as_view()),
-    path("product", ProductListView.as_view()),
-    path("report", SummaryReportView.as_view())
+    path("product", asgi_view(ProductListView.as_view())),
+    path("report", asgi_view(SummaryReportView.as_view())),
+    path("report/cache", ReportCacheView.as_view()),
+    path("leaderboard", asgi_view(LeaderboardView.as_view())),
+    path("upload-jobs/<uuid:job_id>", UploadJobView.as_view())
 ]
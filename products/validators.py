@@ -1,29 +1,63 @@
+import numpy as np
+import pandas as pd
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
+from .constants import (TEXT_FIELDS_OF_PRODUCT, NUMERIC_FIELDS_OF_PRODUCT, INTEGER_FIELDS_OF_PRODUCT,
+                        IMPUTED_FIELDS_OF_PRODUCT, POSITIVE_FIELDS_OF_PRODUCT, MAX_RATING)
+
 """
 This module contains validation classes for handling file and data validations.
 """
 
 
+class RowValidationError(ValidationError):
+    """
+    A validation error raised for a specific row of an uploaded CSV file.
+    """
+
+    def __init__(self, message, row):
+        """
+        :param message: The error message.
+        :param row: The row number in the CSV file, counting the header as row 1.
+        """
+        super().__init__(message)
+        self.row = row
+
+
+class InvalidRowsError(ValidationError):
+    """
+    A validation error raised when an uploaded CSV file contains invalid rows.
+    """
+
+    def __init__(self, report):
+        """
+        :param report: The validation report of ProductDataValidator.report().
+        """
+        super().__init__(f"The file contains {report['invalid_rows']} invalid rows.")
+        self.report = report
+
+
 class FileValidator:
     """
     A class to perform validation checks on files uploaded to the server.
     """
 
     @staticmethod
-    def validate_file(file):
+    def validate_file(file, enforce_size_limit=True):
         """
         Validates the uploaded file for presence, size, and type.
 
         :param file: The file to validate.
+        :param enforce_size_limit: Whether to reject files larger than settings.MAX_FILE_SIZE. Streaming uploads
+            do not hold the file in memory and skip this check.
         :raises ValidationError: If the file is missing, exceeds the maximum allowed size, or is not a CSV file.
         """
         # validate whether the file is provided in API
         if not file:
             raise ValidationError("No file provided")
         # validate the maximum size of the file
-        if file.size > settings.MAX_FILE_SIZE:
+        if enforce_size_limit and file.size > settings.MAX_FILE_SIZE:
             raise ValidationError(f"File size cannot be more than 5 MB. Size provided is {file.size / 1000000} MB")
         # validate the type of file provided
         if not file.name.endswith('.csv'):
@@ -41,3 +75,88 @@ class FileValidator:
         if not all(col in chunk.columns for col in required_columns):
             raise ValidationError(
                 f"CSV file is missing one or more required columns. Mandatory columns are {required_columns}")
+
+
+class ProductDataValidator:
+    """
+    A class to validate the product rows of DataFrame chunks with column-wise masks rather than row by row.
+
+    The validator keeps the product_ids it has seen, so duplicates are found across all the chunks of a file,
+    and the errors of the first settings.VALIDATION_ERROR_REPORT_LIMIT invalid rows.
+    """
+
+    def __init__(self):
+        self.seen_product_ids = set()
+        self.invalid_rows = 0
+        self.error_counts = {}
+        self.errors = []
+
+    @staticmethod
+    def check_values(df):
+        """
+        Checks the values of every row, independently of the other rows.
+
+        :param df: The DataFrame chunk to validate.
+        :return: A dict mapping each error message to the boolean mask of the rows having that error.
+        """
+        checks = {}
+        for field in TEXT_FIELDS_OF_PRODUCT:
+            checks[f"{field} cannot be empty."] = df[field].isna().to_numpy()
+
+        for field in NUMERIC_FIELDS_OF_PRODUCT:
+            missing = df[field].isna().to_numpy()
+            values = pd.to_numeric(df[field], errors='coerce').astype('float64').to_numpy()
+            if field not in IMPUTED_FIELDS_OF_PRODUCT:
+                checks[f"{field} cannot be empty."] = missing
+            checks[f"{field} must be a number."] = np.isnan(values) & ~missing
+            if field in INTEGER_FIELDS_OF_PRODUCT:
+                checks[f"{field} must be an integer."] = np.isfinite(values) & (values % 1 != 0)
+            if field in POSITIVE_FIELDS_OF_PRODUCT:
+                checks[f"{field.replace('_', ' ').capitalize()} cannot be negative."] = values < 0
+
+        ratings = pd.to_numeric(df['rating'], errors='coerce').astype('float64').to_numpy()
+        checks[f"rating cannot be more than {MAX_RATING}."] = ratings > MAX_RATING
+        return checks
+
+    def validate(self, df, checks=None):
+        """
+        Validates the rows of a DataFrame chunk and records the errors found.
+
+        A product_id already seen in this or an earlier chunk makes the row a duplicate.
+
+        :param df: The DataFrame chunk to validate, indexed by row from the start of the file.
+        :param checks: The result of check_values(df), if it has already been computed.
+        :return: A boolean NumPy array which is True for the valid rows.
+        """
+        checks = dict(checks if checks is not None else ProductDataValidator.check_values(df))
+
+        # Compare product_ids as they are stored, i.e. as strings.
+        product_ids = df['product_id'].astype(str)
+        checks["product_id is duplicated."] = (
+            product_ids.duplicated().to_numpy() | product_ids.isin(self.seen_product_ids).to_numpy())
+        self.seen_product_ids.update(product_ids)
+
+        invalid = np.logical_or.reduce(list(checks.values()))
+        self.invalid_rows += int(invalid.sum())
+        for message, mask in checks.items():
+            if mask.any():
+                self.error_counts[message] = self.error_counts.get(message, 0) + int(mask.sum())
+
+        # Describe only the first invalid rows, so the report stays small.
+        for position in np.flatnonzero(invalid)[:settings.VALIDATION_ERROR_REPORT_LIMIT - len(self.errors)]:
+            self.errors.append({
+                # Header is row 1, so DataFrame index 0 is row 2 of the CSV file.
+                "row": int(df.index[position]) + 2,
+                "errors": [message for message, mask in checks.items() if mask[position]],
+            })
+
+        return ~invalid
+
+    def report(self):
+        """
+        Returns the validation report of all the chunks validated so far.
+
+        :return: A dict with the number of invalid rows, the number of rows per error and the errors of
+            the first invalid rows.
+        """
+        return {"invalid_rows": self.invalid_rows, "error_counts": self.error_counts, "errors": self.errors}
@@ -1,38 +1,130 @@
-from .models import Product
-from .serializers import ProductSerializer
+from contextlib import nullcontext
+
+from .models import CategorySummary, Product, ProductCatalogState, UploadJob
+from .serializers import ProductReadSerializer, ProductSerializer, UploadJobSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from shopping.replica import read_from_replica
 
+from .bulk import ProductBulkCreateUtils
+from .constants import LEADERBOARD_METRICS
+from .cache import get_report_cache
+from .exports import ProductExportUtils
+from .filters import ProductFilterBackend
+from .jobs import UploadJobUtils
+from .pagination import ProductKeysetPagination
+from .parsers import NDJSONParser
+from .parallel import ParallelCsvUtils
+from .partitions import PartitionUtils
+from .reports import ReportDefinition, ReportEngine
 from .utils import CleanAndUploadProductUtils, SummaryReportUtils
-from .validators import FileValidator
+from .validators import FileValidator, InvalidRowsError
+
+
+def catalog_state(request):
+    """
+    Returns the catalog state, read once per request for both the ETag and the Last-Modified header.
+    """
+    if not hasattr(request, 'catalog_state'):
+        request.catalog_state = (ProductCatalogState.objects.filter(pk=ProductCatalogState.SINGLETON_ID).first()
+                                 or ProductCatalogState())
+    return request.catalog_state
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    Returns the ETag of the catalog endpoints. It changes with every change of the products.
+    """
+    return f"catalog-{catalog_state(request).version}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    """
+    Returns when the products last changed, or None if they never did.
+    """
+    return catalog_state(request).updated_at
+
+
+# Answers If-None-Match and If-Modified-Since with 304 Not Modified from the catalog state alone, without reading
+# the products.
+catalog_condition = method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified))
+
+# Reads the catalog state and the products from the read replica, if any, unless the request has the
+# X-Read-Primary: true header to read its own writes.
+replica_reads = method_decorator(read_from_replica)
 
 
 class ProductListView(APIView):
+    # Products can also be posted as newline delimited JSON, one product per line.
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [NDJSONParser]
+
+    @replica_reads
+    @catalog_condition
     def get(self, request):
         """
-        Handles GET requests to retrieve all products from the database.
+        Handles GET requests to retrieve a page of products from the database.
+
+        Products can be filtered by ?category=, ?category__in= and ?min_<field>= / ?max_<field>= ranges of price,
+        rating, quantity_sold and review_count, and ?count=true adds the number of matching products.
+        Pages hold settings.PRODUCT_PAGE_SIZE products, or ?page_size= up to settings.PRODUCT_MAX_PAGE_SIZE, sorted by
+        ?ordering= (id or a numeric field, '-' first for descending). The next and previous links carry an opaque
+        cursor, so every page costs the same to read however deep it is.
+        With ?stream=json or ?stream=jsonl all the matching products are streamed by id instead, as one JSON array or
+        as JSON Lines, with constant memory use and time to first byte whatever the catalog size.
+        Responses carry the ETag and Last-Modified of the catalog, and conditional requests get 304 Not Modified
+        while the products are unchanged. Products are read from the read replica of settings.DATABASE_REPLICA, if
+        any, unless the X-Read-Primary: true header is given. Partitioned products are read from the partitions of
+        the categories filtered by, or from all of them in parallel, and merged.
 
         :param request: The request object.
-        :return: A Response containing the serialized product data.
+        :return: A Response containing the serialized products of the page and the links to the neighbouring pages,
+            or a StreamingHttpResponse of all the matching products.
         """
-        # Retrieve all products from the database.
-        products = Product.objects.all()
+        # Filter the products in the database, in the partitions of the categories filtered by.
+        products = ProductFilterBackend().filter_queryset(request, Product.objects.all(), self)
+        products = PartitionUtils.querysets(products, ProductFilterBackend.get_categories(request))
+
+        # Stream all the matching products if requested.
+        export_format = request.query_params.get('stream')
+        if export_format is not None:
+            if export_format not in ProductExportUtils.CONTENT_TYPES:
+                return Response({"stream": ["stream must be json or jsonl."]}, status=status.HTTP_400_BAD_REQUEST)
+            return ProductExportUtils.stream_products(products, export_format)
 
-        # Serialize the queryset of products.
-        serializer = ProductSerializer(products, many=True)
+        # Retrieve the values of the products of the requested page.
+        paginator = ProductKeysetPagination()
+        products = paginator.paginate_queryset([ProductReadSerializer.rows_of(queryset, named=True)
+                                                for queryset in products], request, view=self)
 
-        # Return the serialized data in the response.
-        return Response(serializer.data)
+        # Serialize the page of products.
+        serializer = ProductReadSerializer(products)
+
+        # Return the serialized data in the response, with the links to the neighbouring pages.
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         """
-        Handles POST requests to create a new product entry in the Product table.
+        Handles POST requests to create new product entries in the Product table.
+
+        A JSON object creates one product. A JSON array, or an NDJSON body with one product per line, creates up to
+        settings.PRODUCT_BULK_CREATE_LIMIT products in batched bulk inserts in one transaction, and the result of
+        every product is returned. If any product is invalid none is created, unless ?skip_invalid=true is given, in
+        which case the valid ones are. A product whose product_id another request created meanwhile is invalid too.
 
         :param request: The request object containing product data.
         :return: A Response indicating success or failure.
         """
+        if isinstance(request.data, list):
+            return self.create_products(request)
+
         # Deserialize the incoming product data.
         serializer = ProductSerializer(data=request.data)
 
@@ -44,6 +136,77 @@ class ProductListView(APIView):
         # Return validation errors if the data is invalid.
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def create_products(self, request):
+        """
+        Creates the list of products of the request in bulk.
+
+        :param request: The request object containing the list of product data.
+        :return: A Response with the result of every product.
+        """
+        items = request.data
+        skip_invalid = request.query_params.get('skip_invalid') == "true"
+
+        # Reject requests with too many products.
+        if len(items) > settings.PRODUCT_BULK_CREATE_LIMIT:
+            return Response({"error": f"At most {settings.PRODUCT_BULK_CREATE_LIMIT} products can be created at once."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate and create the products, or return the result of every product if some are invalid.
+        created, results = ProductBulkCreateUtils.create_products(items, skip_invalid)
+        if not created:
+            invalid = sum(result["status"] == "invalid" for result in results)
+            return Response({"error": f"{invalid} of the {len(items)} products are invalid.", "results": results},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": results}, status=status.HTTP_201_CREATED)
+
+
+class LeaderboardView(APIView):
+    """
+    API view to retrieve the top products of a category by rating, quantity_sold or review_count.
+    """
+
+    @catalog_condition
+    def get(self, request):
+        """
+        Handles GET requests to retrieve the leaderboard of ?category= by ?metric=, highest first and the first
+        stored among equals, with settings.LEADERBOARD_SIZE products or ?size= up to settings.LEADERBOARD_MAX_SIZE.
+
+        The products of every category are kept in the order of each leaderboard by the category indexes, which
+        every change of the products updates in its transaction, so a leaderboard is read from the index without
+        scanning or sorting the products. Responses carry the ETag and Last-Modified of the catalog, and
+        conditional requests get 304 Not Modified while the products are unchanged.
+
+        :param request: The request object.
+        :return: A Response containing the category, the metric and the serialized products of the leaderboard, or
+            the errors of the query parameters.
+        """
+        category = request.query_params.get('category')
+        metric = request.query_params.get('metric')
+        size = request.query_params.get('size', settings.LEADERBOARD_SIZE)
+
+        # Validate the query parameters.
+        errors = {}
+        if not category:
+            errors['category'] = ["category is required."]
+        if metric not in LEADERBOARD_METRICS:
+            errors['metric'] = [f"metric must be one of {', '.join(LEADERBOARD_METRICS)}."]
+        try:
+            size = int(size)
+        except ValueError:
+            size = 0
+        if not 0 < size <= settings.LEADERBOARD_MAX_SIZE:
+            errors['size'] = [f"size must be an integer between 1 and {settings.LEADERBOARD_MAX_SIZE}."]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read the first products of the category in the order of the leaderboard, from its partition.
+        products = PartitionUtils.querysets(Product.objects.filter(category=category), {category})[0]
+        products = products.order_by(f'-{metric}', 'id')[:size]
+        serializer = ProductReadSerializer(ProductReadSerializer.rows_of(products))
+
+        return Response({"category": category, "metric": metric, "results": serializer.data})
+
 
 class CleanAndUploadProductView(APIView):
     """
@@ -55,6 +218,18 @@ class CleanAndUploadProductView(APIView):
         Handles POST requests to upload and process a CSV file.
 
         The method validates the file, processes and cleans the data, and updates or creates Product instances in the database.
+        With ?stream=true the file is processed in chunks of settings.CSV_CHUNK_SIZE rows and is not limited in size.
+        With ?async=true the file is processed the same way by a background job, and the job id is returned at once.
+        With ?parallel=true a file stored on disk is parsed by settings.PARALLEL_CSV_WORKERS processes; files small
+        enough to be kept in memory by Django are processed in the request process.
+        Rows failing validation reject the whole file with a row-level report, unless ?skip_invalid=true is given, in
+        which case only the valid rows are saved.
+        A full replace loads the new products into a staging table and swaps them in at once, so that readers keep
+        seeing the whole current catalog until the upload succeeds.
+        With ?diff=true only the products that changed are written, replace uploads delete only the products missing
+        from the file, and a file identical to the last one uploaded is not processed again. The response then
+        includes the number of products inserted, updated, unchanged and deleted.
+        Partitioned products are saved in the partitions of their categories, in parallel.
 
         :param request: The request object containing the uploaded file and operation type.
         :return: A Response object indicating success or failure.
@@ -65,21 +240,73 @@ class CleanAndUploadProductView(APIView):
         # Get the value of the 'append' query parameter.
         operation_type = request.query_params.get('append')
 
+        # Get the values of the 'stream', 'async', 'parallel', 'skip_invalid' and 'diff' query parameters.
+        stream = request.query_params.get('stream') == "true"
+        run_async = request.query_params.get('async') == "true"
+        parallel = request.query_params.get('parallel') == "true"
+        skip_invalid = request.query_params.get('skip_invalid') == "true"
+        differential = request.query_params.get('diff') == "true"
+
         try:
-            # Validate the uploaded file.
-            FileValidator.validate_file(file)
+            # Validate the uploaded file. Streaming, background and parallel uploads are not limited in size.
+            FileValidator.validate_file(file, enforce_size_limit=not (stream or run_async or parallel))
+
+            if run_async:
+                # Store the file and process it in the background, returning the job to poll.
+                job = UploadJobUtils.create_job(file, operation_type, skip_invalid, differential)
+                UploadJobUtils.submit_job(job)
+                return Response({"job_id": str(job.id), "status_url": f"/shopping/upload-jobs/{job.id}"},
+                                status=status.HTTP_202_ACCEPTED)
+
+            changes = None
+            if differential:
+                # Skip a file identical to the one the catalog was last written by.
+                fingerprint = CleanAndUploadProductUtils.fingerprint_file(file, operation_type, skip_invalid)
+                changes = CleanAndUploadProductUtils.unchanged_upload_counts(fingerprint)
+
+            if changes is not None:
+                report = {"invalid_rows": 0}
+            elif stream:
+                # Parse, clean and save the file chunk by chunk. A full replace is staged and swapped in at once by
+                # itself; other uploads are saved in one transaction so that a failing row leaves no partial upload.
+                staged = operation_type != "true" and not differential
+                with nullcontext() if staged else transaction.atomic():
+                    report, changes = CleanAndUploadProductUtils.stream_products_to_db(
+                        file, operation_type, skip_invalid=skip_invalid, differential=differential)
+            else:
+                if parallel and hasattr(file, 'temporary_file_path'):
+                    # Process, validate and clean the CSV file in a pool of worker processes.
+                    df, report = ParallelCsvUtils.process_and_clean_csv_file(file.temporary_file_path(),
+                                                                             skip_invalid=skip_invalid)
+                else:
+                    # Process the CSV file into a DataFrame.
+                    df = CleanAndUploadProductUtils.process_csv_file(file)
 
-            # Process the CSV file into a DataFrame.
-            df = CleanAndUploadProductUtils.process_csv_file(file)
+                    # Validate the product rows, dropping the invalid ones if requested.
+                    df, report = CleanAndUploadProductUtils.validate_product_data(df, skip_invalid)
 
-            # Clean the product data in the DataFrame.
-            df = CleanAndUploadProductUtils.clean_product_data(df)
+                    # Clean the product data in the DataFrame.
+                    df = CleanAndUploadProductUtils.clean_product_data(df)
 
-            # Save the cleaned data to the database.
-            CleanAndUploadProductUtils.save_products_to_db(df, operation_type)
+                # Save the cleaned data to the database.
+                changes = CleanAndUploadProductUtils.save_products_to_db(df, operation_type,
+                                                                         differential=differential)
 
-            # Return a success response if everything is processed correctly.
-            return Response({"success": "Products processed and uploaded successfully"}, status=status.HTTP_201_CREATED)
+            if differential:
+                # Remember the upload so that sending the same file again is a no-op.
+                ProductCatalogState.record_upload(fingerprint, changes)
+
+            # Return a success response if everything is processed correctly, with the rows skipped if any.
+            data = {"success": "Products processed and uploaded successfully"}
+            if report["invalid_rows"]:
+                data["skipped_rows"] = report
+            if differential:
+                data["changes"] = changes
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        except InvalidRowsError as e:
+            # Return a 400 error with the row-level report if the file contains invalid rows.
+            return Response({"error": e.message, "report": e.report}, status=status.HTTP_400_BAD_REQUEST)
 
         except ValidationError as e:
             # Return a 400 error if there's a validation issue with the file or data.
@@ -91,24 +318,98 @@ class CleanAndUploadProductView(APIView):
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class UploadJobView(APIView):
+    """
+    API view to report the state of a background upload job.
+    """
+
+    def get(self, request, job_id):
+        """
+        Handles GET requests to retrieve the state, progress and errors of an upload job.
+
+        :param request: The request object.
+        :param job_id: The id of the upload job.
+        :return: A Response containing the serialized job or an error message.
+        """
+        job = UploadJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Upload job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(UploadJobSerializer(job).data)
+
+
 class SummaryReportView(APIView):
     """
     API view to generate a summary report of all the products stored in the database.
     """
 
+    @replica_reads
+    @catalog_condition
     def get(self, request):
         """
         Handles GET requests to generate the summary report.
 
+        Without query parameters, the report is read from the category summaries kept up to date by every change of
+        the products, one row per category. Other cuts are computed by the report engine from the products:
+        ?group_by= lists the dimensions to group by (category, rating, quantity_sold, review_count, or none),
+        ?metrics= the metrics of every group as count or <aggregate>:<field>, with sum, mean, min or max of price,
+        quantity_sold, rating, review_count or revenue (price times quantity_sold), and ?top= the number of top
+        products of every group by ?top_by=. The products are filtered as the product list filters them, and the
+        report is streamed one group at a time. ?output=json returns a JSON array instead of a CSV file.
+        Generated reports are cached by settings.REPORT_CACHE_BACKEND for the catalog version and query
+        parameters they were generated for, and the X-Report-Cache header tells whether the cache was hit.
+        Responses carry the ETag and Last-Modified of the catalog, and conditional requests get 304 Not Modified
+        while the products are unchanged. The report is read from the read replica of settings.DATABASE_REPLICA, if
+        any, unless the X-Read-Primary: true header is given. Partitioned products are summarized by their
+        partitions in parallel, and the results merged.
+
+        :param request: The request object.
+        :return: A CSV or JSON response containing the summary report or an error message.
+        """
+        # Return the cached report of the current catalog, or generate and cache it.
+        report_cache = get_report_cache()
+        response, cached = report_cache.fetch(report_cache.key(catalog_state(request), request.query_params),
+                                              lambda: self.generate_report(request))
+        response['X-Report-Cache'] = 'hit' if cached else 'miss'
+        return response
+
+    def generate_report(self, request):
+        """
+        Generates the summary report requested.
+
         :param request: The request object.
-        :return: A CSV HttpResponse containing the summary report or an error message.
+        :return: A CSV or JSON response containing the summary report or an error message.
         """
-        # Retrieve all products from the database.
-        products = Product.objects.all()
+        # Compute the report requested with the report engine.
+        if any(param != ReportDefinition.output_param for param in request.query_params):
+            definition = ReportDefinition.from_params(request.query_params)
+            products = ProductFilterBackend().filter_queryset(request, Product.objects.all(), self)
+            return ReportEngine.stream_report(
+                PartitionUtils.querysets(products, ProductFilterBackend.get_categories(request)), definition)
 
-        # Check if there are any products available.
-        if not products.exists():
+        # Retrieve the summaries of all categories from the database, or from every partition.
+        summaries = PartitionUtils.querysets(CategorySummary.objects.all())
+
+        # Check if there are any products available, as every product belongs to a summarized category.
+        if not any(PartitionUtils.gather([queryset.exists for queryset in summaries])):
             return Response({"error": "No products available for generating the summary."}, status=404)
 
         # Generate the summary report using the utility function and return it.
-        return SummaryReportUtils.generate_summary_report(products)
+        return SummaryReportUtils.generate_summary_report(summaries,
+                                                          ReportDefinition.parse_output(request.query_params))
+
+
+class ReportCacheView(APIView):
+    """
+    API view to report the use of the summary report cache.
+    """
+
+    def get(self, request):
+        """
+        Handles GET requests to retrieve the backend of the report cache and its numbers of hits and misses in the
+        process serving the request, with the number of cached reports and their size for the in-process cache.
+
+        :param request: The request object.
+        :return: A Response containing the statistics of the report cache.
+        """
+        return Response(get_report_cache().stats())
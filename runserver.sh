@@ -1 +1,7 @@
-gunicorn shopping.wsgi:application --bind 127.0.0.1:8000
+# Serves the application with gunicorn sync workers (WSGI), or with uvicorn workers (ASGI) and the async variants of
+# the read endpoints and login when run as "source runserver.sh asgi".
+if [ "$1" = "asgi" ]; then
+    gunicorn shopping.asgi:application --worker-class uvicorn.workers.UvicornWorker --bind 127.0.0.1:8000
+else
+    gunicorn shopping.wsgi:application --bind 127.0.0.1:8000
+fi
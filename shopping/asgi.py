@@ -2,5 +2,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shopping.settings')
+# Serve the read endpoints and login with their async variants, unless ASYNC_VIEWS=false is set.
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
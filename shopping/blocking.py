@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+
+"""
+This module runs the blocking work of the async request path, such as database queries, password hashing and pandas,
+in a bounded pool of threads of the current process.
+
+Under ASGI Django runs every sync view on one shared thread, so sync views serve one request at a time whatever the
+number of concurrent requests. The async variants of the views returned by asgi_view() run the sync view, the
+rendering of its response and the iteration of its streaming content in the pool instead, so up to
+settings.ASYNC_BLOCKING_WORKERS requests are served at once while the event loop keeps accepting others.
+"""
+
+# Number of chunks of a streaming response read ahead of the client.
+STREAM_BUFFER_CHUNKS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide pool running blocking work for the async request path, creating it on first use.
+
+    :return: A ThreadPoolExecutor with settings.ASYNC_BLOCKING_WORKERS threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_BLOCKING_WORKERS, thread_name_prefix="blocking")
+        return _executor
+
+
+def _call_in_worker(func, args, kwargs):
+    """
+    Calls the function on a pool thread and releases the thread's database connections afterwards, as Django does at
+    the end of a request.
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function in the pool without blocking the event loop.
+
+    :return: The result of the function.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), functools.partial(_call_in_worker, func, args, kwargs))
+
+
+async def stream_blocking(content):
+    """
+    Iterates a sync iterator, such as the content of a streaming response, in the pool and yields its chunks as they
+    come, reading at most STREAM_BUFFER_CHUNKS chunks ahead and stopping when the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+    closed = threading.Event()
+
+    def pump():
+        for chunk in content:
+            asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+            if closed.is_set():
+                break
+
+    pumping = asyncio.ensure_future(run_blocking(pump))
+    getting = None
+    try:
+        while True:
+            getting = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getting, pumping}, return_when=asyncio.FIRST_COMPLETED)
+            if getting.done():
+                yield getting.result()
+                continue
+            # Every chunk read by the pump is queued by the time it ends.
+            getting.cancel()
+            while not queue.empty():
+                yield queue.get_nowait()
+            # Raise the error of the iterator, if any.
+            await pumping
+            return
+    finally:
+        closed.set()
+        if getting is not None:
+            getting.cancel()
+        # Unblock the pump waiting for room in the queue, and wait for it to stop so that its thread is released.
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.wait({pumping})
+
+
+def render_view(view, request, *args, **kwargs):
+    """
+    Calls a sync view and renders its response, returning a plain HttpResponse so that Django does not render it
+    again on its shared thread.
+    """
+    response = view(request, *args, **kwargs)
+    if isinstance(response, SimpleTemplateResponse):
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code, headers=response.headers)
+        rendered.cookies = response.cookies
+        return rendered
+    return response
+
+
+def offload_view(view):
+    """
+    Returns the async variant of a sync view, calling the view and rendering its response in the pool and iterating
+    its streaming content there.
+
+    :param view: The sync view, such as the result of APIView.as_view().
+    :return: The async view.
+    """
+
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        response = await run_blocking(render_view, view, request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = stream_blocking(iter(response.streaming_content))
+        return response
+
+    return async_view
+
+
+def asgi_view(view):
+    """
+    Returns the async variant of a sync view if settings.ASYNC_VIEWS is set, as it is when the application is served
+    by ASGI, or the view itself.
+    """
+    return offload_view(view) if settings.ASYNC_VIEWS else view
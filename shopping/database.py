@@ -0,0 +1,56 @@
+"""
+This module contains the performance profiles of the SQLite database, selected by settings.DATABASE_PROFILE.
+
+The "default" profile is stock SQLite: a rollback journal synced to disk at every commit, and a new connection per
+request. The "performance" profile is meant for a server handling concurrent uploads and reads:
+
+- WAL journaling lets readers read the last committed catalog while a writer writes, instead of locking each other
+  out, and synchronous=NORMAL only syncs the journal to disk at checkpoints. A commit stays atomic and consistent,
+  but the last commits may be lost on power loss, never on a crash of the process.
+- mmap_size and cache_size keep more of the database file in memory, and busy_timeout makes a connection wait for
+  the lock held by a writer instead of failing with "database is locked".
+- Transactions take the write lock when they begin (IMMEDIATE). A deferred transaction that reads and then writes
+  fails at once with "database is locked" if another writer went first, as waiting could deadlock.
+- Connections are kept open for CONN_MAX_AGE seconds and checked before reuse, sparing the connection setup and
+  keeping the page cache warm across requests.
+
+The pragmas are run by Django on every new connection through the init_command option of the SQLite backend.
+"""
+
+PROFILES = {
+    "default": {},
+    "performance": {
+        "PRAGMAS": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            # Negative sizes are in KiB: 64 MiB.
+            "cache_size": -64 * 1024,
+            "busy_timeout": 30 * 1000,
+        },
+        "TRANSACTION_MODE": "IMMEDIATE",
+        "CONN_MAX_AGE": 600,
+    },
+}
+
+
+def database_profile(name):
+    """
+    Returns the settings of the default database for a performance profile, to be merged into its DATABASES entry.
+
+    :param name: The name of the profile, one of PROFILES.
+    :return: A dict of CONN_MAX_AGE, CONN_HEALTH_CHECKS and OPTIONS, empty for the default profile.
+    :raises ValueError: If the profile is unknown.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"DATABASE_PROFILE must be one of {', '.join(PROFILES)}, not {name!r}.")
+    profile = PROFILES[name]
+    if not profile:
+        return {}
+
+    init_command = "; ".join(f"PRAGMA {pragma} = {value}" for pragma, value in profile["PRAGMAS"].items())
+    return {
+        "CONN_MAX_AGE": profile["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"init_command": init_command, "transaction_mode": profile["TRANSACTION_MODE"]},
+    }
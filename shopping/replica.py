@@ -0,0 +1,166 @@
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+"""
+This module routes the reads of the product list and the summary report to the read replica of
+settings.DATABASE_REPLICA, and keeps a SQLite replica up to date with the default database.
+
+Reads go to the replica only within replica_reads(), which the read_from_replica view decorator enters for the whole
+request, including the streaming of the response, unless the request asks to read its own writes with the
+X-Read-Primary: true header. Every other read and every write goes to the default database.
+
+A SQLite replica is a copy of the default database made with the online backup API, which copies a consistent
+snapshot while writers keep writing. The copy is refreshed in the background after the catalog changes, at most once
+every settings.DATABASE_REPLICA_REFRESH_INTERVAL seconds, so reads of the replica may lag behind the writes by that
+much.
+"""
+
+# Header of the requests reading from the default database, to see their own writes.
+READ_PRIMARY_HEADER = 'X-Read-Primary'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Sends the reads of the block to the replica, if one is configured and enabled is true.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _pinned(content, enabled):
+    """
+    Yields the chunks of a streaming response, reading each within replica_reads(enabled) as the view did.
+    """
+    iterator = iter(content)
+    while True:
+        with replica_reads(enabled):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def read_from_replica(view_func):
+    """
+    View decorator sending the reads of the view to the replica, unless the request has the X-Read-Primary: true
+    header.
+    """
+
+    @functools.wraps(view_func)
+    def view(request, *args, **kwargs):
+        enabled = request.headers.get(READ_PRIMARY_HEADER) != 'true'
+        with replica_reads(enabled):
+            response = view_func(request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = _pinned(response.streaming_content, enabled)
+        return response
+
+    return view
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads within replica_reads() to settings.DATABASE_REPLICA, and everything else to
+    the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICA and _replica_reads.get():
+            return settings.DATABASE_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the default database.
+        return True
+
+
+class ReplicaUtils:
+    _executor = None
+    _lock = threading.Lock()
+    _pending = False
+    _last_refresh = 0
+
+    @staticmethod
+    def is_refreshable():
+        """
+        Returns whether a replica is configured and both it and the default database are SQLite databases, which
+        the replica is copied from. Other replicas are kept up to date by their database server.
+        """
+        alias = settings.DATABASE_REPLICA
+        return bool(alias) and connections[alias].vendor == connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+    @staticmethod
+    def copy_database(source, target):
+        """
+        Copies a consistent snapshot of a SQLite database into another with the online backup API, replacing its
+        content. Readers of the target see either the former copy or the new one.
+
+        :param source: The DatabaseWrapper of the database to copy.
+        :param target: The DatabaseWrapper of the database replaced.
+        """
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+
+    @staticmethod
+    def refresh_replica():
+        """
+        Copies the default database into the SQLite replica.
+
+        :return: Whether the replica was refreshed, False if it is not refreshable.
+        """
+        if not ReplicaUtils.is_refreshable():
+            return False
+        with ReplicaUtils._lock:
+            ReplicaUtils._last_refresh = time.monotonic()
+        ReplicaUtils.copy_database(connections[DEFAULT_DB_ALIAS], connections[settings.DATABASE_REPLICA])
+        return True
+
+    @staticmethod
+    def schedule_refresh():
+        """
+        Refreshes the replica in the background, unless a refresh is already pending, which will copy the changes
+        too.
+        """
+        if not ReplicaUtils.is_refreshable():
+            return
+        with ReplicaUtils._lock:
+            if ReplicaUtils._pending:
+                return
+            ReplicaUtils._pending = True
+            if ReplicaUtils._executor is None:
+                ReplicaUtils._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replica-refresh")
+        ReplicaUtils._executor.submit(ReplicaUtils._refresh_in_worker)
+
+    @staticmethod
+    def _refresh_in_worker():
+        """
+        Waits for the refresh interval to elapse since the last refresh, then refreshes the replica on the pool
+        thread and releases the thread's database connections afterwards.
+        """
+        try:
+            delay = ReplicaUtils._last_refresh + settings.DATABASE_REPLICA_REFRESH_INTERVAL - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # Changes committed from now on schedule another refresh.
+            with ReplicaUtils._lock:
+                ReplicaUtils._pending = False
+            ReplicaUtils.refresh_replica()
+        finally:
+            connections.close_all()
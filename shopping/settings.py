@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import itertools
+import os
 from pathlib import Path
 
+from .database import database_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -81,6 +85,40 @@ DATABASES = {
     }
 }
 
+# Performance profile of the SQLite database, "default" or "performance" (WAL journaling, larger caches, waiting for
+# locks and persistent connections), as described in shopping/database.py.
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "default")
+DATABASES["default"].update(database_profile(DATABASE_PROFILE))
+
+# Read replica: the alias of DATABASES that the product list and the summary report read from, or None to read
+# everything from the default database. Setting the DATABASE_REPLICA_NAME environment variable adds a SQLite replica
+# file, copied from the default database in the background at most every DATABASE_REPLICA_REFRESH_INTERVAL seconds
+# after the catalog changes, as described in shopping/replica.py. Tests read the default database.
+DATABASE_REPLICA = None
+DATABASE_REPLICA_REFRESH_INTERVAL = 5
+if os.environ.get("DATABASE_REPLICA_NAME"):
+    DATABASES["replica"] = {**DATABASES["default"], "NAME": os.environ["DATABASE_REPLICA_NAME"],
+                            "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICA = "replica"
+
+# Partitions of the products: the aliases of DATABASES the products are spread across by the hash of their category,
+# as described in products/partitions.py, or an empty list to keep them in the default database. Setting the
+# PRODUCT_PARTITIONS environment variable to N adds the SQLite files products_0.sqlite3 to products_<N-1>.sqlite3 next
+# to the database. Partition files left over from a larger N are added to PRODUCT_RETIRED_PARTITIONS, which
+# rebalance_partitions drains. The partitions are read and written by PRODUCT_PARTITION_WORKERS threads at once.
+PRODUCT_PARTITIONS = []
+PRODUCT_RETIRED_PARTITIONS = []
+if os.environ.get("PRODUCT_PARTITIONS"):
+    partition_count = int(os.environ["PRODUCT_PARTITIONS"])
+    for number in itertools.count():
+        alias, path = f"products_{number}", BASE_DIR / f"products_{number}.sqlite3"
+        if number >= partition_count and not path.exists():
+            break
+        DATABASES[alias] = {**DATABASES["default"], "NAME": path}
+        (PRODUCT_PARTITIONS if number < partition_count else PRODUCT_RETIRED_PARTITIONS).append(alias)
+PRODUCT_PARTITION_WORKERS = max(1, 4 * len(PRODUCT_PARTITIONS))
+DATABASE_ROUTERS = ["products.partitions.PartitionRouter", "shopping.replica.ReplicaRouter"]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -121,3 +159,68 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MAX_FILE_SIZE = 5 * 1024 * 1024
+
+# Number of CSV rows written per bulk insert/update batch during product uploads.
+PRODUCT_UPLOAD_BATCH_SIZE = 500
+
+# Number of CSV rows parsed, cleaned and saved at a time by streaming uploads.
+CSV_CHUNK_SIZE = 50000
+
+# Background upload jobs: number of worker threads per process and where uploaded files wait to be processed.
+UPLOAD_JOB_WORKERS = 2
+UPLOAD_JOB_DIR = BASE_DIR / "upload_jobs"
+
+# Seconds after which a pending or running upload job without progress is failed, as the process it was queued in
+# has stopped. Jobs are checked when a process first queues a job.
+UPLOAD_JOB_STALE_AFTER = 3600
+
+# Number of worker processes parsing a CSV upload with ?parallel=true.
+PARALLEL_CSV_WORKERS = os.cpu_count() or 1
+
+# Number of invalid CSV rows described one by one in upload validation reports.
+VALIDATION_ERROR_REPORT_LIMIT = 100
+
+# Number of products per page of the product list, by default and at most with ?page_size=.
+PRODUCT_PAGE_SIZE = 100
+PRODUCT_MAX_PAGE_SIZE = 1000
+
+# Number of products read from the database and encoded at a time by streaming exports of the product list.
+PRODUCT_EXPORT_CHUNK_SIZE = 2000
+
+# Maximum number of products created by one POST of a list of products.
+PRODUCT_BULK_CREATE_LIMIT = 5000
+
+# Maximum number of top products of every group of a report requested with ?top=.
+REPORT_MAX_TOP = 100
+
+# Maximum number of products of a leaderboard, and the number returned by default.
+LEADERBOARD_MAX_SIZE = 100
+LEADERBOARD_SIZE = 10
+
+# Cache of generated summary reports: "lru" keeps them in each worker process, evicting the least recently used ones
+# beyond REPORT_CACHE_MAX_BYTES, while the alias of one of CACHES, such as a file or database cache, shares them
+# between all worker processes.
+REPORT_CACHE_BACKEND = "lru"
+REPORT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Cache of the users authenticated by JWTAuthMiddleware: "lru" keeps up to USER_CACHE_MAX_ENTRIES users in each worker
+# process, which only evicts the users it saves or deletes itself, while the alias of one of CACHES shares them and
+# their eviction between all worker processes. Users are read again from the database after USER_CACHE_TIMEOUT seconds.
+USER_CACHE_BACKEND = "lru"
+USER_CACHE_MAX_ENTRIES = 10000
+USER_CACHE_TIMEOUT = 300
+
+# With the "lru" user cache, the token version of a cached user is read again from the database when it was read
+# more than USER_CACHE_REVOCATION_WINDOW seconds ago, so other worker processes accept the tokens revoked by one of
+# them for up to this long. A shared cache evicts the user for all of them when its tokens are revoked.
+USER_CACHE_REVOCATION_WINDOW = 5
+
+# Number of seconds the tokens issued at login are valid for, and number of verified tokens each worker process
+# remembers until they expire, so that they are not verified again.
+JWT_TOKEN_LIFETIME = 15 * 60
+JWT_VERIFICATION_CACHE_SIZE = 10000
+
+# Async request path: whether the read endpoints and login are served by their async variants, as shopping/asgi.py
+# turns on, and the number of threads of each worker process running their blocking work.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS") == "true"
+ASYNC_BLOCKING_WORKERS = min(32, (os.cpu_count() or 1) + 4)
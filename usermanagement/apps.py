@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsermanagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "usermanagement"
+
+    def ready(self):
+        # Connect the receivers keeping the user cache up to date.
+        from . import receivers  # noqa: F401
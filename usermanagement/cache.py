@@ -0,0 +1,240 @@
+import functools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .models import User
+
+"""
+This module contains the cache of the users authenticated by JWTAuthMiddleware, sparing a query per request.
+
+Cached users are evicted when they are saved or deleted. With the in-process cache each worker only hears of the
+changes it makes itself and forgets its users after USER_CACHE_TIMEOUT seconds, so it reads the token version of its
+cached users again after USER_CACHE_REVOCATION_WINDOW seconds to notice revoked tokens; a shared Django cache evicts
+them for all workers at once.
+
+The cache holds the values of CACHED_USER_FIELDS rather than User instances, and every request gets a User of its
+own built from them, so that a request changing its user does not change the users of the others.
+"""
+
+# Fields of the cached users: what identifies the user of a request and the version of its tokens. The password salt
+# and hash are not cached, and are read from the database if a request uses them.
+CACHED_USER_FIELDS = ['id', 'name', 'email', 'token_version']
+
+
+class LRUUserCacheBackend:
+    """
+    In-process cache keeping up to max_entries users for timeout seconds, evicting the least recently used ones first.
+    Each worker process has its own.
+    """
+    name = 'lru'
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return values
+
+    def set(self, key, values):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.timeout, values)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, values):
+        self.set(key, values)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries)}
+
+
+class DjangoUserCacheBackend:
+    """
+    Cache storing the users in one of the Django caches of settings.CACHES, shared by all worker processes.
+    """
+    name = 'django'
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(f"user:{key}")
+
+    def set(self, key, values):
+        self.cache.set(f"user:{key}", values, self.timeout)
+
+    async def aget(self, key):
+        return await self.cache.aget(f"user:{key}")
+
+    async def aset(self, key, values):
+        await self.cache.aset(f"user:{key}", values, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(f"user:{key}")
+
+    def stats(self):
+        return {}
+
+
+class UserCache:
+    """
+    Cache of users by id, counting its hits and misses in this process.
+
+    Entries are the values of CACHED_USER_FIELDS with the time, on this process's monotonic clock, their token version
+    was read at. With a revocation window, the token version is read again once it is older than the window.
+    """
+
+    def __init__(self, backend, revocation_window=None):
+        self.backend = backend
+        self.revocation_window = revocation_window
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(user_id):
+        """
+        Returns the cache key of a user id, the same for every spelling of the UUID.
+
+        :raises User.DoesNotExist: If the id is not a UUID.
+        """
+        try:
+            return str(uuid.UUID(str(user_id)))
+        except ValueError:
+            raise User.DoesNotExist
+
+    def get_user(self, user_id):
+        """
+        Returns the user of the id from the cache, or from the database on a miss.
+
+        :param user_id: The id of the user, as found in a token.
+        :return: A new User with the fields of CACHED_USER_FIELDS loaded.
+        :raises User.DoesNotExist: If there is no user with this id.
+        """
+        key = self.key(user_id)
+        entry = self.backend.get(key)
+        self.count(entry)
+
+        if entry is None:
+            entry = (User.objects.values_list(*CACHED_USER_FIELDS).get(id=key), time.monotonic())
+            self.backend.set(key, entry)
+        elif self.is_unchecked(entry):
+            token_version = User.objects.filter(id=key).values_list('token_version', flat=True).first()
+            entry = self.checked(key, entry, token_version)
+            self.backend.set(key, entry)
+        return self.user(entry)
+
+    async def aget_user(self, user_id):
+        """
+        Returns the user of the id as get_user() does, from an event loop. A user cached in this process is returned
+        without leaving the event loop.
+        """
+        key = self.key(user_id)
+        entry = await self.backend.aget(key)
+        self.count(entry)
+
+        if entry is None:
+            entry = (await User.objects.values_list(*CACHED_USER_FIELDS).aget(id=key), time.monotonic())
+            await self.backend.aset(key, entry)
+        elif self.is_unchecked(entry):
+            token_version = await User.objects.filter(id=key).values_list('token_version', flat=True).afirst()
+            entry = self.checked(key, entry, token_version)
+            await self.backend.aset(key, entry)
+        return self.user(entry)
+
+    def is_unchecked(self, entry):
+        """
+        Returns whether the token version of the entry was read longer than the revocation window ago.
+        """
+        return self.revocation_window is not None and time.monotonic() - entry[1] >= self.revocation_window
+
+    def checked(self, key, entry, token_version):
+        """
+        Returns the entry with the token version read from the database, or evicts it if the user no longer exists.
+
+        :raises User.DoesNotExist: If the token version is None, as the user was deleted.
+        """
+        if token_version is None:
+            self.backend.delete(key)
+            raise User.DoesNotExist
+        values = list(entry[0])
+        values[CACHED_USER_FIELDS.index('token_version')] = token_version
+        return tuple(values), time.monotonic()
+
+    @staticmethod
+    def user(entry):
+        """
+        Returns a new User of the cached values, as if read from the database with only these fields.
+        """
+        return User.from_db(User.objects.db, CACHED_USER_FIELDS, entry[0])
+
+    def count(self, entry):
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def invalidate(self, user_id):
+        """
+        Evicts the user of the id, whose cached copy no longer matches the database.
+        """
+        self.backend.delete(self.key(user_id))
+
+    def stats(self):
+        """
+        Returns the backend, the numbers of hits and misses in this process, their hit rate and the number of cached
+        users if known.
+        """
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {'backend': self.backend.name, 'hits': hits, 'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else None, **self.backend.stats()}
+
+
+@functools.cache
+def get_user_cache():
+    """
+    Returns the user cache configured by settings.USER_CACHE_BACKEND, created on first use.
+    """
+    if settings.USER_CACHE_BACKEND == 'lru':
+        return UserCache(LRUUserCacheBackend(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TIMEOUT),
+                         settings.USER_CACHE_REVOCATION_WINDOW)
+    return UserCache(DjangoUserCacheBackend(settings.USER_CACHE_BACKEND, settings.USER_CACHE_TIMEOUT))
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting, **kwargs):
+    """
+    Recreates the user cache when its settings are overridden, as in tests.
+    """
+    if setting.startswith('USER_CACHE_'):
+        get_user_cache.cache_clear()
@@ -1,11 +1,18 @@
 import jwt
-from django.conf import settings
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
+from .cache import get_user_cache
 from .models import User
+from .tokens import TokenUtils
 from rest_framework import status
 
 
 class JWTAuthMiddleware:
+    # The middleware serves both WSGI and ASGI requests without switching threads, so that an authenticated request
+    # served by ASGI only leaves the event loop to read a user missing from the user cache.
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initializes the middleware with the given get_response function.
@@ -13,6 +20,8 @@ class JWTAuthMiddleware:
         :param get_response: The next middleware or view in the request chain.
         """
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         """
@@ -21,37 +30,109 @@ class JWTAuthMiddleware:
         :param request: The HTTP request object.
         :return: The HTTP response object.
         """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Skip authentication for specific paths: login, signup, and any admin-related paths.
-        if request.path in ['/user-management/login', '/user-management/signup'] or 'admin' in request.path:
+        if self.is_public(request):
             # If the request is for login, signup, or admin paths, proceed without JWT validation.
             return self.get_response(request)
 
-        # Get the Authorization header from the request.
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                # Extract the token from the Authorization header (expected format: "Bearer <token>").
-                token = auth_header.split(' ')[1]
-
-                # Decode the JWT token using the secret key from settings.
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-
-                # Retrieve the user associated with the ID in the token payload.
-                user = User.objects.get(id=payload['user_id'])
-                if not user:
-                    return JsonResponse({"msg": "Invalid token provided user not present in Database"}, status=status.HTTP_400_BAD_REQUEST)
-            # Attach the user to the request object for use in views.
-            except (jwt.ExpiredSignatureError, jwt.DecodeError):
-                # Return a 401 error if the token is expired or invalid.
-                return JsonResponse({"detail": "Invalid token provided"}, status=status.HTTP_401_UNAUTHORIZED)
-            except User.DoesNotExist:
-                # Return a 401 error if the user associated with the token does not exist.
-                return JsonResponse({"detail": "Invalid token provided"}, status=status.HTTP_401_UNAUTHORIZED)
-        else:
-            # Return a 401 error if no Authorization header is provided.
-            return JsonResponse({"detail": "Token not provided, please provide token in header"},
-                                status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            # Verify the JWT token of the request.
+            payload = self.verify_token(request)
+            if payload is None:
+                return self.missing_token_response()
+
+            # Retrieve the user associated with the ID in the token payload, from the user cache if present.
+            user = get_user_cache().get_user(payload['user_id'])
+        except (jwt.InvalidTokenError, User.DoesNotExist):
+            # Return a 401 error if the token is expired or invalid, or its user does not exist.
+            return self.invalid_token_response()
+
+        error = self.attach_user(request, payload, user)
+        if error is not None:
+            return error
 
         # Proceed to the next middleware or view if the token is valid.
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        """
+        Middleware for validating JWT tokens of requests served by ASGI, as __call__ does.
+
+        :param request: The HTTP request object.
+        :return: The HTTP response object.
+        """
+        if self.is_public(request):
+            return await self.get_response(request)
+
+        try:
+            payload = self.verify_token(request)
+            if payload is None:
+                return self.missing_token_response()
+
+            # Only a user missing from the user cache is read from the database, off the event loop.
+            user = await get_user_cache().aget_user(payload['user_id'])
+        except (jwt.InvalidTokenError, User.DoesNotExist):
+            return self.invalid_token_response()
+
+        error = self.attach_user(request, payload, user)
+        if error is not None:
+            return error
+
+        return await self.get_response(request)
+
+    @staticmethod
+    def is_public(request):
+        """
+        Returns whether the request is for the login, signup or admin paths, which need no token.
+        """
+        return request.path in ['/user-management/login', '/user-management/signup'] or 'admin' in request.path
+
+    @staticmethod
+    def verify_token(request):
+        """
+        Returns the claims of the token of the request, or None if it has no Authorization header.
+
+        :raises jwt.InvalidTokenError: If the token is malformed, forged, expired or lacks a required claim.
+        """
+        # Get the Authorization header from the request.
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return None
+
+        # Extract the token from the Authorization header (expected format: "Bearer <token>").
+        token = auth_header.partition(' ')[2]
+
+        # Verify the JWT token, unless this process already verified it.
+        return TokenUtils.verify_token(token)
+
+    @staticmethod
+    def attach_user(request, payload, user):
+        """
+        Attaches the user of the token to the request, or returns the error response if the token no longer
+        authenticates the user.
+        """
+        if not user:
+            return JsonResponse({"msg": "Invalid token provided user not present in Database"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        # Reject the tokens issued before the user revoked them.
+        if payload['ver'] != user.token_version:
+            return JsonResponse({"detail": "Token has been revoked"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Attach the user to the request object for use in views.
+        request.jwt_user = user
+        return None
+
+    @staticmethod
+    def invalid_token_response():
+        return JsonResponse({"detail": "Invalid token provided"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @staticmethod
+    def missing_token_response():
+        # Return a 401 error if no Authorization header is provided.
+        return JsonResponse({"detail": "Token not provided, please provide token in header"},
+                            status=status.HTTP_401_UNAUTHORIZED)
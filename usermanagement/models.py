@@ -9,6 +9,8 @@ class User(models.Model):
     email = models.EmailField(unique=True)
     salt = models.CharField(max_length=64)
     hash = models.CharField(max_length=128)
+    # Version of the tokens of the user, bumped to revoke all the tokens issued before.
+    token_version = models.IntegerField(default=0)
 
     def set_password(self, password):
         self.salt = uuid.uuid4().hex
@@ -17,6 +19,14 @@ class User(models.Model):
     def check_password(self, password):
         return self.hash == self._generate_hash(password)
 
+    def revoke_tokens(self):
+        """
+        Revokes all the tokens issued to the user so far.
+        """
+        self.token_version = models.F('token_version') + 1
+        self.save(update_fields=['token_version'])
+        self.refresh_from_db(fields=['token_version'])
+
     def _generate_hash(self, password):
         return hashlib.sha512((self.salt + password).encode('utf-8')).hexdigest()
 
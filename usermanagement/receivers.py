@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_user_cache
+from .models import User
+
+"""
+This module contains the receivers keeping the user cache up to date. It is imported by UsermanagementConfig.ready().
+"""
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Evicts a saved or deleted user from the user cache.
+    """
+    get_user_cache().invalidate(instance.id)
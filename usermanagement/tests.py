@@ -1,9 +1,19 @@
+import json
 import uuid
-from django.test import TestCase
+import jwt
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
 from unittest.mock import patch, MagicMock
 from rest_framework import status
 from rest_framework.test import APIRequestFactory
-from .views import SignupView, LoginView
+from shopping.blocking import offload_view
+from .cache import LRUUserCacheBackend, UserCache, get_user_cache
+from .middlewares import JWTAuthMiddleware
+from .models import User
+from .tokens import TokenUtils, VerifiedTokenCache, get_verified_tokens
+from .views import SignupView, LoginView, RevokeTokensView, UserCacheView
 
 
 class UserAuthenticationTests(TestCase):
@@ -40,6 +50,7 @@ class UserAuthenticationTests(TestCase):
         mock_user.check_password.return_value = True
         mock_filter.return_value.first.return_value = mock_user
         mock_user.id = uuid.uuid4()
+        mock_user.token_version = 0
         data = {
             "email": "test@example.com",
             "password": "password123"
@@ -94,3 +105,224 @@ class UserAuthenticationTests(TestCase):
         mock_user.check_password.assert_called_once_with("wrongpassword")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertEqual(response.data["detail"], "Invalid credentials")
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        # Start from an empty cache with no hits or misses counted.
+        get_user_cache.cache_clear()
+        self.middleware = JWTAuthMiddleware(lambda request: HttpResponse())
+        self.user = User(name="Test User", email="test@example.com")
+        self.user.set_password("password123")
+        self.user.save()
+
+    def authenticate(self, user_id=None):
+        token = TokenUtils.issue_token(User(id=user_id or self.user.id, token_version=self.user.token_version))
+        return self.middleware(RequestFactory().get('/shopping/product', HTTP_AUTHORIZATION=f"Bearer {token}"))
+
+    def assert_cached_until_changed(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().status_code, status.HTTP_200_OK)
+        # The same user spelled differently is the same cache entry.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.authenticate(self.user.id.hex).status_code, status.HTTP_200_OK)
+
+        self.user.name = "Renamed"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().status_code, status.HTTP_200_OK)
+
+        user_id = self.user.id
+        self.user.delete()
+        self.assertEqual(self.authenticate(user_id).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_authenticated_users_are_cached_until_changed(self):
+        self.assert_cached_until_changed()
+
+        response = UserCacheView.as_view()(APIRequestFactory().get('/user-cache'))
+        self.assertEqual(response.data, {"backend": "lru", "hits": 2, "misses": 3, "hit_rate": 0.4, "entries": 0})
+
+    @override_settings(USER_CACHE_BACKEND='default',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache_evicts_users_for_all_workers(self):
+        self.assert_cached_until_changed()
+
+        # Another worker process reads the users cached by this one, and hears of their changes.
+        self.user = User.objects.create(name="Other User", email="other@example.com")
+        other_worker = UserCache(get_user_cache().backend.__class__('default', settings.USER_CACHE_TIMEOUT))
+        self.authenticate()
+        with self.assertNumQueries(0):
+            other_worker.get_user(self.user.id)
+
+        self.user.save()
+        with self.assertNumQueries(1):
+            other_worker.get_user(self.user.id)
+
+    def test_requests_get_users_of_their_own_without_password_fields(self):
+        first, second = get_user_cache().get_user(self.user.id), get_user_cache().get_user(self.user.id)
+        first.name = "Changed by a request"
+
+        self.assertIsNot(first, second)
+        self.assertEqual((second.name, second.token_version), ("Test User", 0))
+        self.assertEqual(get_user_cache().get_user(self.user.id).name, "Test User")
+        cached, _ = get_user_cache().backend.get(str(self.user.id))
+        self.assertNotIn(self.user.salt, cached)
+        self.assertNotIn(self.user.hash, cached)
+        # The password fields are read from the database when used.
+        self.assertEqual(second.get_deferred_fields(), {"salt", "hash"})
+        self.assertTrue(second.check_password("password123"))
+
+    def test_other_workers_notice_revoked_tokens_within_the_window(self):
+        other_worker = UserCache(LRUUserCacheBackend(max_entries=10, timeout=300),
+                                 settings.USER_CACHE_REVOCATION_WINDOW)
+        with patch('usermanagement.cache.time.monotonic', return_value=1000):
+            other_worker.get_user(self.user.id)
+            # This worker revokes the tokens, and only evicts the user from its own cache.
+            self.user.revoke_tokens()
+            with self.assertNumQueries(0):
+                self.assertEqual(other_worker.get_user(self.user.id).token_version, 0)
+
+        with patch('usermanagement.cache.time.monotonic', return_value=1000 + settings.USER_CACHE_REVOCATION_WINDOW):
+            with self.assertNumQueries(1):
+                self.assertEqual(other_worker.get_user(self.user.id).token_version, 1)
+            with self.assertNumQueries(0):
+                other_worker.get_user(self.user.id)
+
+        user_id = self.user.id
+        self.user.delete()
+        later = 1000 + 2 * settings.USER_CACHE_REVOCATION_WINDOW
+        with patch('usermanagement.cache.time.monotonic', return_value=later), self.assertRaises(User.DoesNotExist):
+            other_worker.get_user(user_id)
+        self.assertIsNone(other_worker.backend.get(str(user_id)))
+
+    def test_malformed_user_id_is_rejected(self):
+        self.assertEqual(self.authenticate("not-a-uuid").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lru_backend_expires_and_evicts_users(self):
+        backend = LRUUserCacheBackend(max_entries=2, timeout=60)
+        with patch('usermanagement.cache.time.monotonic', return_value=1000):
+            backend.set('a', 'user a')
+            backend.set('b', 'user b')
+            backend.get('a')
+            backend.set('c', 'user c')
+            self.assertEqual(list(backend.entries), ['a', 'c'])
+
+        with patch('usermanagement.cache.time.monotonic', return_value=1060):
+            self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.stats(), {'entries': 1})
+
+
+class TokenTests(TestCase):
+
+    def setUp(self):
+        get_user_cache.cache_clear()
+        get_verified_tokens.cache_clear()
+        self.middleware = JWTAuthMiddleware(lambda request: HttpResponse())
+        self.user = User(name="Test User", email="test@example.com")
+        self.user.set_password("password123")
+        self.user.save()
+
+    def authenticate(self, token, path='/shopping/product', method='get'):
+        request = getattr(RequestFactory(), method)(path, HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.middleware(request), request
+
+    def test_login_issues_expiring_tokens(self):
+        request = APIRequestFactory().post('/login', {"email": "test@example.com", "password": "password123"},
+                                           format='json')
+        with patch('usermanagement.tokens.time.time', return_value=1000):
+            token = LoginView.as_view()(request).data["token"]
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"], options={'verify_exp': False})
+        self.assertEqual(payload, {'user_id': str(self.user.id), 'ver': 0, 'iat': 1000,
+                                   'exp': 1000 + settings.JWT_TOKEN_LIFETIME})
+
+    def test_verified_tokens_are_not_verified_again(self):
+        token = TokenUtils.issue_token(self.user)
+        self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_200_OK)
+        with patch('usermanagement.tokens.jwt.decode') as decode, self.assertNumQueries(0):
+            response, request = self.authenticate(token)
+        decode.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(request.jwt_user, self.user)
+
+    def test_expired_tokens_are_rejected(self):
+        with patch('usermanagement.tokens.time.time', return_value=1000):
+            token = TokenUtils.issue_token(self.user)
+        self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A token verified before it expired is forgotten once it does.
+        token = TokenUtils.issue_token(self.user)
+        self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_200_OK)
+        expired_at = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])['exp']
+        with patch('usermanagement.tokens.time.time', return_value=expired_at), \
+                patch('usermanagement.tokens.jwt.decode', side_effect=jwt.ExpiredSignatureError) as decode:
+            self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+        decode.assert_called_once()
+
+    def test_tokens_without_expiry_are_rejected(self):
+        for token in (jwt.encode({"user_id": str(self.user.id)}, settings.SECRET_KEY, algorithm="HS256"),
+                      jwt.encode({"user_id": str(self.user.id), "ver": 0}, "another-key", algorithm="HS256"), "",
+                      "garbage"):
+            self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_tokens_are_rejected(self):
+        token = TokenUtils.issue_token(self.user)
+        self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_200_OK)
+
+        response, request = self.authenticate(token, '/user-management/revoke-tokens', 'post')
+        self.assertEqual(RevokeTokensView.as_view()(request).status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+
+        self.assertEqual(self.authenticate(token)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.authenticate(TokenUtils.issue_token(self.user))[0].status_code, status.HTTP_200_OK)
+
+    def test_verified_token_cache_is_bounded(self):
+        cache = VerifiedTokenCache(max_entries=2)
+        with patch('usermanagement.tokens.time.time', return_value=1000):
+            cache.set(b'a', {'exp': 2000})
+            cache.set(b'b', {'exp': 2000})
+            cache.get(b'a')
+            cache.set(b'c', {'exp': 2000})
+            self.assertEqual(list(cache.entries), [b'a', b'c'])
+
+
+class AsyncRequestPathTests(TransactionTestCase):
+
+    def setUp(self):
+        get_user_cache.cache_clear()
+        get_verified_tokens.cache_clear()
+        self.user = User(name="Test User", email="test@example.com")
+        self.user.set_password("password123")
+        self.user.save()
+
+    def test_async_middleware_authenticates_on_the_event_loop(self):
+        async def get_response(request):
+            return HttpResponse(request.jwt_user.name)
+
+        middleware = JWTAuthMiddleware(get_response)
+        token = TokenUtils.issue_token(self.user)
+        request = AsyncRequestFactory().get('/shopping/product', headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(async_to_sync(middleware)(request).content, b"Test User")
+        # The user is now cached and the token verified.
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(middleware)(request).status_code, status.HTTP_200_OK)
+
+        for headers in ({}, {"Authorization": "Bearer garbage"}):
+            request = AsyncRequestFactory().get('/shopping/product', headers=headers)
+            self.assertEqual(async_to_sync(middleware)(request).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.revoke_tokens()
+        request = AsyncRequestFactory().get('/shopping/product', headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(async_to_sync(middleware)(request).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_login_issues_tokens(self):
+        login = offload_view(LoginView.as_view())
+        for password, expected in (("wrong", status.HTTP_401_UNAUTHORIZED), ("password123", status.HTTP_200_OK)):
+            request = AsyncRequestFactory().post('/login', {"email": "test@example.com", "password": password},
+                                                 content_type='application/json')
+            response = async_to_sync(login)(request)
+            self.assertEqual(response.status_code, expected)
+
+        token = json.loads(response.content)["token"]
+        self.assertEqual(TokenUtils.verify_token(token)['user_id'], str(self.user.id))
@@ -0,0 +1,100 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+"""
+This module issues the JWT tokens of the users and verifies them.
+
+Tokens carry the id and token version of their user, and expire JWT_TOKEN_LIFETIME seconds after they are issued.
+Verified tokens are remembered by the SHA-256 digest of the token until they expire, so a client sending the same
+token again is not verified again. Bumping the token version of a user revokes all the tokens issued to them before.
+"""
+
+# Claims every token must carry.
+REQUIRED_CLAIMS = ['user_id', 'ver', 'iat', 'exp']
+
+
+class VerifiedTokenCache:
+    """
+    In-process cache of the claims of up to max_entries verified tokens, keyed by their digest and kept until the
+    tokens expire, evicting the least recently used ones first.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        with self.lock:
+            payload = self.entries.get(digest)
+            if payload is None:
+                return None
+            if payload['exp'] <= time.time():
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+            return payload
+
+    def set(self, digest, payload):
+        with self.lock:
+            self.entries[digest] = payload
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class TokenUtils:
+    @staticmethod
+    def issue_token(user):
+        """
+        Issues a token to the user, valid for settings.JWT_TOKEN_LIFETIME seconds or until its tokens are revoked.
+
+        :param user: The User.
+        :return: The encoded token.
+        """
+        now = int(time.time())
+        payload = {'user_id': str(user.id), 'ver': user.token_version, 'iat': now,
+                   'exp': now + settings.JWT_TOKEN_LIFETIME}
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+
+    @staticmethod
+    def verify_token(token):
+        """
+        Returns the claims of a token, verifying its signature and expiry unless it was verified before.
+
+        :param token: The encoded token.
+        :return: The dict of the claims of the token.
+        :raises jwt.InvalidTokenError: If the token is malformed, forged, expired or lacks a required claim.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = get_verified_tokens().get(digest)
+        if payload is None:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"],
+                                 options={'require': REQUIRED_CLAIMS})
+            get_verified_tokens().set(digest, payload)
+        return payload
+
+
+@functools.cache
+def get_verified_tokens():
+    """
+    Returns the cache of verified tokens of this process, created on first use.
+    """
+    return VerifiedTokenCache(settings.JWT_VERIFICATION_CACHE_SIZE)
+
+
+@receiver(setting_changed)
+def reset_verified_tokens(setting, **kwargs):
+    """
+    Forgets the verified tokens when the settings they were verified with are overridden, as in tests.
+    """
+    if setting in ('SECRET_KEY', 'JWT_VERIFICATION_CACHE_SIZE'):
+        get_verified_tokens.cache_clear()
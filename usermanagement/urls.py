@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.urls import path
 
-from .views import SignupView, LoginView
+from shopping.blocking import asgi_view
+
+from .views import SignupView, LoginView, RevokeTokensView, UserCacheView
 
 urlpatterns = [
     path("signup", SignupView.as_view()),
-    path("login", LoginView.as_view()),
+    path("login", asgi_view(LoginView.as_view())),
+    path("revoke-tokens", RevokeTokensView.as_view()),
+    path("user-cache", UserCacheView.as_view()),
 ]
@@ -1,9 +1,9 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import jwt
-from django.conf import settings
+from .cache import get_user_cache
 from .models import User
+from .tokens import TokenUtils
 from .serializers import UserLoginSerializer, UserSerializer
 
 
@@ -52,11 +52,36 @@ class LoginView(APIView):
                 # Return a 401 error if the credentials are invalid.
                 return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
-            # Generate a JWT token with the user's ID.
-            token = jwt.encode({"user_id": str(user.id)}, settings.SECRET_KEY, algorithm="HS256")
+            # Generate a short-lived JWT token with the user's ID and token version.
+            token = TokenUtils.issue_token(user)
 
             # Return the JWT token and a success message.
             return Response({"token": token, "msg": "Login Done"}, status=status.HTTP_200_OK)
 
         # Return validation errors if the login data is invalid.
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RevokeTokensView(APIView):
+    def post(self, request):
+        """
+        Handles POST requests to revoke all the tokens issued to the authenticated user, including the one of the
+        request, for example after a password leak. The user has to log in again.
+
+        :param request: The HTTP request object, authenticated by JWTAuthMiddleware.
+        :return: A Response indicating success.
+        """
+        request.jwt_user.revoke_tokens()
+        return Response({"msg": "Tokens revoked"}, status=status.HTTP_200_OK)
+
+
+class UserCacheView(APIView):
+    def get(self, request):
+        """
+        Handles GET requests to retrieve the use of the user cache of the authentication middleware.
+
+        :param request: The HTTP request object.
+        :return: A Response containing the backend of the user cache, its numbers of hits and misses in the process
+            serving the request, their hit rate, and the number of cached users for the in-process cache.
+        """
+        return Response(get_user_cache().stats())